@@ -0,0 +1,23 @@
+bl_info = {
+    "name": "honey nut studios production tools",
+    "blender": (2, 80, 0),
+    "category": "Production"
+}
+
+import sys
+
+# Some modules (like blendfile) don't need Blender and are also used from plain Python,
+# so the Blender side of the addon is only loaded when running inside Blender.
+if "bpy" in sys.modules:
+    # reloads the submodules that were already imported (the UI ones are only imported once
+    # Blender is up, see addon.py), a module before the ones that import it
+    if "addon" in locals():
+        import importlib
+        for name in ("baseline", "blendfile", "depgraph", "encoders", "jobserver", "keying", "movfile", "playdiff",
+                     "contact", "proxies", "reel", "rigs", "settings", "timing", "validate", "prefs", "playblast",
+                     "batch", "benchmarks", "libraries", "background", "shots", "rig_tools", "rig_panels", "cli",
+                     "addon"):
+            if name in locals():
+                importlib.reload(locals()[name])
+    
+    from .addon import register, unregister
@@ -0,0 +1,20 @@
+# Command line entry point, run in Blender (options go after the "--" so Blender ignores them):
+#   blender -b -P production/scripts/hns_production_addon/__main__.py -- --help
+#
+# Blender runs this as a plain script rather than as part of the package, so the package
+# is imported from the folder this file is in. If the addon is also enabled in the
+# Blender that runs this, that copy is the one that gets used.
+
+import os
+import sys
+
+try:
+    import bpy
+except ImportError:
+    sys.exit("This needs to run in Blender: blender -b -P %s -- --help" % os.path.abspath(__file__))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hns_production_addon import cli
+
+cli.main(sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else [])
@@ -0,0 +1,120 @@
+import bpy
+
+import importlib
+import os
+import statistics
+import subprocess
+import time
+
+from .playblast import ANIM_OT_playblast
+from .prefs import PlayblastPreferences
+
+
+# Enabling the addon only registers the preferences and the playblast operator, which is all
+# that background Blenders (batch workers, the command line) use. The rest of the UI (background
+# playblasts, the shot tools, the rig operators and panels) is imported and registered by a
+# timer once Blender is up, so it doesn't add to the startup time, and never in the background.
+UI_MODULES = ["background", "shots", "rig_tools", "rig_panels"]
+
+ui_modules = []  # the UI modules that are registered
+
+
+def pb_menu_func(self, context):
+    from .background import get_active_playblast_jobs
+
+    self.layout.separator()
+    self.layout.operator("anim.playblast")
+    self.layout.operator("anim.playblast", text="Playblast (Force)").force = True
+    self.layout.operator("anim.playblast_background")
+    if get_active_playblast_jobs():
+        self.layout.operator("anim.playblast_background_cancel")
+    self.layout.operator("anim.find_dependent_shots")
+    self.layout.operator("anim.fix_shot_settings")
+    self.layout.operator("anim.build_reel")
+
+
+def register_ui():
+    if ui_modules:
+        return None
+
+    for name in UI_MODULES:
+        module = importlib.import_module("." + name, __package__)
+        module.register()
+        ui_modules.append(module)
+    bpy.types.TOPBAR_MT_render.append(pb_menu_func)
+    # stops the timer
+    return None
+
+
+def register():
+    bpy.utils.register_class(PlayblastPreferences)
+    bpy.utils.register_class(ANIM_OT_playblast)
+
+    if bpy.app.background:
+        return
+    bpy.app.timers.register(register_ui, first_interval=0)
+
+
+def unregister():
+    if bpy.app.timers.is_registered(register_ui):
+        bpy.app.timers.unregister(register_ui)
+
+    if ui_modules:
+        bpy.types.TOPBAR_MT_render.remove(pb_menu_func)
+        for module in reversed(ui_modules):
+            module.unregister()
+        ui_modules.clear()
+
+    bpy.utils.unregister_class(ANIM_OT_playblast)
+    bpy.utils.unregister_class(PlayblastPreferences)
+
+
+#####################       Startup Benchmark       #####################
+
+# Run in each Blender started by bench_startup(). Blender is in the background so register()
+# skips the UI, register_ui() is timed on its own.
+BENCH_STARTUP_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+sys.path.insert(0, %r)
+from hns_production_addon import addon
+imported = time.perf_counter()
+addon.register()
+registered = time.perf_counter()
+addon.register_ui()
+ui = time.perf_counter()
+addon.unregister()
+print("HNS_STARTUP %%f %%f %%f" %% (imported - start, registered - imported, ui - registered))
+"""
+
+
+def run_startup(script):
+    start = time.perf_counter()
+    result = subprocess.run([bpy.app.binary_path, "--background", "--factory-startup", "--python-exit-code", "1",
+                             "--python-expr", script],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    if result.returncode != 0:
+        raise RuntimeError("Blender failed:\n" + result.stdout[-2000:])
+    return time.perf_counter() - start, result.stdout
+
+
+# Starts Blender (factory settings, so no other addons) the given number of times with and
+# without this addon, and prints the median import/register() cost.
+def bench_startup(repeat=5):
+    scripts = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = BENCH_STARTUP_SCRIPT % scripts
+
+    baseline = []
+    runs = []
+    for i in range(repeat):
+        baseline.append(run_startup("pass")[0])
+        seconds, output = run_startup(script)
+        line = next(line for line in output.splitlines() if line.startswith("HNS_STARTUP "))
+        runs.append([seconds] + [float(value) for value in line.split()[1:]])
+
+    total, imported, registered, ui = (statistics.median(column) for column in zip(*runs))
+    print("Blender startup (median of %d): %.3fs without the addon, %.3fs with it" % (
+        repeat, statistics.median(baseline), total))
+    print("  import %.1fms, register() %.1fms, UI modules (skipped in the background) %.1fms" % (
+        imported * 1000, registered * 1000, ui * 1000))
+
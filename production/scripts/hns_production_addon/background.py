@@ -0,0 +1,234 @@
+# Background playblasts from the UI (only registered when Blender has one, see addon.py)
+
+import bpy
+
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import deque
+
+from .batch import PROGRESS_PREFIX, blender_worker_command, playblast_worker_args
+from .playblast import (forget_playblast, get_playblast_path, get_shot_name, playblast_hash, playblast_is_current,
+                        record_playblast)
+from .prefs import copy_playblast_prefs, get_playblast_prefs
+
+
+#####################       Background Playblast       #####################
+
+# Playblasts a snapshot of the open file in a background Blender, so the animator can keep working.
+# Jobs run one at a time (they'd only fight over the GPU otherwise), in the order they were queued.
+# ANIM_OT_playblast_monitor keeps an eye on them and shows the progress in the status bar.
+playblast_jobs = []
+
+
+class PlayblastJob:
+    def __init__(self, shot, snapshot, prefs, shot_hash):
+        self.shot = shot
+        self.snapshot = snapshot  # copy of the file as it was when the job was queued
+        self.prefs = copy_playblast_prefs(prefs)
+        self.shot_hash = shot_hash  # None if the file had unsaved changes
+        self.status = 'QUEUED'
+        self.progress = 0.0
+        self.process = None
+        self.output = deque(maxlen=20)
+    
+    @property
+    def name(self):
+        return get_shot_name(self.shot)
+    
+    def start(self):
+        args = playblast_worker_args(self.prefs) + ["--playblast-shot",
+            "--shot-name", self.name, "--output", get_playblast_path(self.shot, self.prefs)]
+        self.process = subprocess.Popen(blender_worker_command(self.snapshot, args),
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+        self.status = 'RUNNING'
+        threading.Thread(target=self.read_output, daemon=True).start()
+    
+    def read_output(self):
+        for line in self.process.stdout:
+            if line.startswith(PROGRESS_PREFIX):
+                frame, frame_start, frame_end = (int(n) for n in line[len(PROGRESS_PREFIX):].split())
+                self.progress = (frame - frame_start + 1) / max(frame_end - frame_start + 1, 1)
+            else:
+                self.output.append(line.rstrip())
+    
+    # Updates the status once the worker is done, returns True if it just finished
+    def poll(self):
+        if self.status != 'RUNNING' or self.process.poll() is None:
+            return False
+        
+        if self.process.returncode == 0:
+            self.status = 'DONE'
+            if self.shot_hash:
+                record_playblast(self.shot, self.prefs, self.shot_hash)
+            else:
+                forget_playblast(self.shot)
+        else:
+            self.status = 'FAILED'
+            print("\n".join(self.output))
+            # the worker may have written part of the playblast
+            forget_playblast(self.shot)
+        self.cleanup()
+        return True
+    
+    def cancel(self):
+        if self.status == 'RUNNING':
+            self.process.terminate()
+            self.process.wait()
+        if self.status in {'QUEUED', 'RUNNING'}:
+            self.status = 'CANCELLED'
+            forget_playblast(self.shot)
+            self.cleanup()
+    
+    def cleanup(self):
+        shutil.rmtree(os.path.dirname(self.snapshot), ignore_errors=True)
+
+
+def get_active_playblast_jobs():
+    return [job for job in playblast_jobs if job.status in {'QUEUED', 'RUNNING'}]
+
+
+class ANIM_OT_playblast_background(bpy.types.Operator):
+    """Playblasts a snapshot of the scene in a background process, so you can keep working.
+    Uses the same settings as Playblast, but renders from the scene camera"""
+    
+    bl_idname = "anim.playblast_background"
+    bl_label = "Playblast in Background"
+    
+    force: bpy.props.BoolProperty(
+        name="Force",
+        description="Playblast even if the existing playblast is up to date",
+        options={'SKIP_SAVE'}
+    )
+    
+    @classmethod
+    def poll(cls, context):
+        return bpy.data.filepath != ""
+    
+    def execute(self, context):
+        addon_prefs = get_playblast_prefs(context)
+        shot = bpy.data.filepath
+        cacheable = not bpy.data.is_dirty
+        
+        if not self.force and cacheable and playblast_is_current(shot, addon_prefs):
+            self.report({'INFO'}, "Playblast is already up to date")
+            return {'FINISHED'}
+        
+        if any(job.shot == shot for job in get_active_playblast_jobs()):
+            self.report({'WARNING'}, get_shot_name(shot) + " is already being playblasted")
+            return {'CANCELLED'}
+        
+        # copy=True keeps the open file's path, and remaps relative paths for the new location
+        snapshot = os.path.join(tempfile.mkdtemp(prefix="hns_playblast_"), bpy.path.basename(shot))
+        bpy.ops.wm.save_as_mainfile(filepath=snapshot, copy=True)
+        
+        shot_hash = playblast_hash(shot, addon_prefs) if cacheable else None
+        playblast_jobs.append(PlayblastJob(shot, snapshot, addon_prefs, shot_hash))
+        
+        if not ANIM_OT_playblast_monitor.running:
+            bpy.ops.anim.playblast_monitor()
+        
+        queued = len(get_active_playblast_jobs())
+        self.report({'INFO'}, "Queued background playblast of %s (%d in queue)" % (get_shot_name(shot), queued))
+        return {'FINISHED'}
+
+
+class ANIM_OT_playblast_monitor(bpy.types.Operator):
+    """Starts queued background playblasts and shows their progress in the status bar"""
+    
+    bl_idname = "anim.playblast_monitor"
+    bl_label = "Background Playblast Monitor"
+    bl_options = {'INTERNAL'}
+    
+    running = False  # class wide, there's only ever one monitor
+    
+    def execute(self, context):
+        ANIM_OT_playblast_monitor.running = True
+        self.timer = context.window_manager.event_timer_add(0.5, window=context.window)
+        context.window_manager.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+    
+    def modal(self, context, event):
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+        
+        for job in playblast_jobs:
+            if job.poll():
+                level = 'INFO' if job.status == 'DONE' else 'ERROR'
+                self.report({level}, "Background playblast of %s %s" % (job.name, job.status.lower()))
+        
+        active = get_active_playblast_jobs()
+        if active and not any(job.status == 'RUNNING' for job in active):
+            active[0].start()
+        
+        if not active:
+            playblast_jobs.clear()
+            self.stop(context)
+            return {'FINISHED'}
+        
+        running = next(job for job in active if job.status == 'RUNNING')
+        text = "Playblasting %s: %d%%" % (running.name, running.progress * 100)
+        if len(active) > 1:
+            text += " (%d more queued)" % (len(active) - 1)
+        context.workspace.status_text_set(text)
+        return {'PASS_THROUGH'}
+    
+    # Blender cancels modal operators when their window closes or another file is loaded. The
+    # jobs keep going, the next background playblast starts a new monitor for them.
+    def cancel(self, context):
+        self.stop(context)
+    
+    def stop(self, context):
+        if context.workspace:
+            context.workspace.status_text_set(None)
+        context.window_manager.event_timer_remove(self.timer)
+        ANIM_OT_playblast_monitor.running = False
+
+
+# In case the monitor went away without being cancelled, a new file gets a new one
+@bpy.app.handlers.persistent
+def reset_playblast_monitor(*args):
+    ANIM_OT_playblast_monitor.running = False
+
+
+class ANIM_OT_playblast_background_cancel(bpy.types.Operator):
+    """Cancels the running and queued background playblasts"""
+    
+    bl_idname = "anim.playblast_background_cancel"
+    bl_label = "Cancel Background Playblasts"
+    
+    @classmethod
+    def poll(cls, context):
+        return len(get_active_playblast_jobs()) > 0
+    
+    def execute(self, context):
+        jobs = get_active_playblast_jobs()
+        for job in jobs:
+            job.cancel()
+        self.report({'INFO'}, "Cancelled %d background playblasts" % len(jobs))
+        return {'FINISHED'}
+
+
+classes = (
+    ANIM_OT_playblast_background,
+    ANIM_OT_playblast_monitor,
+    ANIM_OT_playblast_background_cancel,
+)
+
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+    
+    bpy.app.handlers.load_post.append(reset_playblast_monitor)
+
+
+def unregister():
+    bpy.app.handlers.load_post.remove(reset_playblast_monitor)
+    for job in get_active_playblast_jobs():
+        job.cancel()
+    
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
@@ -0,0 +1,155 @@
+# Benchmark results and the baseline they're checked against. The benchmarks themselves run in
+# background Blenders (see benchmarks.py and --benchmark in cli.py), which print a line per
+# measurement:
+#   HNS_BENCH {"name": "tests/layout_test_scene_act1.blend: key whole character Pebble_proxy", "timings": [...]}
+#
+# The baseline is a JSON file kept in the repository (benchmark_baseline.json, next to the addon)
+# with the median of each measurement. A measurement whose median is more than the threshold
+# slower than the baseline's is a regression. A measurement of one of the benchmarked files that
+# is in the baseline but wasn't made is missing, and fails the benchmarks too. Timings depend on
+# the machine, so the baseline says which one it was made on, and is updated with --update-baseline.
+#
+# Doesn't import bpy, results saved with --benchmark --output can be checked again:
+#   python -m hns_production_addon.baseline results.json
+
+import json
+import os
+import platform
+import statistics
+
+
+RESULT_PREFIX = "HNS_BENCH "
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmark_baseline.json")
+
+# 25% slower than the baseline is a regression, unless it's under a millisecond
+# (timer and scheduling noise)
+THRESHOLD = 0.25
+NOISE_FLOOR = 0.001
+
+
+def format_result(name, timings, **info):
+    """The line a benchmark prints for a measurement (timings in seconds)"""
+    return RESULT_PREFIX + json.dumps(dict(info, name=name, timings=timings))
+
+
+def parse_results(output):
+    """{name: {"median", "min", "runs", ...}} from the result lines in Blender's output"""
+    results = {}
+    for line in output.splitlines():
+        if not line.startswith(RESULT_PREFIX):
+            continue
+        result = json.loads(line[len(RESULT_PREFIX):])
+        timings = result.pop("timings")
+        name = result.pop("name")
+        results[name] = dict(result, median=statistics.median(timings), min=min(timings), runs=len(timings))
+    return results
+
+
+def get_machine():
+    return "%s (%s, %s)" % (platform.node(), platform.machine(), platform.system())
+
+
+def load_baseline(path=BASELINE_PATH):
+    """{"machine", "blender", "results"}, None if there's no baseline yet"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_baseline(results, blender, path=BASELINE_PATH):
+    with open(path + ".tmp", 'w') as f:
+        json.dump({"machine": get_machine(), "blender": blender, "results": results}, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def get_file(name):
+    """The file a measurement was made on (its name up to the first ": ")"""
+    return name.split(": ", 1)[0]
+
+
+def compare(results, baseline, threshold=THRESHOLD, files=None):
+    """[(name, baseline median or None, median or None, status)] with status 'slower', 'faster',
+    'same', 'new' (not in the baseline) or 'missing' (in the baseline for one of the files, which
+    are all of the baseline's by default, but not in the results)"""
+    rows = []
+    old_results = baseline["results"] if baseline else {}
+    names = set(results)
+    names.update(name for name in old_results if files is None or get_file(name) in files)
+    for name in sorted(names):
+        old = old_results.get(name)
+        if name not in results:
+            rows.append((name, old["median"], None, 'missing'))
+            continue
+        median = results[name]["median"]
+        if old is None:
+            rows.append((name, None, median, 'new'))
+            continue
+        old = old["median"]
+        if abs(median - old) < NOISE_FLOOR:
+            status = 'same'
+        elif median > old * (1 + threshold):
+            status = 'slower'
+        elif median < old / (1 + threshold):
+            status = 'faster'
+        else:
+            status = 'same'
+        rows.append((name, old, median, status))
+    return rows
+
+
+def format_time(seconds):
+    return "%.2fs" % seconds if seconds >= 1 else "%.2fms" % (seconds * 1000) if seconds >= 0.001 \
+        else "%.1fus" % (seconds * 1e6)
+
+
+def format_comparison(rows, baseline=None):
+    lines = []
+    if baseline and baseline.get("machine") != get_machine():
+        lines.append("The baseline is from %s, this is %s: the timings may not compare" % (baseline.get("machine"),
+                                                                                         get_machine()))
+    width = max((len(row[0]) for row in rows), default=0)
+    for name, old, median, status in rows:
+        if median is None:
+            lines.append("%-*s %10s  baseline %10s  MISSING" % (width, name, "-", format_time(old)))
+        elif old is None:
+            lines.append("%-*s %10s  (new)" % (width, name, format_time(median)))
+        else:
+            lines.append("%-*s %10s  baseline %10s  %+5.0f%%%s" % (width, name, format_time(median), format_time(old),
+                (median / old - 1) * 100 if old else 0, "  SLOWER" if status == 'slower' else ""))
+
+    def count(status):
+        return sum(1 for row in rows if row[3] == status)
+
+    lines.append("%d measurements, %d slower than the baseline, %d faster, %d new, %d missing" % (
+        len(rows) - count('missing'), count('slower'), count('faster'), count('new'), count('missing')))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m hns_production_addon.baseline",
+        description="Checks benchmark results (saved by the addon's --benchmark --output) against the baseline")
+    parser.add_argument("results", help="results JSON file")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON file (default: %(default)s)")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+        help="how much slower than the baseline is a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    with open(args.results) as f:
+        saved = json.load(f)
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print("No baseline at %s" % args.baseline)
+        return 1
+    # older results don't list the files, those with results are checked
+    files = saved.get("files") or sorted({get_file(name) for name in saved["results"]})
+    rows = compare(saved["results"], baseline, args.threshold, files)
+    print(format_comparison(rows, baseline))
+    return 1 if any(row[3] in ('slower', 'missing') for row in rows) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,495 @@
+# Playblasts without a UI: the worker side (what runs in each background Blender) and the
+# batch side that runs a pool of workers over many shots.
+
+import bpy
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from . import blendfile, contact, encoders, jobserver, playdiff, proxies, rigs, settings, validate
+from .libraries import OPEN_ARG
+from .playblast import (compare_playblast, forget_playblast, get_playblast_filename, get_playblast_settings,
+                        get_playblast_size, get_shot_name, get_texture_size, playblast_hash, playblast_is_current,
+                        record_playblast, render_playblast, render_viewport, set_playblast_settings)
+from .prefs import copy_playblast_prefs
+
+
+#####################       Batch Playblast       #####################
+
+# Playblasts without a UI (blender -b). There's no 3D View to render from, so the frames are
+# rendered from the scene camera with the scene's display shading (see render_viewport()).
+# Nothing is restored since the file is never saved.
+# The shot name comes from the open file, unless it's given (e.g. for a snapshot of the shot
+# that has a different file name). The output goes next to the shot file, unless it's given.
+# The progress is printed for PlayblastJob.read_output() (see background.py).
+PROGRESS_PREFIX = "HNS_PROGRESS "
+
+
+def playblast_background(scene, prefs, shot_name=None, output=None):
+    shot_name = shot_name or get_shot_name()
+    
+    # picked up by PlayblastJob.read_output()
+    def print_progress(scene, *args):
+        print("%s%d %d %d" % (PROGRESS_PREFIX, scene.frame_current, scene.frame_start, scene.frame_end), flush=True)
+    
+    with settings.SettingsSnapshot() as snapshot:
+        set_playblast_settings(bpy.context, prefs, shot_name, snapshot)
+        if output:
+            snapshot.set(scene.render, "filepath", output)
+        
+        bpy.app.handlers.frame_change_post.append(print_progress)
+        try:
+            render_playblast(prefs, shot_name, folder=os.path.dirname(os.path.normpath(output)) if output else None)
+        finally:
+            bpy.app.handlers.frame_change_post.remove(print_progress)
+
+
+# Sharded playblasts: long shots are split into frame ranges that are rendered by separate
+# workers as numbered PNGs (lossless, with the stamp already burnt in), then stitched into
+# the usual _playblast.mp4 in frame order by one more worker.
+def get_shard_frames_dir(shot_name):
+    return "//" + shot_name + "_playblast_frames" + os.sep
+
+
+# Frame range of one shard (0 based) out of shards, or None if there are more shards than frames
+def shard_frame_range(frame_start, frame_end, shard, shards):
+    count = frame_end - frame_start + 1
+    first = frame_start + count * shard // shards
+    last = frame_start + count * (shard + 1) // shards - 1
+    return (first, last) if first <= last else None
+
+
+def playblast_shard_background(scene, prefs, shard, shards):
+    frame_range = shard_frame_range(scene.frame_start, scene.frame_end, shard, shards)
+    if frame_range is None:
+        return
+    
+    shot_name = get_shot_name()
+    
+    with settings.SettingsSnapshot() as snapshot:
+        set_playblast_settings(bpy.context, prefs, shot_name, snapshot)
+        snapshot.apply(bpy.context, encoders.PROFILES['PNG'].settings)
+        snapshot.apply(bpy.context, {
+            "scene.render.filepath": get_shard_frames_dir(shot_name),
+            "scene.frame_start": frame_range[0],
+            "scene.frame_end": frame_range[1],
+        })
+        render_playblast(prefs, "%s_shard%d" % (shot_name, shard + 1), stream=False, diff=False)
+
+
+# Encodes the shard frames into the _playblast.mp4 with ffmpeg if streaming is enabled, or
+# through the sequencer of a temporary scene with the same encoding settings as a normal
+# playblast. The frames are deleted afterwards. For image sequence playblasts the frames
+# just become the playblast. Like a normal playblast, it's compared with the playblast it
+# replaces if that's enabled.
+def stitch_playblast_background(scene, prefs):
+    shot_name = get_shot_name()
+    frames_dir = bpy.path.abspath(get_shard_frames_dir(shot_name))
+    frames = sorted((f for f in os.listdir(frames_dir) if f.endswith(".png")),
+        key=lambda f: int(os.path.splitext(f)[0]))
+    
+    # a missing frame would silently shift every following frame
+    expected = scene.frame_end - scene.frame_start + 1
+    if len(frames) != expected:
+        raise RuntimeError("%s: expected %d shard frames, found %d" % (shot_name, expected, len(frames)))
+    
+    output = bpy.path.abspath("//" + get_playblast_filename(shot_name, prefs))
+    previous = playdiff.set_aside(output) if prefs.playblast_diff else None
+    try:
+        stitch_frames(scene, prefs, shot_name, frames_dir, frames, output)
+    except BaseException:
+        if previous:
+            playdiff.restore(previous, output)
+        raise
+    if previous:
+        compare_playblast(scene, previous, output)
+
+
+def stitch_frames(scene, prefs, shot_name, frames_dir, frames, output):
+    profile = encoders.PROFILES[prefs.playblast_encoder]
+    if profile.image_sequence:
+        shutil.rmtree(output, ignore_errors=True)
+        os.replace(frames_dir, output)
+        return
+    
+    ffmpeg = encoders.find_ffmpeg() if prefs.playblast_stream and profile.ffmpeg_args else None
+    if ffmpeg:
+        subprocess.run(encoders.encode_frames_command(ffmpeg, os.path.join(frames_dir, "%04d.png"),
+            scene.frame_start, scene.render.fps / scene.render.fps_base, profile, output), check=True)
+        shutil.rmtree(frames_dir)
+        return
+    
+    stitch = bpy.data.scenes.new(shot_name + "_stitch")
+    settings.apply_settings(stitch, {path[len("scene."):]: value
+        for path, value in get_playblast_settings(prefs, shot_name).items()})
+    
+    render = stitch.render
+    render.fps = scene.render.fps
+    render.fps_base = scene.render.fps_base
+    # the frames are already scaled and stamped
+    render.resolution_x = scene.render.resolution_x * prefs.playblast_scale // 100
+    render.resolution_y = scene.render.resolution_y * prefs.playblast_scale // 100
+    render.resolution_percentage = 100
+    render.pixel_aspect_x = scene.render.pixel_aspect_x
+    render.pixel_aspect_y = scene.render.pixel_aspect_y
+    render.use_stamp = False
+    render.use_sequencer = True
+    
+    # pass the frames through untouched
+    stitch.view_settings.view_transform = 'Standard'
+    stitch.view_settings.look = 'None'
+    stitch.view_settings.exposure = 0.0
+    stitch.view_settings.gamma = 1.0
+    
+    stitch.frame_start = scene.frame_start
+    stitch.frame_end = scene.frame_end
+    
+    sequences = stitch.sequence_editor_create().sequences
+    strip = sequences.new_image(name="frames", filepath=os.path.join(frames_dir, frames[0]),
+        channel=1, frame_start=scene.frame_start)
+    for frame in frames[1:]:
+        strip.elements.append(frame)
+    
+    bpy.ops.render.render(animation=True, scene=stitch.name)
+    shutil.rmtree(frames_dir)
+
+
+# Every shot file in the given folders (sorted, so progress follows shot order).
+# Paths to .blend files are passed through as they are.
+def find_shots(paths):
+    shots = []
+    for path in paths:
+        if os.path.isdir(path):
+            shots.extend(sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".blend")))
+        else:
+            shots.append(path)
+    return shots
+
+
+# Command line options that give a worker the same playblast options as the batch (see cli.py)
+def playblast_worker_args(prefs):
+    return ["--prefs", json.dumps(vars(copy_playblast_prefs(prefs)))]
+
+
+# Command line that runs the addon's command line (see cli.py) in a background Blender
+# on the shot (if any) with the given options
+def blender_worker_command(shot, args):
+    return [bpy.app.binary_path, "--background"] + ([shot] if shot else []) + ["--python-exit-code", "1",
+            "--python", os.path.join(os.path.dirname(os.path.abspath(__file__)), "__main__.py"), "--"] + args
+
+
+# Returns (succeeded, seconds, blender output).
+def run_blender_worker(shot, args):
+    start = time.perf_counter()
+    result = subprocess.run(blender_worker_command(shot, args),
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    return result.returncode == 0, time.perf_counter() - start, result.stdout
+
+
+# Runs (shot, args, label) jobs with a pool of workers, printing progress as they finish.
+# Returns {(shot, label): succeeded}.
+def run_worker_pool(jobs, workers):
+    results = {}
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_blender_worker, shot, args): (shot, label) for shot, args, label in jobs}
+        
+        for done, future in enumerate(as_completed(futures), 1):
+            shot, label = futures[future]
+            succeeded, seconds, output = future.result()
+            
+            status = "done" if succeeded else "FAILED"
+            print("[%d/%d] %s%s %s (%.1fs)" % (done, len(jobs), get_shot_name(shot), label, status, seconds))
+            if not succeeded:
+                print("\n".join(output.splitlines()[-20:]))
+            results[shot, label] = succeeded
+    return results
+
+
+# Playblasts the shots with a pool of background Blender processes (one per core by default),
+# skipping shots whose playblast is up to date unless force is set.
+# With shards > 1 each shot is split into that many frame ranges rendered by separate workers.
+# With check, shots whose settings are wrong (see validate.py) aren't playblasted and count as failed.
+# Returns the shots that failed.
+def batch_playblast(shots, prefs, jobs=None, force=False, shards=1, check=True):
+    jobs = jobs or os.cpu_count() or 1
+    args = playblast_worker_args(prefs)
+    failed = []
+    
+    if not force:
+        current = [shot for shot in shots if playblast_is_current(shot, prefs)]
+        if current:
+            print("Skipping %d shots with up to date playblasts" % len(current))
+        shots = [shot for shot in shots if shot not in current]
+    
+    wrong = []
+    if check:
+        results = [result for result in validate.validate_files(shots) if result["problems"]]
+        wrong = [result["path"] for result in results]
+        if wrong:
+            print(validate.format_report(results))
+            print("Skipping %d shots with wrong settings (fix them with --validate --fix)" % len(wrong))
+            shots = [shot for shot in shots if shot not in wrong]
+    
+    print("Playblasting %d shots with %d workers" % (len(shots), jobs))
+    start = time.perf_counter()
+    # hashed before they render, a shot saved again meanwhile is playblasted again next time
+    hashes = {shot: playblast_hash(shot, prefs) for shot in shots}
+    
+    if prefs.playblast_texture_proxies and shots:
+        # made once here, rather than by every worker that needs them
+        try:
+            proxies.load_cache(shots[0]).prepare(shots, get_texture_size(prefs), jobs)
+        except (OSError, ValueError, blendfile.BlendFileError) as e:
+            print("Couldn't make the texture proxies: %s" % e)
+    
+    if shards > 1:
+        # frames left over from an interrupted run could be from an older version of the shot
+        for shot in shots:
+            frames_dir = os.path.join(os.path.dirname(os.path.abspath(shot)),
+                get_shard_frames_dir(get_shot_name(shot))[2:])
+            shutil.rmtree(frames_dir, ignore_errors=True)
+        
+        results = run_worker_pool([(shot, args + ["--playblast-shard", "%d/%d" % (shard, shards)],
+                                    " shard %d/%d" % (shard + 1, shards))
+                                   for shot in shots for shard in range(shards)], jobs)
+        
+        for shot in shots:
+            if not all(results[shot, " shard %d/%d" % (shard + 1, shards)] for shard in range(shards)):
+                failed.append(shot)
+        
+        print("Stitching %d shots" % (len(shots) - len(failed)))
+        results = run_worker_pool([(shot, args + ["--stitch-shot"], " stitch")
+                                   for shot in shots if shot not in failed], jobs)
+    else:
+        results = run_worker_pool([(shot, args + ["--playblast-shot"], "") for shot in shots], jobs)
+    
+    # only this thread writes the manifests, so workers don't race each other
+    for (shot, label), succeeded in results.items():
+        if succeeded:
+            record_playblast(shot, prefs, hashes[shot])
+        else:
+            failed.append(shot)
+    for shot in failed:
+        forget_playblast(shot)
+    
+    print("Playblasted %d/%d shots in %.1fs" % (len(shots) - len(failed), len(shots), time.perf_counter() - start))
+    return failed + wrong
+
+
+# Checks the open shot's settings (see validate.py) in a worker, fixing and saving it with fix.
+# Exits with an error if any are still wrong.
+def validate_background(fix=False):
+    problems = validate.check_context(bpy.context)
+    if problems and fix:
+        problems = validate.fix_context(bpy.context)
+        bpy.ops.wm.save_mainfile()
+    
+    for problem in problems:
+        print(problem)
+    if problems:
+        sys.exit(1)
+
+
+# Checks the settings of every .blend file under the paths from their headers, starting background
+# Blenders only for the files whose header can't be read. With fix, the shots with wrong settings
+# are fixed and saved by a pool of workers. Returns the shots that are still wrong.
+def batch_validate(paths, jobs=None, fix=False):
+    jobs = jobs or os.cpu_count() or 1
+    start = time.perf_counter()
+    
+    results = validate.validate_files(blendfile.find_blend_files(paths))
+    print(validate.format_report(results))
+    wrong = [result["path"] for result in results if result["problems"]]
+    unread = [result["path"] for result in results if result["problems"] is None]
+    
+    if unread:
+        print("Checking %d shots in Blender with %d workers" % (len(unread), jobs))
+        checked = run_worker_pool([(shot, ["--validate-shot"], "") for shot in unread], jobs)
+        wrong.extend(shot for (shot, label), succeeded in checked.items() if not succeeded)
+    
+    if fix and wrong:
+        print("Fixing %d shots with %d workers" % (len(wrong), jobs))
+        fixed = run_worker_pool([(shot, ["--validate-shot", "--fix"], " fix") for shot in wrong], jobs)
+        wrong = [shot for (shot, label), succeeded in fixed.items() if not succeeded]
+    
+    print("%d shots with wrong settings left (%.1fs)" % (len(wrong), time.perf_counter() - start))
+    return wrong
+
+
+# Named groups of settings that can be saved into many shot files at once with --apply-profile:
+#   shot       the settings every shot file should have (settings.SHOT_SETTINGS)
+#   playblast  the playblast output, encoding and stamp settings
+SETTINGS_PROFILES = ["shot", "playblast"]
+
+
+def get_settings_profile(name, prefs, shot_name):
+    if name == "shot":
+        return settings.SHOT_SETTINGS
+    elif name == "playblast":
+        return get_playblast_settings(prefs, shot_name)
+    raise ValueError("Unknown settings profile: %s" % name)
+
+
+def apply_profile_background(name, prefs):
+    settings.apply_settings(bpy.context, get_settings_profile(name, prefs, get_shot_name()))
+    bpy.ops.wm.save_mainfile()
+
+
+# Saves the named settings profile into each shot file with a pool of background Blender processes.
+# Returns the shots that failed.
+def batch_apply_profile(shots, name, prefs, jobs=None):
+    jobs = jobs or os.cpu_count() or 1
+    args = playblast_worker_args(prefs) + ["--apply-profile-shot", name]
+    
+    print("Applying the %s profile to %d shots with %d workers" % (name, len(shots), jobs))
+    results = run_worker_pool([(shot, args, "") for shot in shots], jobs)
+    return [shot for (shot, label), succeeded in results.items() if not succeeded]
+    
+
+
+#####################       Shot Jobs       #####################
+
+# Bakes the shot's character rigs with visual keying (constraints and IK included) on every
+# frame, into a copy of the shot next to it (<shot>_baked.blend), for handing the animation on.
+def bake_background(scene):
+    shot_name = get_shot_name()
+    rig_objects = [obj for obj in scene.objects if rigs.find_descriptor(obj) is not None]
+    if not rig_objects:
+        print("No Pebble or Twig rigs in " + shot_name)
+        return
+    
+    for rig in rig_objects:
+        bpy.context.view_layer.objects.active = rig
+        bpy.ops.object.mode_set(mode='POSE')
+        bpy.ops.pose.select_all(action='SELECT')
+        bpy.ops.nla.bake(frame_start=scene.frame_start, frame_end=scene.frame_end, only_selected=True,
+                         visual_keying=True, bake_types={'POSE'})
+        bpy.ops.object.mode_set(mode='OBJECT')
+        print("Baked %s, frames %d-%d" % (rig.name, scene.frame_start, scene.frame_end))
+    
+    bpy.ops.wm.save_as_mainfile(filepath=bpy.path.abspath("//" + shot_name + "_baked.blend"), copy=True)
+
+
+def get_thumbnail_path(shot):
+    return os.path.join(os.path.dirname(os.path.abspath(shot)), get_shot_name(shot) + "_thumbnail.png")
+
+
+# Renders one frame (the middle one by default) with the playblast camera, shading and stamp
+# as <shot>_thumbnail.png next to the shot. The shot name comes from the open file unless it's given.
+def thumbnail_background(scene, prefs, frame=None, output=None, shot_name=None):
+    shot_name = shot_name or get_shot_name()
+    output = output or get_thumbnail_path(os.path.join(os.path.dirname(bpy.data.filepath), shot_name + ".blend"))
+    
+    with settings.SettingsSnapshot() as snapshot:
+        set_playblast_settings(bpy.context, prefs, shot_name, snapshot)
+        snapshot.apply(bpy.context, encoders.PROFILES['PNG'].settings)
+        snapshot.apply(bpy.context, {"scene.render.filepath": output})
+        scene.frame_set((scene.frame_start + scene.frame_end) // 2 if frame is None else frame)
+        render_viewport(write_still=True)
+
+
+# Contact sheets (see contact.py) of the sequence folders (or the shots folder). Shots without a
+# playblast get a snapshot of their middle frame from a pool of workers. Returns the shots that
+# failed.
+def batch_contact_sheets(folders, prefs, jobs=None, force=False):
+    jobs = jobs or os.cpu_count() or 1
+    args = playblast_worker_args(prefs) + ["--thumbnail-shot"]
+    
+    def snapshot(outputs):
+        results = run_worker_pool([(shot, args + ["--output", output], " snapshot") for shot, output in outputs],
+                                  jobs)
+        return [shot for (shot, label), succeeded in results.items() if not succeeded]
+    
+    failed = []
+    for folder in contact.find_sequences(folders):
+        start = time.perf_counter()
+        try:
+            result = contact.make_contact_sheet(folder, snapshot=snapshot, jobs=jobs, force=force)
+        except contact.ContactSheetError as e:
+            print("%s: %s" % (folder, e))
+            continue
+        failed += result["failed"]
+        print("%s: %d shots, %d updated (%.1fs)" % (os.path.relpath(contact.get_sheet_path(folder)),
+            len(result["shots"]), len(result["updated"]), time.perf_counter() - start))
+    return failed
+
+
+#####################       Job Server       #####################
+
+# Runs the job server (see jobserver.py) with warm workers, until it's shut down. Playblasts use
+# these options, are skipped if they're up to date (unless forced) and are recorded when they're
+# done, like batch playblasts. Each worker keeps up to library_cache MB of linked libraries loaded
+# between shots (see libraries.py).
+def serve_jobs(prefs, workers=None, recycle=20, library_cache=0):
+    args = playblast_worker_args(prefs)
+    
+    def prepare(job):
+        if job.kind == "playblast":
+            if not job.force and playblast_is_current(job.shot, prefs):
+                return None
+            problems = validate.validate_file(job.shot)["problems"]
+            if problems:
+                raise jobserver.JobServerError("Wrong shot settings: " + "; ".join(problems))
+            # the shot could be saved again while it's being playblasted
+            job.data["hash"] = playblast_hash(job.shot, prefs)
+        if job.crashes:
+            # in case appending it to the shot the worker had open is what crashed it (see libraries.py)
+            return args + jobserver.JOB_KINDS[job.kind] + [OPEN_ARG]
+        return args + jobserver.JOB_KINDS[job.kind]
+    
+    def finished(job):
+        if job.kind == "playblast" and job.state == 'done':
+            record_playblast(job.shot, prefs, job.data["hash"])
+        elif job.kind == "playblast" and job.state in ('failed', 'cancelled'):
+            forget_playblast(job.shot)
+        print("Job %d: %s %s %s (%.1fs)" % (job.id, job.kind, get_shot_name(job.shot), job.state, job.seconds))
+        if job.state == 'failed':
+            print("\n".join(job.output.splitlines()[-20:]))
+    
+    server = jobserver.JobServer(blender_worker_command(None, ["--job-worker", "--library-cache", str(library_cache)]),
+                                 workers or os.cpu_count() or 1, recycle, prepare, finished)
+    server.serve()
+
+
+# Playblasts the shot once per encoder profile (and streamed, where ffmpeg is available) with
+# background workers one at a time, and prints the time each took and the size of the output.
+def bench_encoders(shot, prefs):
+    ffmpeg = encoders.find_ffmpeg()
+    if ffmpeg is None:
+        print("ffmpeg not found, only benchmarking Blender's encoder")
+    
+    folder = tempfile.mkdtemp(prefix="hns_encoders_")
+    results = []
+    try:
+        for name, profile in encoders.PROFILES.items():
+            for stream in (False, True):
+                if stream and (ffmpeg is None or profile.ffmpeg_args is None):
+                    continue
+                
+                bench_prefs = copy_playblast_prefs(prefs)
+                bench_prefs.playblast_encoder = name
+                bench_prefs.playblast_stream = stream
+                bench_prefs.playblast_timings = False
+                label = profile.label + (" (ffmpeg)" if stream else "")
+                output = os.path.join(folder, name + ("_stream" if stream else "") + profile.extension)
+                
+                succeeded, seconds, log = run_blender_worker(shot, playblast_worker_args(bench_prefs)
+                    + ["--playblast-shot", "--output", output])
+                if not succeeded:
+                    print("%s FAILED\n%s" % (label, "\n".join(log.splitlines()[-20:])))
+                    continue
+                results.append((label, seconds, get_playblast_size(output)))
+                print("%-24s %7.1fs %9.1fMB" % (label, seconds, results[-1][2] / 1e6), flush=True)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    
+    print("\n%s:" % get_shot_name(shot))
+    for label, seconds, size in sorted(results, key=lambda result: result[1]):
+        print("  %-24s %7.1fs %9.1fMB" % (label, seconds, size / 1e6))
@@ -0,0 +1,289 @@
+# The benchmark suite: times the playblast, the rig operators (Key Whole Character, FK/IK
+# switch baking) and the rig panels' draw() on the sample files, each in a background Blender
+# of its own, and checks the results against the baseline (see baseline.py).
+#
+#   blender -b -P hns_production_addon/__main__.py -- --benchmark [FILES] [--update-baseline]
+#
+# Without files it runs on the test shots (production/shots/tests) and the linked character
+# rigs. The rig operators run over a synthetic frame range (--frames) and the playblast over
+# PLAYBLAST_FRAMES, so the timings don't depend on how long the shots happen to be. Each
+# measurement is repeated (--repeat) and compared by its median. The committed baseline was
+# made with --solid, so its playblasts are only compared with solid ones.
+#
+# The playblast is timed through playblast_background(), what ANIM_OT_playblast runs, since
+# the operator itself needs a window and a background Blender doesn't have one. Batch playblasts
+# skip shots with wrong settings (see validate.py), the benchmarks fix what they can in their
+# worker (which never saves) and time the rest as it is: the test shots have no render_cam, so
+# they're playblasted with their own camera.
+#
+# The test shots link their libraries from where they used to be (//..\3D_assets\...), and Twig
+# from twig_rig.blend, which disembodied_twig_arms.blend has replaced: opened as they are, their
+# rigs are proxies without bones, and there's no FK/IK limb to bake. They're benchmarked from
+# a copy with those libraries found in the production folder (see relink_copy()). A measurement
+# that can't be made is an error, and one that's in the baseline but wasn't made is a failure.
+
+import bpy
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from . import baseline, blendfile, rigs, validate
+from .batch import playblast_background, playblast_worker_args, run_blender_worker
+from .prefs import copy_playblast_prefs
+
+
+PRODUCTION_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+SAMPLE_FILES = [
+    "shots/tests/layout_test_scene_act1.blend",
+    "shots/tests/layout_test_scene_act2.blend",
+    "shots/tests/layout_test_scene_act3.blend",
+    "3D_assets/linked_assets/character/pebble/pebble_bag.blend",
+    "3D_assets/linked_assets/character/twig/disembodied_twig_arms.blend",
+]
+
+# Libraries the test shots link that were replaced, by file name: {old: new in the same folder}
+LIBRARY_STAND_INS = {"twig_rig.blend": "disembodied_twig_arms.blend"}
+
+# Playblasts are much slower than the rest, so they get fewer frames and runs
+PLAYBLAST_FRAMES = 24
+PLAYBLAST_REPEAT = 3
+# draw() is timed over this many calls per run
+DRAWS = 1000
+
+
+def time_runs(function, repeat, setup=None):
+    timings = []
+    for i in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings, **info):
+    print(baseline.format_result(name, timings, **info), flush=True)
+
+
+# Where a library the file links is in the production folder when it isn't where the file says,
+# None if it's there or can't be found. The path is looked up from its 3D_assets folder on.
+def find_moved_library(library, path):
+    if os.path.isfile(blendfile.abspath(library, path)):
+        return None
+    parts = library.replace("\\", "/").split("/")
+    if "3D_assets" not in parts:
+        return None
+    parts = parts[parts.index("3D_assets"):]
+    parts[-1] = LIBRARY_STAND_INS.get(parts[-1], parts[-1])
+    moved = os.path.join(PRODUCTION_ROOT, *parts)
+    return moved if os.path.isfile(moved) else None
+
+
+# A copy of the file in the folder linking its moved libraries where they are now (with its other
+# relative paths made absolute, the copy being elsewhere), the file itself if none moved
+def relink_copy(path, folder):
+    with blendfile.BlendFile(path) as blend:
+        libraries = blendfile.read_libraries(blend)
+    moved = {library: find_moved_library(library, path) for library in libraries}
+    moved = {library: new for library, new in moved.items() if new}
+    if not moved:
+        return path
+    
+    def remap(stored):
+        if stored in moved:
+            return moved[stored]
+        return blendfile.abspath(stored, path) if stored.startswith("//") else None
+    
+    copy = os.path.join(folder, os.path.basename(path))
+    blendfile.write_copy(path, copy, remap)
+    return copy
+
+
+# The character rigs in the open file: their proxies in shots, and in the character files
+# (where there aren't any proxies yet) the armatures with one of the character's limbs
+def find_rigs():
+    found = [(obj, rigs.find_descriptor(obj)) for obj in bpy.data.objects if rigs.find_descriptor(obj)]
+    if found:
+        return found
+    for descriptor in rigs.RIGS:
+        for obj in bpy.data.objects:
+            if obj.type == 'ARMATURE' and any(all(bone in obj.pose.bones for bone in limb.bones())
+                                              for limb in descriptor.limbs.values()):
+                # the rig code finds the rigs by their proxy's name, and this file is never saved
+                obj.name = descriptor.object_prefix
+                found.append((obj, descriptor))
+                break
+    return found
+
+
+def bench_playblast(scene, prefs, label, repeat):
+    folder = tempfile.mkdtemp(prefix="hns_bench_")
+    bench_prefs = copy_playblast_prefs(prefs)
+    bench_prefs.playblast_timings = False
+    bench_prefs.playblast_diff = False
+    
+    scene.frame_end = scene.frame_start + PLAYBLAST_FRAMES - 1
+    try:
+        output = os.path.join(folder, "playblast")
+        timings = time_runs(lambda: playblast_background(scene, bench_prefs, output=output), repeat)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    # solid shading takes a fraction of the time, so the two are different measurements
+    shading = "solid" if prefs.playblast_shade_solid else "material"
+    report("%s: playblast %d frames %s" % (label, PLAYBLAST_FRAMES, shading), timings, frames=PLAYBLAST_FRAMES)
+
+
+# Returns what couldn't be measured
+def bench_rig(rig, descriptor, label, frames, repeat):
+    from .rig_panels import (DATA_PT_pebble_rig, DATA_PT_pebble_rig_select, DATA_PT_pebble_rig_switches,
+                             DATA_PT_twig_rig, DATA_PT_twig_rig_select, DATA_PT_twig_rig_switches, NullLayout)
+    from .rig_tools import get_limb_mode
+    
+    scene = bpy.context.scene
+    frame_start, frame_end = scene.frame_start, scene.frame_start + frames - 1
+    # the character files keep their rig hidden, and a hidden object can't be posed: it's shown
+    # while it's benchmarked
+    hidden = rig.hide_viewport, rig.hide_get()
+    rig.hide_viewport = False
+    rig.hide_set(False)
+    bpy.context.view_layer.objects.active = rig
+    try:
+        bpy.ops.object.mode_set(mode='POSE')
+    except RuntimeError as e:
+        # in a hidden collection, or not in the view layer
+        return ["can't pose %s (%s)" % (rig.name, e)]
+    problems = []
+    
+    original = rig.animation_data.action if rig.animation_data else None
+    
+    def fresh_action():
+        # every run starts from the rig's own keys
+        if rig.animation_data is None:
+            rig.animation_data_create()
+        rig.animation_data.action = original.copy() if original else None
+    
+    timings = time_runs(lambda: bpy.ops.armature.key_whole_character(frames='RANGE', frame_start=frame_start,
+                                                                     frame_end=frame_end), repeat, fresh_action)
+    report("%s: key whole character %s" % (label, rig.name), timings, frames=frames)
+    
+    controls = rigs.resolve(rig, descriptor)
+    limb = next((limb for switch, limb in descriptor.limbs.items() if switch in controls.complete_limbs), None)
+    if limb is None:
+        problems.append("%s has no complete FK/IK limb (missing %s)" % (rig.name, ", ".join(controls.missing)))
+    else:
+        # only frames in the other mode are snapped, so the bake switches the limb out of the one it's in
+        fresh_action()
+        scene.frame_set(frame_start)
+        mode = 'FK' if get_limb_mode(rig.pose.bones, limb, descriptor.switch_property) == 'IK' else 'IK'
+        timings = time_runs(lambda: bpy.ops.armature.fk_ik_switch(mode=mode, switch_bone=limb.switch,
+            switch_name=descriptor.switch_property, bake=True, frame_start=frame_start, frame_end=frame_end),
+            repeat, fresh_action)
+        report("%s: FK/IK switch bake %s %s" % (label, rig.name, limb.name), timings, frames=frames)
+    
+    rig.animation_data.action = original
+    bpy.ops.object.mode_set(mode='OBJECT')
+    rig.hide_viewport = hidden[0]
+    rig.hide_set(hidden[1])
+    
+    panels = {rigs.PEBBLE: (DATA_PT_pebble_rig, DATA_PT_pebble_rig_switches, DATA_PT_pebble_rig_select),
+              rigs.TWIG: (DATA_PT_twig_rig, DATA_PT_twig_rig_switches, DATA_PT_twig_rig_select)}[descriptor]
+    panel = SimpleNamespace(layout=NullLayout())
+    context = SimpleNamespace(active_object=rig)
+    
+    def draw():
+        for i in range(DRAWS):
+            for cls in panels:
+                cls.draw(panel, context)
+    
+    timings = [seconds / DRAWS for seconds in time_runs(draw, repeat)]
+    report("%s: draw rig panels %s" % (label, rig.name), timings)
+    return problems
+
+
+# Runs every benchmark on the open file (in a worker), printing a result line for each. The label
+# names the file in the results (its path in the production folder by default). Exits with an
+# error if a measurement couldn't be made.
+def benchmark_background(prefs, repeat, frames, label=None):
+    from . import rig_tools
+    
+    label = label or os.path.relpath(bpy.data.filepath, PRODUCTION_ROOT).replace(os.sep, "/")
+    scene = bpy.context.scene
+    for problem in validate.fix_context(bpy.context):
+        print("%s: %s, benchmarking it anyway" % (label, problem))
+    
+    problems = []
+    found = find_rigs()
+    if not found:
+        problems.append("no character rigs")
+    # the rig operators are only registered when Blender has a UI
+    rig_tools.register()
+    try:
+        for rig, descriptor in found:
+            problems += bench_rig(rig, descriptor, label, frames, repeat)
+    finally:
+        rig_tools.unregister()
+    
+    if scene.camera:
+        bench_playblast(scene, prefs, label, min(repeat, PLAYBLAST_REPEAT))
+    else:
+        problems.append("no scene camera to playblast")
+    
+    for problem in problems:
+        print("%s: %s, not measured" % (label, problem))
+    if problems:
+        sys.exit(1)
+
+
+# Runs the benchmarks on the files (the sample files by default) with one background Blender
+# at a time, so they don't slow each other down. Prints the comparison with the baseline (or
+# replaces it with update) and returns whether any file failed, or any measurement was slower
+# than the threshold or missing. A failed run doesn't update the baseline.
+def run_benchmarks(prefs, paths=None, repeat=5, frames=250, threshold=baseline.THRESHOLD, update=False, output=None):
+    paths = paths or [os.path.join(PRODUCTION_ROOT, path) for path in SAMPLE_FILES]
+    args = playblast_worker_args(prefs) + ["--benchmark-shot", "--repeat", str(repeat),
+                                           "--frames", str(frames)]
+    
+    results = {}
+    files = []
+    failed = False
+    folder = tempfile.mkdtemp(prefix="hns_bench_relinked_")
+    try:
+        for path in paths:
+            label = os.path.relpath(os.path.abspath(path), PRODUCTION_ROOT).replace(os.sep, "/")
+            files.append(label)
+            copy = relink_copy(path, folder)
+            succeeded, seconds, log = run_blender_worker(copy, args + ["--benchmark-label", label])
+            found = baseline.parse_results(log)
+            results.update(found)
+            print("%s: %d measurements (%.1fs)%s%s" % (os.path.relpath(path), len(found), seconds,
+                ", relinked" if copy != path else "", "" if succeeded else " FAILED"), flush=True)
+            if not succeeded:
+                failed = True
+                print("\n".join(log.splitlines()[-20:]))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    
+    blender = bpy.app.version_string
+    if output:
+        with open(output, 'w') as f:
+            json.dump({"machine": baseline.get_machine(), "blender": blender, "files": files, "results": results},
+                      f, indent=1, sort_keys=True)
+    
+    old = baseline.load_baseline()
+    rows = baseline.compare(results, old, threshold, files)
+    print(baseline.format_comparison(rows, old))
+    if update and not failed:
+        baseline.save_baseline(results, blender)
+        print("Baseline saved to " + baseline.BASELINE_PATH)
+        return False
+    if update:
+        print("Some files failed, the baseline wasn't updated")
+    elif old is None:
+        print("No baseline yet, save one with --update-baseline")
+    return failed or any(row[3] in ('slower', 'missing') for row in rows)
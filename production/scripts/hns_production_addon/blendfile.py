@@ -0,0 +1,427 @@
+# Reads what the production tools need to know about a .blend file (linked libraries, images,
+# scene frame range, camera and resolution) straight from the file, without Blender.
+#
+# A .blend file is a header followed by file blocks, each with a small header of its own
+# (block code, size, the pointer it had in memory, struct index, count). The DNA1 block
+# describes the layout of every struct, so fields can be found by name for whichever
+# Blender version saved the file. Only the blocks we need are read, everything else
+# is skipped over.
+#
+# Doesn't import bpy, so it works in plain Python too:
+#   python -m hns_production_addon.blendfile production/shots/6_proposal
+
+import gzip
+import mmap
+import os
+import re
+import struct
+
+
+class BlendFileError(Exception):
+    pass
+
+
+# Returns a buffer with the (decompressed) file contents. Uncompressed files are
+# memory-mapped, so only the pages we actually read are loaded.
+def open_blend(path):
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+
+        if magic[:2] == b'\x1f\x8b':
+            # gzip, files saved with "Compress" before Blender 3.0
+            with gzip.open(path, 'rb') as gz:
+                return gz.read()
+
+        if magic == b'\x28\xb5\x2f\xfd':
+            # zstd, files saved with "Compress" since Blender 3.0
+            try:
+                import zstandard
+            except ImportError:
+                raise BlendFileError("%s is zstd compressed, reading it needs the zstandard module" % path)
+            f.seek(0)
+            with zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True) as reader:
+                return b"".join(iter(lambda: reader.read(1 << 20), b""))
+
+        if os.fstat(f.fileno()).st_size == 0:
+            raise BlendFileError("%s is empty" % path)
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class BlendFile:
+    """Block index and struct layouts of a .blend file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.data = open_blend(path)
+        self.blocks = {}  # block code -> [(data offset, length, old pointer, struct index, count)]
+        self.pointers = {}  # old pointer -> data offset, for blocks that can be pointed at
+
+        self.read_header()
+        self.read_blocks()
+        self.read_dna()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read_header(self):
+        header = bytes(self.data[:17])
+        if not header.startswith(b"BLENDER"):
+            raise BlendFileError("%s is not a .blend file" % self.path)
+
+        if header[7:9] == b"17":
+            # "BLENDER17-01v0500", Blender 5.0 and newer: 64 bit little endian, with 64 bit block sizes
+            self.header_size = 17
+            self.pointer_size = 8
+            self.endian = '<'
+            self.version = header[13:17].decode()
+            self.bhead = struct.Struct('<4siQqq')
+            self.large_bhead = True
+        else:
+            # "BLENDER-v280": pointer size ('_' 32 bit, '-' 64 bit), endianness ('v' little, 'V' big), version
+            self.header_size = 12
+            self.pointer_size = 8 if header[7:8] == b'-' else 4
+            self.endian = '<' if header[8:9] == b'v' else '>'
+            self.version = header[9:12].decode()
+            self.bhead = struct.Struct(self.endian + "4si" + ("Q" if self.pointer_size == 8 else "I") + "ii")
+            self.large_bhead = False
+
+    def read_blocks(self):
+        data = self.data
+        offset = self.header_size
+        unpack = self.bhead.unpack_from
+        size = self.bhead.size
+
+        while offset + size <= len(data):
+            if self.large_bhead:
+                code, sdna, old, length, count = unpack(data, offset)
+            else:
+                code, length, old, sdna, count = unpack(data, offset)
+            code = code.rstrip(b'\0').decode('latin-1')
+            offset += size
+
+            if code == "ENDB":
+                break
+            self.blocks.setdefault(code, []).append((offset, length, old, sdna, count))
+            self.pointers[old] = offset
+            offset += length
+
+    def read_dna(self):
+        if "DNA1" not in self.blocks:
+            raise BlendFileError("%s has no DNA1 block" % self.path)
+
+        offset, length = self.blocks["DNA1"][0][:2]
+        key = (self.endian, self.pointer_size, bytes(self.data[offset:offset + length]))
+
+        # files saved by the same Blender version share their DNA, so it's only parsed once
+        if key not in dna_cache:
+            dna_cache[key] = DNA(key[2], self.endian, self.pointer_size, self.path)
+        self.dna = dna_cache[key]
+
+    # Offset, type, is pointer and array length of a (possibly nested) field,
+    # e.g. ("r", "sfra") in Scene. Returns None if the field doesn't exist in this version.
+    def field(self, struct_name, path):
+        offset = 0
+        for name in path:
+            fields = self.dna.fields(struct_name)
+            if fields is None or name not in fields:
+                return None
+            field_offset, struct_name, is_pointer, array_length = fields[name]
+            offset += field_offset
+        return offset, struct_name, is_pointer, array_length
+
+    # Value of a field in the block whose data starts at block_offset: a number,
+    # a string for char arrays, or the old pointer for pointers.
+    def get(self, block_offset, struct_name, *path, default=None):
+        field = self.field(struct_name, path)
+        if field is None:
+            return default
+        offset, type_name, is_pointer, array_length = field
+        offset += block_offset
+
+        if is_pointer:
+            return struct.unpack_from(self.endian + ("Q" if self.pointer_size == 8 else "I"), self.data, offset)[0]
+        if type_name == "char" and array_length > 1:
+            value = bytes(self.data[offset:offset + array_length])
+            return value.split(b'\0', 1)[0].decode('utf-8', 'replace')
+
+        fmt = FIELD_FORMATS.get(type_name)
+        if fmt is None:
+            return default
+        return struct.unpack_from(self.endian + fmt, self.data, offset)[0]
+
+    # Data offsets of every block of a type, e.g. "SC" for scenes or "LI" for libraries
+    def iter_blocks(self, code):
+        for offset, length, old, sdna, count in self.blocks.get(code, ()):
+            yield offset, self.dna.struct_names[sdna]
+
+    def id_name(self, block_offset, struct_name):
+        # ID names start with the two letter ID code ("SCScene")
+        return self.get(block_offset, struct_name, "id", "name", default="")[2:]
+
+
+class DNA:
+    """Struct layouts from a DNA1 block. Field offsets are only worked out
+    for the structs that are actually looked at."""
+
+    def __init__(self, data, endian, pointer_size, path):
+        self.pointer_size = pointer_size
+
+        def read_names(offset, tag):
+            if data[offset:offset + 4] != tag:
+                raise BlendFileError("%s: corrupt DNA1 block (expected %s)" % (path, tag.decode()))
+            count = struct.unpack_from(endian + "i", data, offset + 4)[0]
+            offset += 8
+            end = offset
+            for _ in range(count):
+                end = data.index(b'\0', end) + 1
+            names = data[offset:end - 1].decode('latin-1').split('\0')
+            return names, (end + 3) & ~3
+
+        self.names, offset = read_names(4, b"NAME")  # skip "SDNA"
+        self.types, offset = read_names(offset, b"TYPE")
+
+        offset += 4  # "TLEN"
+        self.type_lengths = struct.unpack_from(endian + "%dh" % len(self.types), data, offset)
+        offset = (offset + 2 * len(self.types) + 3) & ~3
+
+        offset += 4  # "STRC"
+        count = struct.unpack_from(endian + "i", data, offset)[0]
+        offset += 4
+
+        self.struct_names = []  # struct index -> type name
+        self.raw_fields = {}  # type name -> [(field type index, field name index)]
+        for _ in range(count):
+            type_index, field_count = struct.unpack_from(endian + "hh", data, offset)
+            fields = struct.unpack_from(endian + "%dh" % (2 * field_count), data, offset + 4)
+            offset += 4 + 4 * field_count
+
+            self.struct_names.append(self.types[type_index])
+            self.raw_fields[self.types[type_index]] = list(zip(fields[::2], fields[1::2]))
+
+        self.layouts = {}
+
+    # {field name: (offset, type name, is pointer, array length)} for a struct, None if there's no such struct
+    def fields(self, struct_name):
+        layout = self.layouts.get(struct_name)
+        if layout is not None or struct_name not in self.raw_fields:
+            return layout
+
+        layout = {}
+        field_offset = 0
+        for field_type, field_name in self.raw_fields[struct_name]:
+            name = self.names[field_name]
+            is_pointer = name.startswith('*') or name.startswith('(*')
+            array_length = 1
+            for dim in re.findall(r"\[(\d+)\]", name):
+                array_length *= int(dim)
+
+            key = re.match(r"[\*\(]*(\w+)", name).group(1)
+            layout[key] = (field_offset, self.types[field_type], is_pointer, array_length)
+            field_offset += (self.pointer_size if is_pointer else self.type_lengths[field_type]) * array_length
+
+        self.layouts[struct_name] = layout
+        return layout
+
+
+dna_cache = {}
+
+
+FIELD_FORMATS = {
+    "char": "b", "uchar": "B", "short": "h", "ushort": "H", "int": "i", "float": "f", "double": "d",
+    "int8_t": "b", "uint8_t": "B", "int16_t": "h", "uint16_t": "H", "int32_t": "i", "uint32_t": "I",
+    "int64_t": "q", "uint64_t": "Q",
+}
+
+
+def read_libraries(blend):
+    libraries = []
+    for offset, struct_name in blend.iter_blocks("LI"):
+        # before 2.90 the path as shown in the UI was Library.name, Library.filepath was the absolute path
+        if blend.field(struct_name, ("name",)) is not None:
+            libraries.append(blend.get(offset, struct_name, "name"))
+        else:
+            libraries.append(blend.get(offset, struct_name, "filepath"))
+    return libraries
+
+
+def read_scenes(blend):
+    objects = {old: offset for offset, length, old, sdna, count in blend.blocks.get("OB", ())}
+    scenes = []
+
+    for offset, struct_name in blend.iter_blocks("SC"):
+        camera = blend.get(offset, struct_name, "camera")
+        if camera in objects:
+            camera = blend.id_name(objects[camera], "Object")
+        else:
+            camera = None
+
+        def render(field):
+            return blend.get(offset, struct_name, "r", field)
+
+        scenes.append({
+            "name": blend.id_name(offset, struct_name),
+            "camera": camera,
+            "frame_start": render("sfra"),
+            "frame_end": render("efra"),
+            "frame_step": render("frame_step"),
+            "fps": render("frs_sec"),
+            "fps_base": render("frs_sec_base"),
+            "resolution_x": render("xsch"),
+            "resolution_y": render("ysch"),
+            "resolution_percentage": render("size"),
+            "pixel_aspect_x": render("xasp"),
+            "pixel_aspect_y": render("yasp"),
+        })
+    return scenes
+
+
+# Image.source values
+IMAGE_SOURCE_FILE = 1
+
+
+def image_path_field(blend, struct_name):
+    # renamed from Image.name in 2.80
+    return "filepath" if blend.field(struct_name, ("filepath",)) is not None else "name"
+
+
+def read_images(blend):
+    """Paths (as stored) of the images loaded from files that aren't packed into the .blend"""
+    images = []
+    for offset, struct_name in blend.iter_blocks("IM"):
+        if blend.get(offset, struct_name, "source") != IMAGE_SOURCE_FILE or blend.get(offset, struct_name, "packedfile"):
+            continue
+        path = blend.get(offset, struct_name, image_path_field(blend, struct_name))
+        if path:
+            images.append(path)
+    return images
+
+
+# The scene the file was saved with (FileGlobal.curscene)
+def read_active_scene(blend):
+    for offset, struct_name in blend.iter_blocks("GLOB"):
+        pointer = blend.get(offset, struct_name, "curscene")
+        if pointer in blend.pointers:
+            return blend.id_name(blend.pointers[pointer], "Scene")
+    return None
+
+
+def read_info(path):
+    """Returns the Blender version, linked library and image paths (as stored, usually relative "//" paths)
+    and the scenes (frame range, camera, resolution, frame rate) of a .blend file"""
+    with BlendFile(path) as blend:
+        return {
+            "path": path,
+            "version": blend.version,
+            "libraries": read_libraries(blend),
+            "images": read_images(blend),
+            "scene": read_active_scene(blend),
+            "scenes": read_scenes(blend),
+        }
+
+
+# Resolves a path stored in a .blend file ("//" relative to the file, maybe with
+# Windows separators) to an absolute path
+def abspath(path, blend_path):
+    path = path.replace("\\", "/")
+    if path.startswith("//"):
+        path = os.path.join(os.path.dirname(os.path.abspath(blend_path)), path[2:])
+    return os.path.normpath(path)
+
+
+def library_paths(path, recursive=False):
+    """Absolute paths of the libraries linked by a .blend file. With recursive, also the
+    libraries linked by those libraries, and so on (missing libraries are still listed)."""
+    libraries = [abspath(library, path) for library in read_info(path)["libraries"]]
+    if not recursive:
+        return libraries
+
+    found = []
+    while libraries:
+        library = libraries.pop()
+        if library in found:
+            continue
+        found.append(library)
+        if os.path.isfile(library):
+            libraries.extend(library_paths(library))
+    return found
+
+
+def write_copy(path, output, remap):
+    """Writes an uncompressed copy of a .blend file with its library and image paths changed.
+    remap(path as stored) returns the new path, or None to keep it. The paths are fixed size
+    fields, so nothing else in the file moves."""
+    with BlendFile(path) as blend:
+        data = bytearray(blend.data)
+        fields = [(code, name) for code, names in (("LI", ("name", "filepath")), ("IM", ("filepath", "name")))
+                  for name in names]
+
+        for code, name in fields:
+            for offset, struct_name in blend.iter_blocks(code):
+                if code == "IM" and name != image_path_field(blend, struct_name):
+                    continue
+                field = blend.field(struct_name, (name,))
+                if field is None or field[1] != "char":
+                    continue
+                new_path = remap(blend.get(offset, struct_name, name))
+                if new_path is None:
+                    continue
+
+                encoded = new_path.encode('utf-8')
+                length = field[3]
+                if len(encoded) >= length:
+                    raise BlendFileError("%s: %s is too long for a %s path" % (path, new_path, code))
+                start = offset + field[0]
+                data[start:start + length] = encoded.ljust(length, b'\0')
+
+    # written next to the output and renamed, so there's never half a copy
+    with open(output + ".partial", 'wb') as f:
+        f.write(data)
+    os.replace(output + ".partial", output)
+
+
+# Every .blend file under the given folders (.blend1 backups etc. are skipped)
+def find_blend_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, subfolders, files in os.walk(path):
+                subfolders.sort()
+                for f in sorted(files):
+                    if f.endswith(".blend"):
+                        yield os.path.join(folder, f)
+        else:
+            yield path
+
+
+def main(argv=None):
+    import argparse
+    import json
+    import sys
+    import time
+
+    parser = argparse.ArgumentParser(prog="python -m hns_production_addon.blendfile",
+        description="Prints the libraries, images, frame range, camera and resolution of .blend files as JSON")
+    parser.add_argument("paths", nargs="+", metavar="PATH", help=".blend files or folders to search")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    infos = []
+    for path in find_blend_files(args.paths):
+        try:
+            infos.append(read_info(path))
+        except (OSError, BlendFileError) as e:
+            print(e, file=sys.stderr)
+
+    json.dump(infos, sys.stdout, indent=2)
+    print()
+    print("Indexed %d files in %.3fs" % (len(infos), time.perf_counter() - start), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
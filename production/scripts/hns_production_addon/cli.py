@@ -0,0 +1,205 @@
+# The command line, run in Blender through __main__.py:
+#   blender -b -P hns_production_addon/__main__.py -- --help
+
+import bpy
+
+import json
+import os
+import sys
+
+from . import baseline, encoders, jobserver, reel
+from .batch import (SETTINGS_PROFILES, apply_profile_background, bake_background, batch_apply_profile,
+                    batch_contact_sheets, batch_playblast, batch_validate, bench_encoders, find_shots,
+                    playblast_background, playblast_shard_background, serve_jobs, stitch_playblast_background,
+                    thumbnail_background, validate_background)
+from .prefs import copy_playblast_prefs, default_playblast_prefs, even_scale, get_playblast_prefs
+
+
+# Usage (options go after the "--" so Blender ignores them):
+#   blender -b -P hns_production_addon/__main__.py -- --playblast production/shots/6_proposal [--jobs 4]
+# Options that aren't given are taken from the addon preferences (or the defaults if the addon isn't enabled).
+def main(argv):
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog="blender -b -P hns_production_addon/__main__.py --")
+    parser.add_argument("--playblast", nargs="+", metavar="PATH",
+        help="sequence folders or .blend shot files to playblast")
+    parser.add_argument("--reel", nargs="+", metavar="FOLDER",
+        help="join the playblasts of each sequence folder into <sequence>_reel.mp4, playblasting stale shots first")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count(),
+        help="number of background Blender processes (default: one per core)")
+    parser.add_argument("--scale", type=int, help="playblast scale %%")
+    parser.add_argument("--solid", action="store_true", default=None, help="use solid shading")
+    parser.add_argument("--show-frames", action="store_true", default=None, help="show frame numbers")
+    parser.add_argument("--timings", action="store_true", default=None,
+        help="write per-frame timings next to each playblast (summarize them with python -m hns_production_addon.timing)")
+    parser.add_argument("--fast", action="store_true", default=None,
+        help="simplify the scene while playblasting (levels from the addon preferences)")
+    parser.add_argument("--force", action="store_true",
+        help="playblast shots even if they're up to date (with --contact-sheets, read every shot again)")
+    parser.add_argument("--encoder", choices=list(encoders.PROFILES), help="encoder profile (see encoders.py)")
+    parser.add_argument("--stream", action="store_true", default=None,
+        help="encode with a separate ffmpeg process while the frames are drawn")
+    parser.add_argument("--diff", action="store_true", default=None,
+        help="compare each playblast with the one it replaces, and make a clip of the frames that changed")
+    parser.add_argument("--proxies", action="store_true", default=None,
+        help="draw smaller copies of the image textures (made with ffmpeg, see proxies.py)")
+    parser.add_argument("--no-check", action="store_true",
+        help="playblast shots even if their settings are wrong (see --validate)")
+    parser.add_argument("--contact-sheets", nargs="+", metavar="FOLDER",
+        help="make <sequence>_contact_sheet.png for the sequence folders (or every sequence in the shots folder) "
+             "from the playblasts, rendering a frame of the shots that don't have one")
+    parser.add_argument("--validate", nargs="+", metavar="PATH",
+        help="check the camera, resolution, aspect, frame step and frame rate of the shots under the folders")
+    parser.add_argument("--fix", action="store_true", help="with --validate, fix and save the shots that are wrong")
+    parser.add_argument("--serve", action="store_true",
+        help="run a job server with --jobs warm workers (submit jobs with python -m hns_production_addon.jobserver)")
+    parser.add_argument("--recycle", type=int, default=20, metavar="JOBS",
+        help="with --serve, restart each worker after this many jobs (default: 20)")
+    parser.add_argument("--library-cache", type=int, default=0, metavar="MB",
+        help="with --serve, keep up to this much linked library data loaded in each worker between shots "
+             "(opt-in as Blender crashes appending some shots, see libraries.py, default: 0, opening every shot)")
+    parser.add_argument("--bench-encoders", metavar="SHOT",
+        help="playblast the shot with every encoder profile and compare the time and size")
+    parser.add_argument("--shards", type=int, default=1,
+        help="split each shot into this many frame ranges rendered by separate workers")
+    parser.add_argument("--bench-rig-panels", type=int, nargs="?", const=10000, metavar="REPEAT",
+        help="time the rig panels' drawing on the rigs in the open file (blender -b SHOT.blend -P ...)")
+    parser.add_argument("--bench-keying", type=int, nargs="?", const=500, metavar="FRAMES",
+        help="time keying every control of the rigs in the open file over a frame range")
+    parser.add_argument("--bench-proxies", action="store_true",
+        help="time loading the images of the open file with and without their texture proxies")
+    parser.add_argument("--bench-library-cache", nargs="+", metavar="FOLDER",
+        help="time loading the shots of the folders one after the other, opening each one and with the libraries "
+             "kept loaded (up to --library-cache MB, 2048 if not given)")
+    parser.add_argument("--bench-startup", type=int, nargs="?", const=5, metavar="REPEAT",
+        help="time starting Blender with and without the addon (import and register())")
+    parser.add_argument("--benchmark", nargs="*", metavar="FILE",
+        help="time the playblast, the rig operators and the rig panels on the files (default: the test shots and "
+             "the character rigs) and compare them with the baseline (see baseline.py), "
+             "--output FILE saves the results")
+    parser.add_argument("--update-baseline", "--save-baseline", action="store_true",
+        help="with --benchmark, save the results as the baseline")
+    parser.add_argument("--threshold", type=float, default=baseline.THRESHOLD,
+        help="with --benchmark, how much slower than the baseline is a regression (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5, help="with --benchmark, runs of each measurement (default: 5)")
+    parser.add_argument("--frames", type=int, default=250,
+        help="with --benchmark, frames the rig operators key and bake (default: 250)")
+    parser.add_argument("--apply-profile", nargs="+", metavar=("PROFILE", "PATH"),
+        help="save a settings profile (%s) into the shots in the sequence folders or .blend files"
+             % ", ".join(SETTINGS_PROFILES))
+    # used by the batch and job server workers (see batch.py) for the open file
+    parser.add_argument("--prefs", help=argparse.SUPPRESS)
+    parser.add_argument("--playblast-shot", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--playblast-shard", metavar="SHARD/SHARDS", help=argparse.SUPPRESS)
+    parser.add_argument("--stitch-shot", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--shot-name", help=argparse.SUPPRESS)
+    parser.add_argument("--open-shot", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    parser.add_argument("--benchmark-shot", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--benchmark-label", help=argparse.SUPPRESS)
+    parser.add_argument("--validate-shot", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--bake-shot", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--thumbnail-shot", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--job-worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--apply-profile-shot", metavar="PROFILE", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    
+    if args.prefs:
+        # workers get every option from the batch, so they don't depend on their own preferences
+        prefs = default_playblast_prefs()
+        vars(prefs).update(json.loads(args.prefs))
+    else:
+        prefs = copy_playblast_prefs(get_playblast_prefs(bpy.context))
+    
+    if args.scale is not None:
+        prefs.playblast_scale = even_scale(min(max(args.scale, 5), 100))
+    for name, value in (("playblast_shade_solid", args.solid), ("playblast_show_frames", args.show_frames),
+                        ("playblast_timings", args.timings), ("playblast_fast", args.fast),
+                        ("playblast_encoder", args.encoder), ("playblast_stream", args.stream),
+                        ("playblast_diff", args.diff), ("playblast_texture_proxies", args.proxies)):
+        if value is not None:
+            setattr(prefs, name, value)
+    
+    if args.playblast_shot:
+        playblast_background(bpy.context.scene, prefs, args.shot_name, args.output)
+    elif args.playblast_shard:
+        shard, shards = (int(n) for n in args.playblast_shard.split("/"))
+        playblast_shard_background(bpy.context.scene, prefs, shard, shards)
+    elif args.stitch_shot:
+        stitch_playblast_background(bpy.context.scene, prefs)
+    elif args.benchmark_shot:
+        from .benchmarks import benchmark_background
+        benchmark_background(prefs, args.repeat, args.frames, args.benchmark_label)
+    elif args.bench_library_cache:
+        from .libraries import bench_library_session
+        bench_library_session(args.bench_library_cache, (args.library_cache or 2048) * 2**20)
+    elif args.bench_startup:
+        from .addon import bench_startup
+        bench_startup(args.bench_startup)
+    elif args.bench_rig_panels:
+        from .rig_panels import bench_rig_panels
+        bench_rig_panels(args.bench_rig_panels)
+    elif args.bench_proxies:
+        from .playblast import bench_texture_proxies
+        bench_texture_proxies(prefs)
+    elif args.bench_encoders:
+        bench_encoders(args.bench_encoders, prefs)
+    elif args.bench_keying:
+        from .rig_tools import bench_keying
+        bench_keying(args.bench_keying)
+    elif args.job_worker:
+        from .libraries import LibrarySession
+        session = LibrarySession(args.library_cache * 2**20) if args.library_cache else None
+        
+        def run_job(shot, job_args):
+            if session:
+                session.run(shot, job_args, main)
+                return
+            bpy.ops.wm.open_mainfile(filepath=shot)
+            main(job_args)
+        jobserver.run_worker(run_job)
+    elif args.bake_shot:
+        bake_background(bpy.context.scene)
+    elif args.thumbnail_shot:
+        thumbnail_background(bpy.context.scene, prefs, output=args.output, shot_name=args.shot_name)
+    elif args.validate_shot:
+        validate_background(args.fix)
+    elif args.apply_profile_shot:
+        apply_profile_background(args.apply_profile_shot, prefs)
+    elif args.apply_profile:
+        name, paths = args.apply_profile[0], args.apply_profile[1:]
+        if name not in SETTINGS_PROFILES or not paths:
+            parser.error("--apply-profile needs one of %s and at least one path" % ", ".join(SETTINGS_PROFILES))
+        if batch_apply_profile(find_shots(paths), name, prefs, args.jobs):
+            sys.exit(1)
+    elif args.benchmark is not None:
+        from .benchmarks import run_benchmarks
+        if run_benchmarks(prefs, args.benchmark, args.repeat, args.frames, args.threshold, args.update_baseline,
+                          args.output):
+            sys.exit(1)
+    elif args.serve:
+        serve_jobs(prefs, args.jobs, args.recycle, args.library_cache)
+    elif args.contact_sheets:
+        if batch_contact_sheets(args.contact_sheets, prefs, args.jobs, args.force):
+            sys.exit(1)
+    elif args.validate:
+        if batch_validate(args.validate, args.jobs, args.fix):
+            sys.exit(1)
+    elif args.reel:
+        from .shots import build_reel
+        failed = False
+        for folder in args.reel:
+            try:
+                build_reel(folder, prefs, args.jobs)
+            except reel.ReelError as e:
+                print("%s: %s" % (folder, e))
+                failed = True
+        if failed:
+            sys.exit(1)
+    elif args.playblast:
+        if batch_playblast(find_shots(args.playblast), prefs, args.jobs, args.force, max(args.shards, 1),
+                           not args.no_check):
+            sys.exit(1)
+    else:
+        parser.print_help()
@@ -0,0 +1,312 @@
+# Contact sheets: one image per sequence with a row per shot, so a shot can be found without
+# opening the files. <sequence>_contact_sheet.png goes in the sequence folder, laid out like
+# shots/thirds_grid.png: white, with thin dark lines between the cells.
+#
+# Each row has the middle frame of each third of the shot's playblast (decoded and scaled by
+# ffmpeg), so it has the playblast camera and the stamp with the shot name. Shots without a
+# playblast get a snapshot of their middle frame instead, rendered by Blender (see --contact-sheets
+# in cli.py, which passes the snapshot function in). The rows are cached in <sequence>/.contact_sheet,
+# keyed by a hash of the shot file, its libraries and the playblast, so only shots that changed
+# are read again.
+#
+# Doesn't import bpy, but needs numpy (to put the sheet together) and ffmpeg:
+#   python -m hns_production_addon.contact production/shots
+
+import hashlib
+import json
+import os
+import struct
+import subprocess
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from . import blendfile, encoders, movfile, playdiff
+
+
+CACHE_DIR_NAME = ".contact_sheet"
+INDEX_NAME = "index.json"
+
+COLUMNS = 3
+CELL_WIDTH = 384
+CELL_HEIGHT = 216
+LINE_COLOR = (64, 64, 64)
+BACKGROUND_COLOR = (255, 255, 255)
+
+
+class ContactSheetError(Exception):
+    pass
+
+
+def get_sheet_path(sequence_dir):
+    sequence_dir = os.path.abspath(sequence_dir)
+    return os.path.join(sequence_dir, os.path.basename(sequence_dir) + "_contact_sheet.png")
+
+
+# The sequence folders in the given folders: the folder itself if none of its subfolders
+# have shots in them (so production/shots gives every sequence)
+def find_sequences(paths):
+    sequences = []
+    for path in paths:
+        subfolders = [os.path.join(path, f) for f in sorted(os.listdir(path))
+                      if os.path.isdir(os.path.join(path, f)) and not f.startswith(".")]
+        found = [folder for folder in subfolders if get_shots(folder)]
+        sequences.extend(found or [path])
+    return sequences
+
+
+def get_shots(sequence_dir):
+    return sorted(os.path.join(sequence_dir, f) for f in os.listdir(sequence_dir) if f.endswith(".blend"))
+
+
+def find_playblast(shot):
+    """The shot's playblast in whichever encoder's format it is, None if there isn't one"""
+    base = os.path.splitext(os.path.abspath(shot))[0] + "_playblast"
+    for extension in dict.fromkeys(profile.extension for profile in encoders.PROFILES.values()):
+        if os.path.exists(base + extension):
+            return base + extension
+    return None
+
+
+def count_frames(playblast):
+    if os.path.isdir(playblast):
+        return len(playdiff.get_sequence_frames(playblast))
+    return movfile.read_info(playblast)["frames"]
+
+
+# The middle frame of each third (of COLUMNS parts) of the shot
+def pick_frames(frame_count, columns=COLUMNS):
+    return [min(frame_count - 1, (2 * i + 1) * frame_count // (2 * columns)) for i in range(columns)]
+
+
+def read_cells(ffmpeg, path, frames=None):
+    """Decodes the frames (indices) of a playblast, or the image if frames is None, scaled to
+    fit the cells. Returns raw RGB, CELL_WIDTH x CELL_HEIGHT for each frame."""
+    fit = ("scale=%d:%d:force_original_aspect_ratio=decrease,pad=%d:%d:(ow-iw)/2:(oh-ih)/2:white"
+           % (CELL_WIDTH, CELL_HEIGHT, CELL_WIDTH, CELL_HEIGHT))
+    if frames is None:
+        inputs, filters, count = ["-i", path], fit, 1
+    else:
+        inputs, count = playdiff.get_inputs(path), len(frames)
+        filters = "select='%s',%s" % ("+".join("eq(n,%d)" % frame for frame in frames), fit)
+
+    result = subprocess.run([ffmpeg, "-loglevel", "error"] + inputs + ["-vf", filters, "-vsync", "0",
+                             "-frames:v", str(count), "-f", "rawvideo", "-pix_fmt", "rgb24", "-"],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise ContactSheetError("ffmpeg failed on %s: %s" % (path, result.stderr.decode(errors="replace").strip()))
+    if len(result.stdout) != count * CELL_WIDTH * CELL_HEIGHT * 3:
+        raise ContactSheetError("%s: ffmpeg returned %d bytes for %d frames" % (path, len(result.stdout), count))
+    return result.stdout
+
+
+def write_png(path, pixels):
+    """Writes a (height, width, 3) uint8 array as an RGB PNG"""
+    import numpy
+
+    height, width = pixels.shape[:2]
+    # each row starts with its filter type, 0 (none)
+    rows = numpy.zeros((height, width * 3 + 1), numpy.uint8)
+    rows[:, 1:] = pixels.reshape(height, width * 3)
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    with open(path + ".partial", 'wb') as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)))
+        f.write(chunk(b"IEND", b""))
+    os.replace(path + ".partial", path)
+
+
+def assemble(rows, columns=COLUMNS):
+    """The sheet for the rows (raw RGB cells per shot, None for a shot without any), as a
+    (height, width, 3) uint8 array. A row with fewer cells has them in the middle."""
+    import numpy
+
+    sheet = numpy.empty((len(rows) * (CELL_HEIGHT + 1) + 1, columns * (CELL_WIDTH + 1) + 1, 3), numpy.uint8)
+    sheet[:] = LINE_COLOR
+    for row, cells in enumerate(rows):
+        cells = (numpy.frombuffer(cells, numpy.uint8).reshape(-1, CELL_HEIGHT, CELL_WIDTH, 3)
+                 if cells else numpy.empty((0, CELL_HEIGHT, CELL_WIDTH, 3), numpy.uint8))
+        first = (columns - len(cells)) // 2
+        top = row * (CELL_HEIGHT + 1) + 1
+        for column in range(columns):
+            left = column * (CELL_WIDTH + 1) + 1
+            cell = sheet[top:top + CELL_HEIGHT, left:left + CELL_WIDTH]
+            if first <= column < first + len(cells):
+                cell[:] = cells[column - first]
+            else:
+                cell[:] = BACKGROUND_COLOR
+    return sheet
+
+
+class SheetCache:
+    """The rows of a sequence's contact sheet (<shot name>.rgb) and the index of what they were
+    made from: {"shots": {shot name: key}, "hashes": {path: [mtime, size, hash]}}"""
+
+    def __init__(self, sequence_dir):
+        self.folder = os.path.join(os.path.abspath(sequence_dir), CACHE_DIR_NAME)
+        self.path = os.path.join(self.folder, INDEX_NAME)
+        self.shots = {}
+        self.hashes = {}
+
+        try:
+            with open(self.path) as f:
+                index = json.load(f)
+            self.shots, self.hashes = index["shots"], index["hashes"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def save(self):
+        os.makedirs(self.folder, exist_ok=True)
+        # write then rename so an interrupted save doesn't leave half an index
+        with open(self.path + ".tmp", 'w') as f:
+            json.dump({"shots": self.shots, "hashes": self.hashes}, f, indent=1, sort_keys=True)
+        os.replace(self.path + ".tmp", self.path)
+
+    def hash_file(self, path):
+        # only read again if the file changed since it was last hashed
+        stat = os.stat(path)
+        cached = self.hashes.get(path)
+        if cached and cached[:2] == [stat.st_mtime, stat.st_size]:
+            return cached[2]
+        hasher = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                hasher.update(chunk)
+        self.hashes[path] = [stat.st_mtime, stat.st_size, hasher.hexdigest()]
+        return hasher.hexdigest()
+
+    def shot_key(self, shot, playblast):
+        """Hash of the shot file, its libraries and its playblast (by size and modification
+        time, they're big), or "snapshot" if there's no playblast"""
+        hasher = hashlib.sha1(self.hash_file(shot).encode())
+        for library in sorted(blendfile.library_paths(shot, recursive=True)):
+            hasher.update(os.path.basename(library).encode())
+            if os.path.isfile(library):
+                hasher.update(self.hash_file(library).encode())
+        if playblast:
+            stat = os.stat(playblast) if not os.path.isdir(playblast) else os.stat(os.path.join(
+                playblast, playdiff.get_sequence_frames(playblast)[-1]))
+            hasher.update(repr((os.path.basename(playblast), stat.st_mtime, stat.st_size)).encode())
+        else:
+            hasher.update(b"snapshot")
+        return hasher.hexdigest()
+
+    def row_path(self, shot_name):
+        return os.path.join(self.folder, shot_name + ".rgb")
+
+    def read_row(self, shot_name):
+        try:
+            with open(self.row_path(shot_name), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+
+def shot_name(shot):
+    return os.path.splitext(os.path.basename(shot))[0]
+
+
+def make_contact_sheet(sequence_dir, ffmpeg=None, snapshot=None, jobs=1, force=False):
+    """Makes (or updates) the contact sheet of a sequence folder. snapshot([(shot, output png)])
+    renders the shots without a playblast and returns the ones that failed; without it they
+    get an empty row. Returns {"shots", "updated", "failed"} (shot paths)."""
+    ffmpeg = ffmpeg or encoders.find_ffmpeg()
+    if ffmpeg is None:
+        raise ContactSheetError("ffmpeg not found (put it on the PATH or set HNS_FFMPEG)")
+    shots = get_shots(sequence_dir)
+    if not shots:
+        raise ContactSheetError("%s has no shots" % sequence_dir)
+
+    cache = SheetCache(sequence_dir)
+    os.makedirs(cache.folder, exist_ok=True)
+    playblasts = {shot: find_playblast(shot) for shot in shots}
+    keys = {}
+    for shot in shots:
+        try:
+            keys[shot] = cache.shot_key(shot, playblasts[shot])
+        except (OSError, blendfile.BlendFileError, movfile.MovieFileError, playdiff.DiffError):
+            keys[shot] = None
+    stale = [shot for shot in shots if force or keys[shot] is None or cache.shots.get(shot_name(shot)) != keys[shot]
+             or not os.path.exists(cache.row_path(shot_name(shot)))]
+
+    failed = []
+    to_render = [shot for shot in stale if playblasts[shot] is None]
+    snapshots = {shot: os.path.join(cache.folder, shot_name(shot) + "_snapshot.png") for shot in to_render}
+    if to_render and snapshot:
+        failed += snapshot(list(snapshots.items()))
+    elif to_render:
+        failed += to_render
+
+    def read(shot):
+        if playblasts[shot]:
+            return read_cells(ffmpeg, playblasts[shot], pick_frames(count_frames(playblasts[shot])))
+        return read_cells(ffmpeg, snapshots[shot])
+
+    # the decoding is done by the ffmpeg processes, so threads are enough
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        futures = {shot: pool.submit(read, shot) for shot in stale if shot not in failed}
+        for shot, future in futures.items():
+            try:
+                cells = future.result()
+            except (OSError, ContactSheetError, movfile.MovieFileError, playdiff.DiffError) as e:
+                print("%s: %s" % (shot_name(shot), e))
+                failed.append(shot)
+                continue
+            with open(cache.row_path(shot_name(shot)), 'wb') as f:
+                f.write(cells)
+            cache.shots[shot_name(shot)] = keys[shot]
+
+    removed = False
+    for shot in failed:
+        cache.shots.pop(shot_name(shot), None)
+        if os.path.exists(cache.row_path(shot_name(shot))):
+            os.remove(cache.row_path(shot_name(shot)))
+            removed = True
+    for path in snapshots.values():
+        if os.path.exists(path):
+            os.remove(path)
+
+    updated = [shot for shot in stale if shot not in failed]
+    sheet = get_sheet_path(sequence_dir)
+    if updated or removed or not os.path.exists(sheet):
+        write_png(sheet, assemble([cache.read_row(shot_name(shot)) for shot in shots]))
+    cache.save()
+    return {"shots": shots, "updated": updated, "failed": failed}
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(prog="python -m hns_production_addon.contact",
+        description="Makes a contact sheet (<sequence>_contact_sheet.png) for each sequence folder from the shot "
+                    "playblasts (shots without one are left empty, use the addon's --contact-sheets in Blender "
+                    "to render them)")
+    parser.add_argument("folders", nargs="+", metavar="FOLDER", help="sequence folders, or the shots folder")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count(), help="ffmpeg processes")
+    parser.add_argument("--force", action="store_true", help="read every shot again, even the unchanged ones")
+    args = parser.parse_args(argv)
+
+    failed = False
+    start = time.perf_counter()
+    for folder in find_sequences(args.folders):
+        folder_start = time.perf_counter()
+        try:
+            result = make_contact_sheet(folder, jobs=args.jobs or 1, force=args.force)
+        except ContactSheetError as e:
+            print("%s: %s" % (folder, e))
+            failed = True
+            continue
+        failed = failed or bool(result["failed"])
+        print("%s: %d shots, %d updated%s (%.1fs)" % (os.path.relpath(get_sheet_path(folder)), len(result["shots"]),
+            len(result["updated"]), ", %d without a playblast or failed" % len(result["failed"])
+            if result["failed"] else "", time.perf_counter() - folder_start))
+    print("Done in %.1fs" % (time.perf_counter() - start))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,151 @@
+# Which .blend files link which, for the whole production/ tree, so "what needs a re-blast if
+# I change mushroom.blend" can be answered without opening anything in Blender.
+#
+# The links are read with blendfile.py and kept in an index file in the production folder.
+# Each update only re-reads the files whose modification time or size changed since the
+# last one, so after the first scan queries take milliseconds.
+#
+# Doesn't import bpy, so it works in plain Python too:
+#   python -m hns_production_addon.depgraph production/3D_assets/linked_assets/objects/mushroom.blend
+
+import json
+import os
+
+from . import blendfile
+
+
+INDEX_NAME = ".hns_dependencies.json"
+
+
+# The production folder a file belongs to: the closest parent folder with shots/ and 3D_assets/ in it
+def find_production_root(path):
+    folder = os.path.dirname(os.path.abspath(path)) if not os.path.isdir(path) else os.path.abspath(path)
+    while True:
+        if os.path.isdir(os.path.join(folder, "shots")) and os.path.isdir(os.path.join(folder, "3D_assets")):
+            return folder
+        parent = os.path.dirname(folder)
+        if parent == folder:
+            return None
+        folder = parent
+
+
+class DependencyIndex:
+    """Linked-library edges between every .blend file under a production folder.
+    Paths are stored relative to the production folder, with "/" separators."""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.path = os.path.join(self.root, INDEX_NAME)
+        self.files = {}  # relative path -> {"mtime", "size", "libraries": [relative paths]}
+        self.dependents_cache = None
+
+        try:
+            with open(self.path) as f:
+                self.files = json.load(f)["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def relpath(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, "/")
+
+    def abspath(self, relpath):
+        return os.path.normpath(os.path.join(self.root, relpath))
+
+    # Re-reads the files that were added or changed since the last update and drops the ones
+    # that were deleted. Returns the number of files that were read.
+    def update(self):
+        found = {}
+        for path in blendfile.find_blend_files([self.root]):
+            stat = os.stat(path)
+            found[self.relpath(path)] = (stat.st_mtime, stat.st_size)
+
+        changed = [path for path, (mtime, size) in found.items()
+                   if path not in self.files
+                   or (self.files[path]["mtime"], self.files[path]["size"]) != (mtime, size)]
+        removed = [path for path in self.files if path not in found]
+
+        for path in changed:
+            mtime, size = found[path]
+            try:
+                libraries = blendfile.library_paths(self.abspath(path))
+            except (OSError, blendfile.BlendFileError):
+                libraries = []
+            self.files[path] = {"mtime": mtime, "size": size, "libraries": [self.relpath(lib) for lib in libraries]}
+        for path in removed:
+            del self.files[path]
+
+        if changed or removed:
+            self.dependents_cache = None
+            self.save()
+        return len(changed)
+
+    def save(self):
+        # write then rename so an interrupted save doesn't leave half an index
+        with open(self.path + ".tmp", 'w') as f:
+            json.dump({"files": self.files}, f, indent=1, sort_keys=True)
+        os.replace(self.path + ".tmp", self.path)
+
+    def libraries(self, path):
+        entry = self.files.get(self.relpath(path))
+        return [self.abspath(lib) for lib in entry["libraries"]] if entry else []
+
+    def dependents(self, path, recursive=True):
+        """Files that link the given file, and with recursive, the files that link those (and so on)"""
+        if self.dependents_cache is None:
+            self.dependents_cache = {}
+            for file, entry in self.files.items():
+                for library in entry["libraries"]:
+                    self.dependents_cache.setdefault(library, []).append(file)
+
+        found = []
+        pending = [self.relpath(path)]
+        while pending:
+            for file in self.dependents_cache.get(pending.pop(), ()):
+                if file not in found:
+                    found.append(file)
+                    if recursive:
+                        pending.append(file)
+        return sorted(self.abspath(file) for file in found)
+
+    def dependent_shots(self, path):
+        """Shot files (under production/shots) that use the given file, directly or through other libraries"""
+        shots = os.path.join(self.root, "shots") + os.sep
+        return [file for file in self.dependents(path) if file.startswith(shots)]
+
+
+# Loads and updates the index of the production folder the file belongs to
+def load_index(path, root=None):
+    root = root or find_production_root(path)
+    if root is None:
+        raise ValueError("%s isn't in a production folder (with shots/ and 3D_assets/)" % path)
+    index = DependencyIndex(root)
+    index.update()
+    return index
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(prog="python -m hns_production_addon.depgraph",
+        description="Lists the shots that use a .blend file, directly or through other linked files")
+    parser.add_argument("path", help=".blend file to look up")
+    parser.add_argument("--root", help="production folder (default: found from the path)")
+    parser.add_argument("--all", action="store_true", help="list every dependent file, not only shots")
+    parser.add_argument("--direct", action="store_true", help="only files that link it directly")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    index = load_index(args.path, args.root)
+    if args.all or args.direct:
+        files = index.dependents(args.path, recursive=not args.direct)
+    else:
+        files = index.dependent_shots(args.path)
+
+    for file in files:
+        print(os.path.relpath(file))
+    print("%d files (%.0fms)" % (len(files), (time.perf_counter() - start) * 1000))
+
+
+if __name__ == "__main__":
+    main()
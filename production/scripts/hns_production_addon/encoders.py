@@ -0,0 +1,158 @@
+# Encoder profiles for playblasts: the render settings for Blender's own writer, the output
+# extension, and the arguments for encoding the same thing with a separate ffmpeg process.
+#
+# With streaming on, the playblast draws each frame as an uncompressed image and FrameStream
+# pipes it to ffmpeg, which encodes it (multithreaded) while the next frame is drawn, instead
+# of Blender encoding in between frames. ffmpeg is found on the PATH, or set HNS_FFMPEG to
+# the executable.
+#
+# Doesn't import bpy.
+
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+
+
+class EncoderProfile:
+    """How playblasts are encoded. extension is os.sep for image sequences (a folder of frames).
+    ffmpeg_args are the output options for streaming, None if the profile can't be streamed."""
+
+    def __init__(self, label, description, extension, settings, ffmpeg_args=None):
+        self.label = label
+        self.description = description
+        self.extension = extension
+        self.settings = settings
+        self.ffmpeg_args = ffmpeg_args
+
+    @property
+    def image_sequence(self):
+        return self.extension == os.sep
+
+
+PROFILES = {
+    'H264': EncoderProfile("H.264", "H.264 MP4, medium quality", ".mp4", {
+        "scene.render.image_settings.file_format": 'FFMPEG',
+        "scene.render.ffmpeg.format": 'MPEG4',
+        "scene.render.ffmpeg.codec": 'H264',
+        "scene.render.ffmpeg.constant_rate_factor": 'MEDIUM',
+    }, ["-c:v", "libx264", "-preset", "medium", "-crf", "23", "-pix_fmt", "yuv420p"]),
+
+    'H264_FAST': EncoderProfile("H.264 (fast)", "H.264 MP4 with the fastest encoder preset (bigger files)", ".mp4", {
+        "scene.render.image_settings.file_format": 'FFMPEG',
+        "scene.render.ffmpeg.format": 'MPEG4',
+        "scene.render.ffmpeg.codec": 'H264',
+        "scene.render.ffmpeg.constant_rate_factor": 'MEDIUM',
+        "scene.render.ffmpeg.ffmpeg_preset": 'REALTIME',
+    }, ["-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency", "-crf", "23", "-pix_fmt", "yuv420p"]),
+
+    'MJPEG': EncoderProfile("MJPEG", "Motion JPEG QuickTime, every frame is a keyframe so it scrubs smoothly", ".mov", {
+        "scene.render.image_settings.file_format": 'FFMPEG',
+        "scene.render.ffmpeg.format": 'QUICKTIME',
+        "scene.render.ffmpeg.codec": 'MJPEG',
+        "scene.render.ffmpeg.video_bitrate": 12000,
+    }, ["-c:v", "mjpeg", "-q:v", "3", "-pix_fmt", "yuvj420p"]),
+
+    'PNG': EncoderProfile("PNG sequence", "Numbered lossless PNGs in a folder (what sharded playblasts render)", os.sep, {
+        "scene.render.image_settings.file_format": 'PNG',
+        "scene.render.image_settings.color_mode": 'RGB',
+        "scene.render.image_settings.compression": 15,
+    }),
+}
+
+
+def find_ffmpeg():
+    return os.environ.get("HNS_FFMPEG") or shutil.which("ffmpeg")
+
+
+# Command that encodes numbered images (e.g. "frames/%04d.png") into the output
+def encode_frames_command(ffmpeg, pattern, frame_start, fps, profile, output):
+    return ([ffmpeg, "-y", "-loglevel", "error", "-framerate", "%.6f" % fps, "-start_number", str(frame_start),
+             "-i", pattern] + profile.ffmpeg_args + ["-threads", "0", output])
+
+
+class FrameStream:
+    """An ffmpeg process encoding the image files it's given, in order. The files are fed to it
+    (and deleted) by a thread of its own, so add() only waits when ffmpeg falls behind.
+
+        with FrameStream(ffmpeg, profile, 24, "shot_playblast.mp4") as stream:
+            for each frame:
+                write the frame to path
+                stream.add(path)
+    """
+
+    def __init__(self, ffmpeg, profile, fps, output, input_codec="bmp", backlog=8):
+        self.command = ([ffmpeg, "-y", "-loglevel", "error", "-f", "image2pipe", "-framerate", "%.6f" % fps,
+                         "-c:v", input_codec, "-i", "-"] + profile.ffmpeg_args + ["-threads", "0", output])
+        self.queue = queue.Queue(maxsize=backlog)
+        self.error = None
+        self.process = None
+        self.thread = None
+
+    def start(self):
+        # a file rather than a pipe, so a chatty ffmpeg can't block on a full pipe
+        self.log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                        stderr=self.log)
+        self.thread = threading.Thread(target=self.feed, daemon=True)
+        self.thread.start()
+
+    def feed(self):
+        while True:
+            path = self.queue.get()
+            if path is None:
+                return
+            if self.error is None:
+                try:
+                    with open(path, 'rb') as f:
+                        self.process.stdin.write(f.read())
+                except OSError as e:
+                    # ffmpeg quit (the reason is in its log), the rest of the frames are just deleted
+                    self.error = e
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def add(self, path):
+        self.queue.put(path)
+        if self.error is not None:
+            self.finish()
+
+    def finish(self):
+        """Waits for every frame to be encoded, raises RuntimeError if ffmpeg failed"""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        code = self.process.wait()
+
+        if code != 0 or self.error is not None:
+            self.log.seek(0)
+            message = self.log.read().decode(errors="replace").strip() or str(self.error)
+            raise RuntimeError("ffmpeg failed (exit code %s): %s" % (code, message[-2000:]))
+
+    def abort(self):
+        self.process.kill()
+        self.process.wait()
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        try:
+            if exc_type is None:
+                self.finish()
+            else:
+                self.abort()
+        finally:
+            self.log.close()
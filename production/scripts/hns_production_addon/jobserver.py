@@ -0,0 +1,504 @@
+# A local job server that keeps a few background Blenders running, with the addon already
+# imported, and hands them shot jobs (playblast, validate, bake, thumbnail...) as they come in.
+# Each job opens its shot in a worker that's already up, instead of starting a new Blender,
+# and each worker is restarted after a number of jobs so its memory doesn't keep growing.
+#
+# The server runs in Blender, since it needs the playblast options and records the playblasts
+# it makes like batch playblasts do:
+#   blender -b -P hns_production_addon/__main__.py -- --serve [--jobs 4] [--recycle 20]
+# Jobs are submitted and followed from plain Python (or from Blender, through submit()):
+#   python -m hns_production_addon.jobserver submit playblast production/shots/6_proposal
+#   python -m hns_production_addon.jobserver status
+#   python -m hns_production_addon.jobserver cancel 12
+#
+# Everything goes through a Unix socket (a localhost port on Windows) that only takes
+# connections with the key written to the server file, which only the user can read.
+#
+# Doesn't import bpy, the Blender side is passed in by cli.py.
+
+import contextlib
+import getpass
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from . import blendfile
+
+
+class JobServerError(Exception):
+    pass
+
+
+# Job kinds and the worker options (see cli.py) that run them on the open shot
+JOB_KINDS = {
+    "playblast": ["--playblast-shot"],
+    "validate": ["--validate-shot"],
+    "fix": ["--validate-shot", "--fix"],
+    "bake": ["--bake-shot"],
+    "thumbnail": ["--thumbnail-shot"],
+}
+
+# Job states. Jobs that the server finds have nothing to do (e.g. an up to date playblast) are skipped.
+FINISHED_STATES = {'done', 'failed', 'skipped', 'cancelled'}
+
+
+# Address and key of the running server
+def get_server_file():
+    return os.path.join(tempfile.gettempdir(), "hns_jobserver_%s.json" % getpass.getuser())
+
+
+def new_address():
+    if sys.platform == "win32":
+        return ('127.0.0.1', 0)
+    return os.path.join(tempfile.mkdtemp(prefix="hns_jobserver_"), "socket")
+
+
+# Blender's own output of a worker, in case it crashes (the jobs' output goes back with their results)
+def get_worker_log(worker_id):
+    return os.path.join(tempfile.gettempdir(), "hns_jobserver_worker%d.log" % worker_id)
+
+
+class Job:
+    def __init__(self, job_id, kind, shot, force=False):
+        self.id = job_id
+        self.kind = kind
+        self.shot = shot
+        self.force = force
+        self.state = 'queued'
+        self.worker = None
+        self.seconds = None
+        self.output = ""
+        self.data = {}  # for the server's prepare/finished callbacks
+        self.cancelled = False
+        self.sent = False  # to the worker, so cancelling it means stopping the worker
+        self.crashes = 0  # workers that died running it
+
+    def to_dict(self):
+        return {"id": self.id, "kind": self.kind, "shot": self.shot, "state": self.state, "worker": self.worker,
+                "seconds": self.seconds, "output": self.output if self.state == 'failed' else ""}
+
+
+class Worker:
+    """A worker slot: the Blender running in it is replaced every recycle jobs, or if it dies"""
+
+    def __init__(self, worker_id):
+        self.id = worker_id
+        self.process = None
+        self.connection = None
+        self.connected = threading.Event()
+        self.job = None
+        self.jobs = 0  # since the current Blender started
+        self.waiting = False  # for a job
+
+    def to_dict(self):
+        return {"id": self.id, "pid": self.process.pid if self.process else None, "jobs": self.jobs,
+                "job": self.job.id if self.job else None}
+
+
+class JobServer:
+    """Runs jobs on warm workers.
+
+    command is the command line of a worker, which connects back with run_worker().
+    prepare(job) returns the worker options to run the job with, or None to skip it.
+    finished(job) is called after each job (one at a time), with job.state set.
+    """
+
+    def __init__(self, command, workers, recycle=20, prepare=None, finished=None):
+        self.command = command
+        self.recycle = max(recycle, 1)
+        self.prepare = prepare or (lambda job: JOB_KINDS[job.kind])
+        self.finished = finished or (lambda job: None)
+
+        self.workers = [Worker(i + 1) for i in range(max(workers, 1))]
+        self.jobs = {}
+        self.queue = []
+        self.next_id = 1
+        self.lock = threading.Condition()
+        self.finished_lock = threading.Lock()
+        self.stopping = False
+
+        self.authkey = os.urandom(32)
+        self.listener = None
+
+    def start_worker(self, worker):
+        worker.connected.clear()
+        worker.jobs = 0
+        env = dict(os.environ, HNS_JOBSERVER_ADDRESS=json.dumps(self.listener.address),
+                   HNS_JOBSERVER_KEY=self.authkey.hex(), HNS_JOBSERVER_WORKER=str(worker.id))
+        with open(get_worker_log(worker.id), 'w') as log:
+            worker.process = subprocess.Popen(self.command, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+        while not worker.connected.wait(1):
+            if worker.process.poll() is not None:
+                worker.process = None
+                raise JobServerError("Worker %d exited while starting (see %s)" % (worker.id, get_worker_log(worker.id)))
+
+    def stop_worker(self, worker):
+        if worker.connection is not None:
+            try:
+                worker.connection.send(None)
+            except OSError:
+                pass
+            worker.connection.close()
+            worker.connection = None
+        if worker.process is not None:
+            try:
+                worker.process.wait(30)
+            except subprocess.TimeoutExpired:
+                worker.process.kill()
+                worker.process.wait()
+            worker.process = None
+
+    # Waits for the next job. Jobs go to the least loaded of the waiting workers, the one that has
+    # run the fewest jobs since it started, so workers don't all get recycled at the same time.
+    def take_job(self, worker):
+        with self.lock:
+            worker.waiting = True
+            self.lock.notify_all()
+            try:
+                while not self.stopping:
+                    if self.queue:
+                        waiting = [other for other in self.workers if other.waiting]
+                        if min(waiting, key=lambda other: (other.jobs, other.id)) is worker:
+                            job = self.queue.pop(0)
+                            job.state = 'running'
+                            job.worker = worker.id
+                            worker.job = job
+                            return job
+                    self.lock.wait()
+                return None
+            finally:
+                worker.waiting = False
+
+    def run_slot(self, worker):
+        while not self.stopping:
+            if worker.process is None:
+                try:
+                    self.start_worker(worker)
+                except (OSError, JobServerError) as e:
+                    print(e)
+                    time.sleep(5)
+                    continue
+
+            job = self.take_job(worker)
+            if job is None:
+                break
+            self.run_job(worker, job)
+
+            with self.lock:
+                worker.job = None
+            if worker.process is not None and worker.jobs >= self.recycle:
+                self.stop_worker(worker)
+        self.stop_worker(worker)
+
+    def run_job(self, worker, job):
+        start = time.perf_counter()
+        crashed = False
+        try:
+            args = self.prepare(job)
+        except JobServerError as e:
+            args = None
+            job.state = 'failed'
+            job.output = str(e)
+        except Exception:
+            args = None
+            job.state = 'failed'
+            job.output = traceback.format_exc()
+
+        with self.lock:
+            job.sent = args is not None and not job.cancelled
+        if job.sent:
+            try:
+                worker.connection.send({"shot": job.shot, "args": args})
+                result = worker.connection.recv()
+                job.state = 'done' if result["succeeded"] else 'failed'
+                job.output = result["output"]
+            except (EOFError, OSError):
+                # the worker died, or was killed to cancel the job
+                job.state = 'failed'
+                job.output = "Worker %d exited (see %s)" % (worker.id, get_worker_log(worker.id))
+                worker.connection.close()
+                worker.connection = None
+                worker.process.wait()
+                worker.process = None
+                crashed = not job.cancelled
+            worker.jobs += 1
+        elif job.state != 'failed':
+            job.state = 'skipped'
+
+        if crashed:
+            job.crashes += 1
+        if crashed and job.crashes == 1:
+            # run once more by a new worker, since what crashed this one can be what its last jobs left
+            # behind (prepare() sees job.crashes, to run it differently)
+            with self.lock:
+                job.state = 'queued'
+                job.worker = None
+                self.queue.insert(0, job)
+                self.lock.notify_all()
+            return
+
+        if job.cancelled:
+            job.state = 'cancelled'
+        job.seconds = time.perf_counter() - start
+        with self.finished_lock:
+            self.finished(job)
+
+    def submit(self, kind, shots, force=False):
+        if kind not in JOB_KINDS:
+            raise JobServerError("Unknown job kind %s (%s)" % (kind, ", ".join(JOB_KINDS)))
+        with self.lock:
+            ids = []
+            for shot in shots:
+                job = Job(self.next_id, kind, os.path.abspath(shot), force)
+                self.next_id += 1
+                self.jobs[job.id] = job
+                self.queue.append(job)
+                ids.append(job.id)
+            self.lock.notify_all()
+        return ids
+
+    def cancel(self, job_ids):
+        """Removes queued jobs, stops running ones by killing their worker (it's restarted)"""
+        cancelled = []
+        with self.lock:
+            for job_id in job_ids or [job.id for job in self.jobs.values()]:
+                job = self.jobs.get(job_id)
+                if job is None or job.state in FINISHED_STATES:
+                    continue
+                job.cancelled = True
+                cancelled.append(job.id)
+                if job in self.queue:
+                    self.queue.remove(job)
+                    job.state = 'cancelled'
+                elif job.sent:
+                    worker = self.workers[job.worker - 1]
+                    if worker.process is not None:
+                        worker.process.kill()
+        return cancelled
+
+    def status(self, job_ids=None):
+        with self.lock:
+            jobs = [self.jobs[job_id] for job_id in job_ids if job_id in self.jobs] if job_ids else self.jobs.values()
+            return {"jobs": [job.to_dict() for job in jobs],
+                    "workers": [worker.to_dict() for worker in self.workers]}
+
+    def handle(self, message):
+        op = message.get("op")
+        if op == "submit":
+            return {"ids": self.submit(message["kind"], message["shots"], message.get("force", False))}
+        elif op == "status":
+            return self.status(message.get("ids"))
+        elif op == "cancel":
+            return {"ids": self.cancel(message.get("ids"))}
+        elif op == "shutdown":
+            # stopped once the reply is sent
+            return {}
+        raise JobServerError("Unknown request %r" % op)
+
+    def serve(self):
+        """Runs until a shutdown request (or Ctrl+C)"""
+        self.listener = Listener(new_address(), authkey=self.authkey)
+        server_file = get_server_file()
+        fd = os.open(server_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({"address": self.listener.address, "key": self.authkey.hex(), "pid": os.getpid()}, f)
+
+        slots = [threading.Thread(target=self.run_slot, args=(worker,), daemon=True) for worker in self.workers]
+        for slot in slots:
+            slot.start()
+        print("Job server with %d workers listening on %s" % (len(self.workers), self.listener.address))
+
+        try:
+            while not self.stopping:
+                try:
+                    connection = self.listener.accept()
+                except (OSError, AuthenticationError):
+                    # a client with the wrong key
+                    continue
+                if self.stopping:
+                    connection.close()
+                    break
+                threading.Thread(target=self.handle_connection, args=(connection,), daemon=True).start()
+        except KeyboardInterrupt:
+            self.stop(wake=False)
+        finally:
+            address = self.listener.address
+            self.listener.close()
+            if isinstance(address, str):
+                # the socket is removed by close(), its folder isn't
+                os.rmdir(os.path.dirname(address))
+            os.remove(server_file)
+            print("Waiting for the running jobs to finish")
+            for slot in slots:
+                slot.join()
+
+    def handle_connection(self, connection):
+        try:
+            message = connection.recv()
+            if "worker" in message:
+                worker = self.workers[message["worker"] - 1]
+                worker.connection = connection
+                worker.connected.set()
+                return
+            try:
+                reply = self.handle(message)
+            except (JobServerError, KeyError) as e:
+                reply = {"error": str(e)}
+            connection.send(reply)
+            connection.close()
+            if message.get("op") == "shutdown":
+                self.stop()
+        except (EOFError, OSError):
+            connection.close()
+
+    def stop(self, wake=True):
+        """Cancels the queued jobs, the workers stop once their running job is done"""
+        with self.lock:
+            if self.stopping:
+                return
+            self.stopping = True
+            for job in self.queue:
+                job.state = 'cancelled'
+            self.queue.clear()
+            self.lock.notify_all()
+        if wake:
+            # serve() is waiting in accept() for the next connection
+            Client(self.listener.address, authkey=self.authkey).close()
+
+
+#####################       Worker Side       #####################
+
+def run_worker(run_job):
+    """Serves jobs from the server that started this Blender. run_job(shot, args) opens the shot
+    and runs the worker options on it, it's run with its output captured."""
+    address = json.loads(os.environ["HNS_JOBSERVER_ADDRESS"])
+    connection = Client(tuple(address) if isinstance(address, list) else address,
+                        authkey=bytes.fromhex(os.environ["HNS_JOBSERVER_KEY"]))
+    connection.send({"worker": int(os.environ["HNS_JOBSERVER_WORKER"])})
+
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            try:
+                run_job(job["shot"], job["args"])
+                succeeded = True
+            except SystemExit as e:
+                succeeded = not e.code
+            except Exception:
+                traceback.print_exc()
+                succeeded = False
+        connection.send({"succeeded": succeeded, "output": output.getvalue()[-20000:]})
+    connection.close()
+
+
+#####################       Client       #####################
+
+def request(message):
+    """Sends a request to the running server and returns its reply"""
+    try:
+        with open(get_server_file()) as f:
+            server = json.load(f)
+    except (OSError, ValueError):
+        raise JobServerError("No job server running (start one with --serve)")
+
+    address = server["address"]
+    try:
+        connection = Client(tuple(address) if isinstance(address, list) else address,
+                            authkey=bytes.fromhex(server["key"]))
+    except OSError as e:
+        raise JobServerError("Can't connect to the job server: %s" % e)
+    with connection:
+        connection.send(message)
+        reply = connection.recv()
+    if "error" in reply:
+        raise JobServerError(reply["error"])
+    return reply
+
+
+def submit(kind, paths, force=False):
+    """Queues a job for each shot (.blend files, or every .blend file under folders), returns the job ids"""
+    shots = [os.path.abspath(shot) for shot in blendfile.find_blend_files(paths)]
+    return request({"op": "submit", "kind": kind, "shots": shots, "force": force})["ids"]
+
+
+def wait(job_ids, interval=1.0):
+    """Waits for the jobs to finish, returns their final status"""
+    while True:
+        jobs = request({"op": "status", "ids": job_ids})["jobs"]
+        if all(job["state"] in FINISHED_STATES for job in jobs):
+            return jobs
+        time.sleep(interval)
+
+
+def format_status(status):
+    lines = ["%4s  %-9s  %-10s  %-8s  %s" % ("id", "kind", "state", "time", "shot")]
+    for job in status["jobs"]:
+        lines.append("%4d  %-9s  %-10s  %-8s  %s" % (job["id"], job["kind"], job["state"],
+            "%.1fs" % job["seconds"] if job["seconds"] is not None else "", os.path.relpath(job["shot"])))
+        if job["output"]:
+            lines.extend("        " + line for line in job["output"].strip().splitlines()[-10:])
+    for worker in status.get("workers", ()):
+        lines.append("worker %d (pid %s): %d jobs since it started%s" % (worker["id"], worker["pid"], worker["jobs"],
+            ", running job %d" % worker["job"] if worker["job"] else ""))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m hns_production_addon.jobserver",
+        description="Submits shot jobs to the job server (started in Blender with --serve) and follows them")
+    commands = parser.add_subparsers(dest="command")
+    submit_parser = commands.add_parser("submit", help="queue a job for each shot")
+    submit_parser.add_argument("kind", choices=list(JOB_KINDS))
+    submit_parser.add_argument("paths", nargs="+", metavar="PATH", help=".blend files or folders to search")
+    submit_parser.add_argument("--force", action="store_true", help="playblast even if the playblast is up to date")
+    submit_parser.add_argument("--wait", action="store_true", help="wait for the jobs and print how they went")
+    status_parser = commands.add_parser("status", help="list the jobs and workers")
+    status_parser.add_argument("ids", nargs="*", type=int)
+    cancel_parser = commands.add_parser("cancel", help="cancel jobs (all of them if no ids are given)")
+    cancel_parser.add_argument("ids", nargs="*", type=int)
+    commands.add_parser("shutdown", help="stop the server and its workers")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "submit":
+            ids = submit(args.kind, args.paths, args.force)
+            print("Queued jobs %s" % ", ".join(map(str, ids)) if ids else "No shots found")
+            if args.wait and ids:
+                jobs = wait(ids)
+                print(format_status({"jobs": jobs}))
+                return 0 if all(job["state"] in ('done', 'skipped') for job in jobs) else 1
+        elif args.command == "status":
+            print(format_status(request({"op": "status", "ids": args.ids})))
+        elif args.command == "cancel":
+            ids = request({"op": "cancel", "ids": args.ids})["ids"]
+            print("Cancelled jobs %s" % ", ".join(map(str, ids)) if ids else "Nothing to cancel")
+        elif args.command == "shutdown":
+            request({"op": "shutdown"})
+        else:
+            parser.print_help()
+    except JobServerError as e:
+        print(e)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
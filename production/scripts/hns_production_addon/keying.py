@@ -0,0 +1,131 @@
+# Writing lots of keyframes at once straight into an action's fcurves, instead of going through
+# bpy.ops.anim.keyframe_insert (which depends on the selection and keys one frame per call).
+#
+# Keys are collected in a KeyBatch first. write() then goes through each fcurve once: the keys
+# already on it are read with foreach_get, the new ones are added with keyframe_points.add()
+# and every position is written with a single foreach_set. Handles are recalculated once per
+# curve at the end.
+#
+#     batch = KeyBatch()
+#     for frame in frames:
+#         scene.frame_set(frame)
+#         for bone in bones:
+#             batch.add_bone(bone, frame)
+#     batch.write(get_fcurves(rig, action, create=True))
+#
+# Blender 4.4 moved an action's F-curves into channelbags, one per slot (the ID it animates),
+# and 5.0 removed Action.fcurves. get_fcurves() finds the ones that animate the rig either way.
+#
+# Doesn't import bpy, it only uses the fcurve API of the objects it's given.
+
+
+def bone_path(bone_name, prop):
+    """Data path of a pose bone property, prop is ".location" or '["custom prop"]'"""
+    return 'pose.bones["%s"]%s' % (bone_name.replace("\\", "\\\\").replace('"', '\\"'), prop)
+
+
+def rotation_property(rotation_mode):
+    if rotation_mode == 'QUATERNION':
+        return "rotation_quaternion"
+    elif rotation_mode == 'AXIS_ANGLE':
+        return "rotation_axis_angle"
+    return "rotation_euler"
+
+
+def get_fcurves(id_data, action, create=False):
+    """The F-curves in id_data's action that animate it: the channelbag of its action slot
+    from 4.4 on, the action's own before. With create, the slot and channelbag are added when
+    they don't exist yet, otherwise None is returned until they do."""
+    if not hasattr(action, "slots"):
+        return action.fcurves
+
+    from bpy_extras import anim_utils
+    animation_data = id_data.animation_data
+    slot = animation_data.action_slot
+    if slot is None:
+        if not create:
+            return None
+        slot = next(iter(animation_data.action_suitable_slots), None) or action.slots.new(id_data.id_type,
+                                                                                           id_data.name)
+        animation_data.action_slot = slot
+    if create:
+        return anim_utils.action_ensure_channelbag_for_slot(action, slot).fcurves
+    channelbag = anim_utils.action_get_channelbag_for_slot(action, slot)
+    return channelbag.fcurves if channelbag else None
+
+
+def new_fcurve(fcurves, data_path, index, group):
+    if not group:
+        return fcurves.new(data_path, index=index)
+    if hasattr(fcurves, "ensure"):
+        # a channelbag's
+        return fcurves.new(data_path, index=index, group_name=group)
+    return fcurves.new(data_path, index=index, action_group=group)
+
+
+class KeyBatch:
+    """Keys to add to an action, by fcurve"""
+
+    def __init__(self):
+        self.curves = {}  # (data path, index) -> {"group", "interpolation", "keys": {frame: value}}
+
+    def add(self, data_path, values, frame, group=None, interpolation=None):
+        frame = float(frame)
+        for index, value in enumerate(values):
+            curve = self.curves.get((data_path, index))
+            if curve is None:
+                curve = {"group": group, "interpolation": interpolation, "keys": {}}
+                self.curves[data_path, index] = curve
+            curve["keys"][frame] = value
+
+    def add_transforms(self, bone_name, rotation_mode, location, rotation, scale, frame):
+        """LocRotScale keys of a pose bone, rotation matching its rotation mode"""
+        self.add(bone_path(bone_name, ".location"), location, frame, bone_name)
+        self.add(bone_path(bone_name, "." + rotation_property(rotation_mode)), rotation, frame, bone_name)
+        self.add(bone_path(bone_name, ".scale"), scale, frame, bone_name)
+
+    def add_bone(self, bone, frame):
+        """LocRotScale keys of the bone's current pose"""
+        self.add_transforms(bone.name, bone.rotation_mode, bone.location,
+            getattr(bone, rotation_property(bone.rotation_mode)), bone.scale, frame)
+
+    def __len__(self):
+        return sum(len(curve["keys"]) for curve in self.curves.values())
+
+    def write(self, fcurves):
+        """Adds the keys to the fcurves from get_fcurves() (creating the ones that don't exist yet),
+        replacing keys already on the same frames. Returns the number of keys written."""
+        # find() goes through every curve each time
+        existing_curves = {(fcurve.data_path, fcurve.array_index): fcurve for fcurve in fcurves}
+
+        for (data_path, index), curve in self.curves.items():
+            fcurve = existing_curves.get((data_path, index))
+            if fcurve is None:
+                fcurve = new_fcurve(fcurves, data_path, index, curve["group"])
+            points = fcurve.keyframe_points
+
+            count = len(points)
+            co = [0.0] * (count * 2)
+            points.foreach_get("co", co)
+            existing = {co[i * 2]: i for i in range(count)}
+
+            added = []
+            for frame, value in curve["keys"].items():
+                i = existing.get(frame)
+                if i is None:
+                    added.append(frame)
+                    co += (frame, value)
+                else:
+                    co[i * 2 + 1] = value
+
+            points.add(len(added))
+            points.foreach_set("co", co)
+
+            if curve["interpolation"]:
+                for point in points[count:]:
+                    point.interpolation = curve["interpolation"]
+
+            # sorts the new keys in and recalculates the (auto) handles
+            fcurve.update()
+
+        return len(self)
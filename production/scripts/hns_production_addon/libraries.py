@@ -0,0 +1,223 @@
+# Keeps the linked libraries (the character rigs, the environments) loaded in a worker Blender
+# between shots. Opening a shot frees everything and reads its libraries from disk again, even
+# when the last shot linked the very same ones. Instead, shots in the folder of the file that
+# was opened are appended into it: Blender finds their libraries already loaded (it matches
+# them by absolute path) and only reads the shot's own data. The shot is removed again once
+# its job is done, and what it linked stays loaded for the next one.
+#
+# Only jobs that don't need the shot to be the open file (playblasts, thumbnails) are run this
+# way, and only where the scene can be made the context's without a window (Blender 3.2+).
+# Everything else opens the shot as usual. Libraries that were saved since they were loaded are
+# reloaded, and the least recently used ones are removed once the libraries' data is over the
+# memory cap. Workers only do this with --library-cache (see cli.py): appending crashes Blender on
+# some shots that open fine, and each of those costs a worker restart and a second run.
+
+import bpy
+
+import os
+import time
+from collections import OrderedDict
+
+from . import blendfile, rigs
+from .playblast import get_shot_name
+
+
+# Jobs that only read the shot, and work on an appended scene given its shot name (see cli.py).
+# Blender can crash appending a shot that it opens fine, so jobs whose worker crashed are run
+# again with OPEN_ARG (see serve_jobs() in batch.py).
+APPEND_ARGS = ("--playblast-shot", "--thumbnail-shot")
+OPEN_ARG = "--open-shot"
+
+
+# The size of a .blend file's data once it's decompressed: an upper bound on what linking from it
+# takes in memory, since only the linked data and what it uses is read
+def get_data_size(path):
+    try:
+        with blendfile.BlendFile(path) as blend:
+            return sum(block[1] for blocks in blend.blocks.values() for block in blocks)
+    except (OSError, blendfile.BlendFileError):
+        return 0
+
+
+def get_file_stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+
+def get_library_path(library):
+    # indirect libraries are relative to the library that links them
+    parent = get_library_path(library.parent) if library.parent else bpy.data.filepath
+    return blendfile.abspath(library.filepath, parent)
+
+
+# Every local data-block except the libraries themselves
+def get_local_ids():
+    ids = set()
+    for name in dir(bpy.data):
+        collection = getattr(bpy.data, name)
+        if name == "libraries" or not isinstance(collection, bpy.types.bpy_prop_collection):
+            continue
+        ids.update(item for item in collection if isinstance(item, bpy.types.ID) and item.library is None)
+    return ids
+
+
+class LibrarySession:
+    """The open file and the libraries kept loaded in it, least recently used first"""
+    
+    def __init__(self, memory_cap):
+        self.memory_cap = memory_cap  # bytes of library data
+        self.host = None  # the shot that was opened
+        self.libraries = OrderedDict()  # absolute path -> {"size", "stat"}
+        self.scene = None  # the appended shot's scene
+        self.shot_ids = set()  # local data-blocks that came with it
+        self.shot_library = None  # the library Blender leaves for the file it appended from
+        self.loads = []  # (shot, seconds, appended)
+    
+    def can_append(self, shot, args):
+        return (self.host is not None and hasattr(bpy.types.Context, "temp_override")
+                and any(arg in args for arg in APPEND_ARGS) and OPEN_ARG not in args
+                and os.path.dirname(os.path.abspath(shot)) == os.path.dirname(self.host))
+    
+    def get_used_size(self):
+        return sum(library["size"] for library in self.libraries.values())
+    
+    def use_libraries(self, paths):
+        for path in paths:
+            if path in self.libraries:
+                self.libraries.move_to_end(path)
+            else:
+                self.libraries[path] = {"size": get_data_size(path), "stat": get_file_stat(path)}
+    
+    # Opens the shot, the libraries it links are the ones loaded now
+    def open_shot(self, shot):
+        self.shot_ids = set()
+        self.shot_library = None
+        self.scene = None
+        start = time.perf_counter()
+        bpy.ops.wm.open_mainfile(filepath=shot)
+        self.loads.append((shot, time.perf_counter() - start, False))
+        rigs.clear_cache()
+        
+        self.host = os.path.abspath(shot)
+        self.libraries.clear()
+        self.use_libraries(get_library_path(library) for library in bpy.data.libraries)
+    
+    # Reloads the loaded libraries that were saved since, and removes the least recently used ones
+    # the shot doesn't need until its libraries fit under the memory cap (they can go over it on
+    # their own). Returns (reloaded, removed).
+    def update_libraries(self, needed):
+        loaded = {get_library_path(library): library for library in bpy.data.libraries}
+        reloaded = removed = 0
+        
+        for path, library in self.libraries.items():
+            stat = get_file_stat(path)
+            if path in needed and path in loaded and stat != library["stat"]:
+                loaded[path].reload()
+                library.update(size=get_data_size(path), stat=stat)
+                reloaded += 1
+        
+        needed_size = sum(get_data_size(path) for path in needed if path not in self.libraries)
+        for path in list(self.libraries):
+            if self.get_used_size() + needed_size <= self.memory_cap:
+                break
+            if path in needed:
+                continue
+            if path in loaded:
+                bpy.data.libraries.remove(loaded[path])
+            del self.libraries[path]
+            removed += 1
+        if reloaded or removed:
+            # the rig cache would still point at the armatures they had
+            rigs.clear_cache()
+        return reloaded, removed
+    
+    # Appends the shot's scene (the one it was saved with), returns whether it could
+    def append_shot(self, shot):
+        try:
+            with blendfile.BlendFile(shot) as blend:
+                scene_name = blendfile.read_active_scene(blend)
+            needed = set(blendfile.library_paths(shot, recursive=True))
+        except (OSError, blendfile.BlendFileError) as e:
+            print("Can't read %s, opening it: %s" % (shot, e))
+            return False
+        if scene_name is None:
+            return False
+        
+        start = time.perf_counter()
+        reloaded, removed = self.update_libraries(needed)
+        before = get_local_ids()
+        with bpy.data.libraries.load(shot, link=False) as (data_from, data_to):
+            data_to.scenes = [scene_name]
+        self.shot_ids = get_local_ids() - before
+        self.scene = data_to.scenes[0]
+        self.shot_library = next((library for library in bpy.data.libraries
+                                  if get_library_path(library) == os.path.abspath(shot)), None)
+        self.use_libraries(needed)
+        seconds = time.perf_counter() - start
+        self.loads.append((shot, seconds, True))
+        
+        print("Appended %s in %.2fs (%d libraries loaded, %.0fMB, %d reloaded, %d removed)" % (get_shot_name(shot),
+              seconds, len(self.libraries), self.get_used_size() / 2**20, reloaded, removed))
+        return True
+    
+    # Removes the appended shot's own data, what it linked stays loaded
+    def clear_shot(self):
+        if self.shot_ids:
+            bpy.data.batch_remove(self.shot_ids)
+            rigs.clear_cache()
+        if self.shot_library:
+            bpy.data.libraries.remove(self.shot_library)
+        self.shot_ids = set()
+        self.shot_library = None
+        self.scene = None
+    
+    def run(self, shot, args, run):
+        """Runs run(args) (the command line options, see cli.py) on the shot, appended if it can be"""
+        if not (self.can_append(shot, args) and self.append_shot(shot)):
+            self.open_shot(shot)
+            run(args)
+            return
+        
+        try:
+            with bpy.context.temp_override(scene=self.scene, view_layer=self.scene.view_layers[0]):
+                run(args + ["--shot-name", get_shot_name(shot)])
+        finally:
+            self.clear_shot()
+
+
+# Times loading every shot of the folders one after the other, opening each one, then with a
+# session that keeps the libraries loaded, and prints the time each shot took both ways.
+def bench_library_session(folders, memory_cap):
+    shots = list(blendfile.find_blend_files(folders))
+    if not shots:
+        print("No shots in " + ", ".join(folders))
+        return
+    
+    # both runs read from the disk cache
+    for path in set(shots) | {library for shot in shots for library in blendfile.library_paths(shot, recursive=True)}:
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                f.read()
+    
+    opened = []
+    for shot in shots:
+        start = time.perf_counter()
+        bpy.ops.wm.open_mainfile(filepath=shot)
+        opened.append(time.perf_counter() - start)
+    
+    session = LibrarySession(memory_cap)
+    for shot in shots:
+        if not (session.can_append(shot, APPEND_ARGS) and session.append_shot(shot)):
+            session.open_shot(shot)
+        session.clear_shot()
+    
+    print("\n%-24s %10s %10s" % ("shot", "opened", "session"))
+    for seconds, (shot, session_seconds, appended) in zip(opened, session.loads):
+        print("%-24s %9.2fs %9.2fs%s" % (get_shot_name(shot), seconds, session_seconds,
+                                         "" if appended else "  (opened)"))
+    total, session_total = sum(opened), sum(load[1] for load in session.loads)
+    print("%-24s %9.2fs %9.2fs  (%.2fs saved per shot)" % ("total", total, session_total,
+                                                             (total - session_total) / len(shots)))
@@ -0,0 +1,125 @@
+# Reads the video track of .mp4/.mov files (codec, size, frame rate, frame count) straight
+# from the moov box, without ffprobe or decoding anything. Enough to tell whether playblasts
+# can be joined without re-encoding.
+#
+# Doesn't import bpy:
+#   python -m hns_production_addon.movfile production/shots/3_present/present_0100_playblast.mp4
+
+import os
+import struct
+from fractions import Fraction
+
+
+class MovieFileError(Exception):
+    pass
+
+
+# Boxes that only contain other boxes, on the way to the sample descriptions
+CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+
+def iter_boxes(f, start, end):
+    """(type, payload offset, end offset) of each box between start and end"""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, box_type = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            raise MovieFileError("Bad %r box at %d" % (box_type, offset))
+        yield box_type, offset + header, offset + size
+        offset += size
+
+
+def read_tracks(f, start, end, tracks=None, track=None):
+    tracks = [] if tracks is None else tracks
+    for box_type, payload, box_end in iter_boxes(f, start, end):
+        if box_type == b"trak":
+            track = {}
+            tracks.append(track)
+        if box_type in CONTAINERS:
+            read_tracks(f, payload, box_end, tracks, track)
+        elif track is not None:
+            f.seek(payload)
+            data = f.read(min(box_end - payload, 256))
+            read_track_box(track, box_type, data, f, payload, box_end)
+    return tracks
+
+
+def read_track_box(track, box_type, data, f, payload, box_end):
+    if box_type == b"hdlr":
+        track["handler"] = data[8:12].decode("latin-1")
+    elif box_type == b"mdhd":
+        if data[0] == 1:
+            track["timescale"], track["duration"] = struct.unpack_from(">IQ", data, 20)
+        else:
+            track["timescale"], track["duration"] = struct.unpack_from(">II", data, 12)
+    elif box_type == b"stsd":
+        # first sample description: size, format, 6 reserved, data reference index,
+        # then for video 16 bytes of nothing in particular before the width and height
+        track["codec"] = data[12:16].decode("latin-1").strip()
+        if len(data) >= 44:
+            track["width"], track["height"] = struct.unpack_from(">HH", data, 40)
+    elif box_type == b"stts":
+        # (sample count, sample duration) runs
+        f.seek(payload + 4)
+        count = struct.unpack(">I", f.read(4))[0]
+        runs = f.read(min(count * 8, box_end - payload - 8))
+        track["samples"] = [struct.unpack_from(">II", runs, i * 8) for i in range(len(runs) // 8)]
+
+
+def read_info(path):
+    """{"path", "codec", "width", "height", "fps" (a Fraction), "frames", "seconds", "audio"}
+    of the first video track"""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        moov = next(((payload, end) for box_type, payload, end in iter_boxes(f, 0, size) if box_type == b"moov"), None)
+        if moov is None:
+            raise MovieFileError("%s: no moov box (not a movie, or it wasn't finished)" % path)
+        tracks = read_tracks(f, *moov)
+
+    video = next((track for track in tracks if track.get("handler") == "vide"), None)
+    if video is None or "codec" not in video:
+        raise MovieFileError("%s: no video track" % path)
+
+    frames = sum(count for count, duration in video.get("samples", ()))
+    ticks = sum(count * duration for count, duration in video.get("samples", ()))
+    timescale = video.get("timescale") or 1
+    return {
+        "path": path,
+        "codec": video["codec"],
+        "width": video.get("width"),
+        "height": video.get("height"),
+        "fps": Fraction(timescale * frames, ticks) if ticks else None,
+        "frames": frames,
+        "seconds": ticks / timescale,
+        "audio": any(track.get("handler") == "soun" for track in tracks),
+    }
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m hns_production_addon.movfile",
+        description="Prints the codec, size and frame rate of movie files")
+    parser.add_argument("paths", nargs="+", metavar="PATH")
+    args = parser.parse_args(argv)
+
+    for path in args.paths:
+        try:
+            info = read_info(path)
+        except (OSError, MovieFileError) as e:
+            print("%s: %s" % (path, e))
+            continue
+        print("%s: %s %dx%d %s fps, %d frames%s" % (os.path.relpath(path), info["codec"], info["width"],
+            info["height"], float(info["fps"]) if info["fps"] else "?", info["frames"],
+            ", audio" if info["audio"] else ""))
+
+
+if __name__ == "__main__":
+    main()
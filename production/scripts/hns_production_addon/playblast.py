@@ -0,0 +1,545 @@
+# The playblast operator and what every playblast (interactive, background or batch) shares:
+# the output/encoding/stamp settings, the fast playblast profile, streaming to ffmpeg and the
+# cache of playblasts that are up to date.
+
+import bpy
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from . import blendfile, encoders, playdiff, proxies, rigs, settings, timing, validate
+from .prefs import get_playblast_prefs
+
+
+#####################       Playblast Operator       #####################
+
+class ANIM_OT_playblast(bpy.types.Operator):
+    """Playblasts (viewport renders) the scene with predefined settings"""
+     
+    # In case we ever need to playblast manually, here's a reference of everything the script does:
+    # - Hides overlays
+    # - Sets viewport shading to LookDev (or Workbench/Solid if set in playblast options)
+    # - Aligns view with the render camera (View -> Cameras -> Active Camera)
+    # - Sets these render settings:
+    #       Output tab > Dimensions > Resolution % = 50% (or whatever is selected in playblast options)
+    #                    Output > Render path = //[filename]_playblast.mp4
+    #                             File format = FFmpeg video
+    #                             Encoding > Container = MPEG-4
+    #                             Video > Video Codec = H.264
+    #                                     Output quality = Medium quality
+    #                    Metadata > Burn Into Image
+    #                               (shows a note with the shot name, and optionally the frame number;
+    #                                disables all the other overlays that are shown by default)
+    # 
+    # These settings should already be set in the shot file (checked before playblasting, see validate.py):
+    #       Scene tab > Scene > Camera = render_cam
+    #       Output tab > Dimensions > Resolution X/Y = 1920px by 1080px
+    #                                 Aspect X/Y = 1.0
+    #                                 Frame Start/End = scene start/end, Step = 1
+    #                                 Frame Rate = 24 fps 
+    
+    bl_idname = "anim.playblast"
+    bl_label = "Playblast"
+    
+    force: bpy.props.BoolProperty(
+        name="Force",
+        description="Playblast even if the existing playblast is up to date",
+        options={'SKIP_SAVE'}
+    )
+    check: bpy.props.BoolProperty(
+        name="Check Shot Settings",
+        description="Don't playblast if the camera, resolution, aspect, frame step or frame rate are wrong",
+        default=True,
+        options={'SKIP_SAVE'}
+    )
+    
+    def execute(self, context):
+        addon_prefs = get_playblast_prefs(context)
+        
+        # unsaved changes aren't in the shot file, so the cache can't vouch for them
+        shot = bpy.data.filepath
+        cacheable = shot and not bpy.data.is_dirty
+        
+        if not self.force and cacheable and playblast_is_current(shot, addon_prefs):
+            self.report({'INFO'}, "Playblast is already up to date")
+            return {'FINISHED'}
+        
+        if self.check:
+            problems = validate.check_context(context)
+            if problems:
+                self.report({'ERROR'}, "Wrong shot settings (Render > Fix Shot Settings): " + "; ".join(problems))
+                return {'CANCELLED'}
+        
+        old_frame = context.scene.frame_current
+        
+        # everything changed through the snapshot is restored at the end of the with block,
+        # even if the playblast fails
+        with settings.SettingsSnapshot() as snapshot:
+            try:
+                set_playblast_settings(context, addon_prefs, get_shot_name(), snapshot)
+                
+                # a bit hacky, but this opens a new temporary window
+                snapshot.apply(context, {"preferences.view.render_display_type": 'WINDOW'})
+                bpy.ops.render.view_show('INVOKE_DEFAULT')
+                
+                area = context.window_manager.windows[-1].screen.areas[0]  
+                area.type = 'VIEW_3D'
+                view3d_space = next(s for s in area.spaces if s.type == 'VIEW_3D')
+                view3d_space.overlay.show_overlays = False
+                view3d_space.shading.type = 'SOLID' if addon_prefs.playblast_shade_solid else 'MATERIAL'
+                # I think this should be set by default, but just in case?
+                view3d_space.camera = context.scene.camera
+        
+                context_override = {}
+                context_override["window"] = context.window_manager.windows[-1]
+                context_override["area"] = area
+                context_override["region"] = next(r for r in area.regions if r.type == 'WINDOW')
+                
+                # assumes the new 3D View is always a non-active-camera view by default
+                bpy.ops.view3d.view_camera(context_override)
+                
+                try:
+                    diff_report = render_playblast(addon_prefs, get_shot_name(), context_override)
+                finally:
+                    bpy.ops.wm.window_close(context_override)
+            except Exception:
+                # whatever was written isn't a complete playblast
+                if shot:
+                    forget_playblast(shot)
+                raise
+            finally:
+                context.scene.frame_set(old_frame)
+        
+        if cacheable:
+            record_playblast(shot, addon_prefs)
+        elif shot:
+            forget_playblast(shot)
+        
+        if diff_report is not None:
+            self.report({'INFO'}, playdiff.format_report(diff_report))
+        return {'FINISHED'}
+        
+
+
+# "intro_0100" for .../shots/1_intro/intro_0100.blend
+def get_shot_name(filepath=None):
+    return bpy.path.basename(filepath or bpy.data.filepath).replace(".blend", "")
+
+
+# "intro_0100_playblast.mp4" (or "intro_0100_playblast/" for image sequences)
+def get_playblast_filename(shot_name, prefs):
+    return shot_name + "_playblast" + encoders.PROFILES[prefs.playblast_encoder].extension
+
+
+# The output, encoding and stamp (text overlay) settings shared by the playblast operator
+# and the batch playblast, as {path from the context: value} (see settings.py).
+# The display shading is only used when there's no 3D View to render from (blender -b).
+def get_playblast_settings(prefs, shot_name):
+    base_font_size = 60
+    
+    playblast_settings = {"scene.render.resolution_percentage": prefs.playblast_scale}
+    playblast_settings.update(encoders.PROFILES[prefs.playblast_encoder].settings)
+    playblast_settings.update({
+        "scene.render.filepath": "//" + get_playblast_filename(shot_name, prefs),
+        
+        "scene.render.use_stamp": True,
+        "scene.render.stamp_font_size": base_font_size * prefs.playblast_scale // 100,
+        
+        "scene.render.use_stamp_frame": prefs.playblast_show_frames,
+        "scene.render.use_stamp_note": True,
+        "scene.render.stamp_note_text": shot_name.replace("_", " ").title(),
+        
+        "scene.render.use_stamp_camera": False,
+        "scene.render.use_stamp_date": False,
+        "scene.render.use_stamp_filename": False,
+        "scene.render.use_stamp_memory": False,
+        "scene.render.use_stamp_render_time": False,
+        "scene.render.use_stamp_scene": False,
+        "scene.render.use_stamp_time": False,
+        
+        "scene.display.shading.type": 'SOLID' if prefs.playblast_shade_solid else 'MATERIAL',
+    })
+    return playblast_settings
+
+
+# Settings that the playblast settings can change as a side effect: switching the file format
+# changes the color mode, and switching to FFmpeg resets a container and codec it doesn't
+# support (so they have to be remembered before the encoder profile is applied)
+PLAYBLAST_SIDE_EFFECT_SETTINGS = ["scene.render.image_settings.color_mode", "scene.render.ffmpeg.format",
+                                  "scene.render.ffmpeg.codec", "scene.render.ffmpeg.constant_rate_factor"]
+
+
+# Applies the playblast settings (and the fast playblast profile and texture proxies if they're
+# enabled) through the snapshot, which restores them afterwards.
+def set_playblast_settings(context, prefs, shot_name, snapshot):
+    # first, since relocating the libraries replaces the linked objects the fast playblast changes
+    if prefs.playblast_texture_proxies:
+        use_texture_proxies(prefs, snapshot)
+    snapshot.capture_paths(context, PLAYBLAST_SIDE_EFFECT_SETTINGS)
+    snapshot.apply(context, get_playblast_settings(prefs, shot_name))
+    if prefs.playblast_fast:
+        set_fast_playblast(context, prefs, snapshot)
+
+
+# Renders the playblast with the given context override (if any), recording per-frame timings
+# in the folder (next to the shot file by default) if they're enabled (see timing.py).
+# With stream, the frames are encoded by ffmpeg if that's enabled in the options.
+# With diff (and the option enabled), the new playblast is compared with the one it replaces.
+# Returns the comparison (see playdiff.py), None if there wasn't one.
+def render_playblast(prefs, report_name, *override, folder=None, stream=True, diff=True):
+    scene = bpy.context.scene
+    output = bpy.path.abspath(scene.render.filepath)
+    previous = playdiff.set_aside(output) if diff and prefs.playblast_diff else None
+    
+    try:
+        if not prefs.playblast_timings:
+            run_playblast_render(prefs, stream, *override)
+        else:
+            with timing.FrameTimer() as timer:
+                run_playblast_render(prefs, stream, *override)
+            print("Playblast timings written to " + timer.write(folder or bpy.path.abspath("//"), report_name))
+    except BaseException:
+        if previous:
+            playdiff.restore(previous, output)
+        raise
+    
+    if previous:
+        return compare_playblast(scene, previous, output)
+    return None
+
+
+def run_playblast_render(prefs, stream, *override):
+    if stream and prefs.playblast_stream and encoders.PROFILES[prefs.playblast_encoder].ffmpeg_args:
+        ffmpeg = encoders.find_ffmpeg()
+        if ffmpeg:
+            stream_playblast(bpy.context.scene, prefs, ffmpeg, *override)
+            return
+        print("ffmpeg not found (put it on the PATH or set HNS_FFMPEG), using Blender's encoder")
+    render_viewport(*override, animation=True)
+
+
+# The render engine that draws a shading type the way the viewport does
+def get_viewport_engine(shading_type):
+    if shading_type != 'MATERIAL':
+        return 'BLENDER_WORKBENCH'
+    # EEVEE Next was called that from 4.2 to 4.4
+    return 'BLENDER_EEVEE_NEXT' if (4, 2, 0) <= bpy.app.version < (5, 0, 0) else 'BLENDER_EEVEE'
+
+
+# Renders like bpy.ops.render.opengl() (takes the same arguments). OpenGL render doesn't work in
+# a background Blender (blender -b), so there the scene is rendered with the engine the viewport
+# draws its display shading with (Workbench for solid, EEVEE for material preview), with the
+# viewport's anti-aliasing and samples.
+def render_viewport(*override, **options):
+    if not bpy.app.background:
+        bpy.ops.render.opengl(*override, **options)
+        return
+    
+    scene = bpy.context.scene
+    with settings.SettingsSnapshot() as snapshot:
+        snapshot.apply(scene, {
+            "render.engine": get_viewport_engine(scene.display.shading.type),
+            "display.render_aa": scene.display.viewport_aa,
+            "eevee.taa_render_samples": scene.eevee.taa_samples,
+        })
+        bpy.ops.render.render(**options)
+
+
+# Compares the new playblast with the previous one (which is deleted afterwards), writing the
+# report and the clip of the changed frames next to it. Returns the report, None if they
+# couldn't be compared (e.g. the scale changed).
+def compare_playblast(scene, previous, output):
+    try:
+        report = playdiff.diff_playblasts(previous, output, scene.frame_start)
+        playdiff.write_report(report, output, scene.render.fps / scene.render.fps_base)
+    except playdiff.DiffError as e:
+        print("Couldn't compare with the previous playblast: %s" % e)
+        return None
+    finally:
+        playdiff.remove(previous)
+    
+    print(playdiff.format_report(report))
+    return report
+
+
+#####################       Fast Playblast       #####################
+
+# Modifiers that are slow to evaluate but don't change the overall shape much
+FAST_PLAYBLAST_MODIFIERS = {'BEVEL', 'BOOLEAN', 'CORRECTIVE_SMOOTH', 'LAPLACIANSMOOTH',
+                            'MULTIRES', 'REMESH', 'SMOOTH', 'WEIGHTED_NORMAL'}
+
+
+def get_library(id_block):
+    if id_block is None:
+        return None
+    if id_block.library:
+        return id_block.library
+    override = getattr(id_block, "override_library", None)
+    if override and override.reference:
+        return override.reference.library
+    return None
+
+
+# Whether the object (or its data, or what it's a proxy of) comes from production/3D_assets/linked_assets
+def is_linked_asset(obj):
+    for id_block in (obj, obj.data, getattr(obj, "proxy", None)):
+        library = get_library(id_block)
+        if library and "linked_assets" in library.filepath.replace("\\", "/"):
+            return True
+    return False
+
+
+def texture_limit_size(limit):
+    return 1 << 30 if limit == 'CLAMP_OFF' else int(limit[len("CLAMP_"):])
+
+
+# The fast playblast profile (render simplify, texture limit) as {path from the context: value}.
+# Settings that are already lower than the profile are left alone.
+def get_fast_playblast_settings(context, prefs):
+    render = context.scene.render
+    
+    subdivision = prefs.playblast_fast_subdivision
+    child_particles = prefs.playblast_fast_child_particles
+    if render.use_simplify:
+        subdivision = min(render.simplify_subdivision, subdivision)
+        child_particles = min(render.simplify_child_particles, child_particles)
+    
+    fast_settings = {
+        "scene.render.use_simplify": True,
+        "scene.render.simplify_subdivision": subdivision,
+        "scene.render.simplify_child_particles": child_particles,
+    }
+    
+    limit = prefs.playblast_fast_texture_limit
+    if texture_limit_size(limit) < texture_limit_size(context.preferences.system.gl_texture_limit):
+        fast_settings["preferences.system.gl_texture_limit"] = limit
+    
+    return fast_settings
+
+
+# Applies the fast playblast profile and hides the heavy modifiers through the snapshot
+def set_fast_playblast(context, prefs, snapshot):
+    snapshot.apply(context, get_fast_playblast_settings(context, prefs))
+    
+    if prefs.playblast_fast_modifiers:
+        for obj in bpy.data.objects:
+            if not is_linked_asset(obj):
+                continue
+            for modifier in obj.modifiers:
+                if modifier.type in FAST_PLAYBLAST_MODIFIERS and modifier.show_viewport:
+                    # left alone where it isn't editable
+                    snapshot.try_set(modifier, "show_viewport", False)
+
+
+#####################       Texture Proxies       #####################
+
+# The longest texture side the playblast can show (see proxies.texture_size())
+def get_texture_size(prefs):
+    limit = None
+    if prefs.playblast_fast and prefs.playblast_fast_texture_limit != 'CLAMP_OFF':
+        limit = texture_limit_size(prefs.playblast_fast_texture_limit)
+    return proxies.texture_size(prefs.playblast_scale, limit)
+
+
+# Swaps the images for their proxies (see proxies.py) through the snapshot: the local images are
+# pointed at their proxies and, in a background Blender, the linked libraries are relocated to
+# copies that use them. Reloading the libraries of the file someone is working on would lose
+# the undo history and anything not saved in their linked data, so the playblast operator only
+# swaps the local images. Missing proxies are made first (with ffmpeg). Images without proxies
+# are left alone.
+def use_texture_proxies(prefs, snapshot):
+    shot = bpy.data.filepath
+    try:
+        cache = proxies.load_cache(shot)
+    except ValueError as e:
+        print("Not using texture proxies: %s" % e)
+        return
+    size = get_texture_size(prefs)
+    
+    try:
+        for image in list(bpy.data.images):
+            if image.library or image.source != 'FILE' or image.packed_file:
+                continue
+            proxy = cache.get_proxy(blendfile.abspath(image.filepath, shot), size)
+            if proxy:
+                snapshot.set(image, "filepath", proxy)
+        
+        if not bpy.app.background:
+            return
+        for library in list(bpy.data.libraries):
+            # the libraries they link come with the copies
+            if library.parent:
+                continue
+            copy = cache.get_library_copy(blendfile.abspath(library.filepath, shot), size)
+            if copy:
+                # restored newest first, so the library is reloaded after its path is put back,
+                # and the rig cache (which its reload leaves pointing at freed armatures) cleared
+                snapshot.defer(rigs.clear_cache, "rig cache")
+                snapshot.defer(library.reload, "library " + library.name)
+                snapshot.set(library, "filepath", copy)
+                library.reload()
+                rigs.clear_cache()
+    except (OSError, proxies.ProxyError, blendfile.BlendFileError) as e:
+        print("Couldn't use all the texture proxies: %s" % e)
+    finally:
+        cache.save()
+
+
+# Times loading the images of the open file and its libraries (blender -b FILE -P ...) from
+# their files and from their proxies, and prints the memory they take.
+def bench_texture_proxies(prefs, repeat=3):
+    import statistics
+    import time
+    
+    shot = bpy.data.filepath
+    cache = proxies.load_cache(shot)
+    size = get_texture_size(prefs)
+    
+    def load(path):
+        timings = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            image = bpy.data.images.load(path, check_existing=False)
+            # reading the size loads the pixels
+            width, height = image.size
+            timings.append(time.perf_counter() - start)
+            bpy.data.images.remove(image)
+        return statistics.median(timings), proxies.image_memory(width, height)
+    
+    totals = [0.0, 0, 0.0, 0]
+    for source in sorted(proxies.find_images(proxies.find_files([shot]))):
+        if not os.path.isfile(source):
+            continue
+        proxy = cache.get_proxy(source, size) or source
+        
+        result = load(source) + load(proxy)
+        totals = [total + value for total, value in zip(totals, result)]
+        print("%-32s %7.1fms %7.1fMB -> %7.1fms %7.1fMB" % (os.path.basename(source), result[0] * 1000,
+            result[1] / 1e6, result[2] * 1000, result[3] / 1e6))
+    cache.save()
+    
+    print("\nTextures for %dpx (median of %d loads):" % (size, repeat))
+    print("  %.1fms, %.1fMB from the files" % (totals[0] * 1000, totals[1] / 1e6))
+    print("  %.1fms, %.1fMB from the proxies" % (totals[2] * 1000, totals[3] / 1e6))
+
+
+#####################       Playblast Encoding       #####################
+
+# Streamed playblasts (see encoders.py): each frame is drawn as an uncompressed BMP into a
+# temporary folder and handed to ffmpeg, which encodes it while the next one is drawn.
+# The output is whatever the render path was set to.
+def stream_playblast(scene, prefs, ffmpeg, *override):
+    profile = encoders.PROFILES[prefs.playblast_encoder]
+    output = bpy.path.abspath(scene.render.filepath)
+    fps = scene.render.fps / scene.render.fps_base
+    frames_dir = tempfile.mkdtemp(prefix="hns_stream_")
+    
+    try:
+        with settings.SettingsSnapshot() as snapshot, \
+                encoders.FrameStream(ffmpeg, profile, fps, output) as stream:
+            snapshot.apply(bpy.context, {
+                "scene.render.image_settings.file_format": 'BMP',
+                "scene.render.image_settings.color_mode": 'RGB',
+                "scene.render.filepath": frames_dir + os.sep,
+            })
+            for frame in range(scene.frame_start, scene.frame_end + 1, scene.frame_step):
+                scene.frame_set(frame)
+                # a still is written to the render path as it is, without the frame number
+                path = os.path.join(frames_dir, "%06d.bmp" % frame)
+                scene.render.filepath = path
+                render_viewport(*override, write_still=True)
+                stream.add(path)
+    finally:
+        shutil.rmtree(frames_dir, ignore_errors=True)
+
+
+# Total size of a playblast (a video file or a folder of frames)
+def get_playblast_size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    return os.path.getsize(path)
+
+
+#####################       Playblast Cache       #####################
+
+# Each sequence folder has a manifest with a content hash per shot, covering the shot file,
+# the libraries it links (production/3D_assets/linked_assets) and the playblast options.
+# A shot whose hash matches and whose _playblast.mp4 exists doesn't need to be playblasted again.
+# The linked libraries are read straight from the shot file (see blendfile.py).
+MANIFEST_NAME = "playblast_manifest.json"
+
+
+def get_manifest_path(shot):
+    return os.path.join(os.path.dirname(os.path.abspath(shot)), MANIFEST_NAME)
+
+
+def load_manifest(shot):
+    try:
+        with open(get_manifest_path(shot)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(shot, manifest):
+    path = get_manifest_path(shot)
+    # write then rename so an interrupted save doesn't leave half a manifest
+    with open(path + ".tmp", 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def get_playblast_path(shot, prefs):
+    return os.path.join(os.path.dirname(os.path.abspath(shot)), get_playblast_filename(get_shot_name(shot), prefs))
+
+
+def hash_file(hasher, path):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(chunk)
+
+
+def playblast_hash(shot, prefs):
+    hasher = hashlib.sha1()
+    hash_file(hasher, shot)
+    
+    for library in sorted(blendfile.library_paths(shot, recursive=True)):
+        hasher.update(os.path.basename(library).encode())
+        if os.path.isfile(library):
+            hash_file(hasher, library)
+    
+    # everything that changes what the playblast looks like
+    options = [prefs.playblast_scale, prefs.playblast_shade_solid, prefs.playblast_show_frames]
+    if prefs.playblast_fast:
+        options += [prefs.playblast_fast_subdivision, prefs.playblast_fast_child_particles,
+                    prefs.playblast_fast_texture_limit, prefs.playblast_fast_modifiers]
+    # only added when they're not the defaults, so existing manifests stay valid
+    if prefs.playblast_encoder != 'H264' or prefs.playblast_stream:
+        options += [prefs.playblast_encoder, prefs.playblast_stream]
+    if prefs.playblast_texture_proxies:
+        options.append("texture proxies")
+    hasher.update(repr(options).encode())
+    return hasher.hexdigest()
+
+
+def playblast_is_current(shot, prefs):
+    entry = load_manifest(shot).get(get_shot_name(shot))
+    if entry is None or not os.path.exists(get_playblast_path(shot, prefs)):
+        return False
+    return entry["hash"] == playblast_hash(shot, prefs)
+
+
+# The hash can be worked out beforehand, in case the shot might be saved again while it renders
+def record_playblast(shot, prefs, shot_hash=None):
+    manifest = load_manifest(shot)
+    manifest[get_shot_name(shot)] = {"hash": shot_hash or playblast_hash(shot, prefs)}
+    save_manifest(shot, manifest)
+
+
+def forget_playblast(shot):
+    manifest = load_manifest(shot)
+    if manifest.pop(get_shot_name(shot), None) is not None:
+        save_manifest(shot, manifest)
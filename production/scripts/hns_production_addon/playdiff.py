@@ -0,0 +1,361 @@
+# Compares a new playblast with the previous one frame by frame, so reviewers only have to
+# watch what changed. Both are decoded by ffmpeg into raw RGB frames that are read a chunk at
+# a time (sized to stay within a memory budget, whatever the playblast scale) and compared
+# with NumPy: a frame has changed when enough of its pixels differ by more than a threshold.
+#
+# The result is a report of the changed frame ranges (<shot>_playblast_diff.json) and a clip
+# of just those frames, with a few frames of handles (<shot>_playblast_changes.mp4).
+#
+# Needs ffmpeg (on the PATH or set in HNS_FFMPEG) and NumPy (Blender comes with it),
+# doesn't import bpy:
+#   python -m hns_production_addon.playdiff old_playblast.mp4 present_0100_playblast.mp4
+
+import importlib.util
+import json
+import os
+import queue
+import shutil
+import struct
+import subprocess
+import threading
+
+from . import encoders, movfile
+
+
+class DiffError(Exception):
+    pass
+
+
+# A pixel has changed when one of its channels differs by more than this (0-255), which is
+# well above what re-encoding the same frames changes
+PIXEL_THRESHOLD = 24
+
+# A frame has changed when more than this fraction of its pixels have (~1000 pixels at 1080p)
+FRAME_THRESHOLD = 0.0005
+
+# Unchanged frames kept before and after each change in the changes clip
+HANDLES = 6
+
+# Memory the frames being compared can take, in MB
+MEMORY_BUDGET = 256
+
+
+# The previous playblast while the new one renders, next to it
+def get_previous_path(output):
+    root, extension = os.path.splitext(output.rstrip(os.sep))
+    return root + ".previous" + (extension or os.sep)
+
+
+def get_report_path(output):
+    return os.path.splitext(output.rstrip(os.sep))[0] + "_diff.json"
+
+
+def get_changes_path(output):
+    return os.path.splitext(output.rstrip(os.sep))[0] + "_changes.mp4"
+
+
+def set_aside(output):
+    """Moves the playblast about to be replaced out of the way. Returns where it went, None if
+    there wasn't one."""
+    if not os.path.exists(output):
+        return None
+    previous = get_previous_path(output)
+    remove(previous)
+    os.replace(output.rstrip(os.sep), previous.rstrip(os.sep))
+    return previous
+
+
+# Puts the previous playblast back (when the new one failed)
+def restore(previous, output):
+    remove(output)
+    os.replace(previous.rstrip(os.sep), output.rstrip(os.sep))
+
+
+def remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+#####################       Decoding       #####################
+
+# The numbered PNGs of an image sequence playblast (see encoders.PROFILES['PNG'])
+def get_sequence_frames(folder):
+    frames = sorted((f for f in os.listdir(folder) if f.endswith(".png") and f[:-4].isdigit()),
+                    key=lambda f: int(f[:-4]))
+    if not frames:
+        raise DiffError("%s has no frames" % folder)
+    return frames
+
+
+def read_size(path):
+    """(width, height) of a movie or image sequence"""
+    if os.path.isdir(path):
+        with open(os.path.join(path, get_sequence_frames(path)[0]), 'rb') as f:
+            # the IHDR chunk comes first, right after the signature
+            return struct.unpack(">II", f.read(24)[16:24])
+    try:
+        info = movfile.read_info(path)
+    except (OSError, movfile.MovieFileError) as e:
+        raise DiffError(str(e))
+    return info["width"], info["height"]
+
+
+# ffmpeg input options for a movie or image sequence
+def get_inputs(path):
+    if not os.path.isdir(path):
+        return ["-i", path]
+    first = get_sequence_frames(path)[0][:-4]
+    return ["-start_number", first, "-i", os.path.join(path, "%%0%dd.png" % len(first))]
+
+
+def decode_command(ffmpeg, path):
+    return [ffmpeg, "-loglevel", "error"] + get_inputs(path) + ["-f", "rawvideo", "-pix_fmt", "rgb24", "-"]
+
+
+class FrameReader:
+    """Decodes a playblast into chunks of up to chunk frames (uint8 arrays of (frames, height,
+    width, 3)). A thread of its own reads the next chunk while the last one is compared, into
+    one of two buffers that are reused, so memory stays the same however long the playblast is."""
+
+    def __init__(self, ffmpeg, path, size, chunk):
+        import numpy
+
+        self.path = path
+        self.process = subprocess.Popen(decode_command(ffmpeg, path), stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE)
+        self.buffers = [numpy.empty((chunk, size[1], size[0], 3), numpy.uint8) for _ in range(2)]
+        self.chunks = queue.Queue(maxsize=1)
+        self.free = queue.Queue()
+        for buffer in self.buffers:
+            self.free.put(buffer)
+        self.thread = threading.Thread(target=self.read, daemon=True)
+        self.thread.start()
+
+    def read(self):
+        stdout = self.process.stdout
+        while True:
+            buffer = self.free.get()
+            if buffer is None:
+                return
+            view = memoryview(buffer).cast('B')
+            filled = 0
+            while filled < len(view):
+                count = stdout.readinto(view[filled:])
+                if not count:
+                    break
+                filled += count
+            frames = filled // buffer[0].size
+            if frames:
+                self.chunks.put(buffer[:frames])
+            if filled < len(view):
+                self.chunks.put(None)
+                return
+
+    def __iter__(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                return
+            yield chunk
+            # the chunk's buffer can be refilled once the caller is done with it
+            self.free.put(chunk.base if chunk.base is not None else chunk)
+
+    def close(self):
+        self.free.put(None)
+        self.process.kill()
+        self.process.wait()
+        stderr = self.process.stderr.read().decode(errors="replace").strip()
+        self.process.stderr.close()
+        self.process.stdout.close()
+        return stderr
+
+
+#####################       Comparing       #####################
+
+def compare_chunks(old, new, pixel_threshold=PIXEL_THRESHOLD):
+    """Fraction of changed pixels and mean difference (0-1) of each pair of frames"""
+    import numpy
+
+    # |new - old| without leaving uint8
+    difference = numpy.maximum(old, new)
+    difference -= numpy.minimum(old, new)
+    # a pixel's biggest change in any channel (max(axis=3) is several times slower)
+    biggest = numpy.maximum(difference[..., 0], difference[..., 1])
+    numpy.maximum(biggest, difference[..., 2], out=biggest)
+    biggest = biggest.reshape(len(biggest), -1)
+
+    pixels = biggest.shape[1]
+    changed = numpy.count_nonzero(biggest > pixel_threshold, axis=1) / pixels
+    mean = biggest.sum(axis=1, dtype=numpy.uint64) / (255 * pixels)
+    return changed, mean
+
+
+def get_chunk_size(size, memory_budget=MEMORY_BUDGET):
+    # two buffers per reader, the difference (old/new max and min) and the per-pixel maximum and mask
+    frame = size[0] * size[1] * 3
+    return max(1, int(memory_budget * 1024 * 1024 / (frame * 6 + frame * 2 / 3)))
+
+
+def compare_frames(old_chunks, new_chunks, pixel_threshold=PIXEL_THRESHOLD):
+    """(changed pixel fraction, mean difference) of each frame both playblasts have, and the
+    number of frames of each. The chunks of both have to be the same size (but the last)."""
+    changed = []
+    mean = []
+    old_frames = new_frames = 0
+    old_chunks = iter(old_chunks)
+    new_chunks = iter(new_chunks)
+
+    while True:
+        old = next(old_chunks, None)
+        new = next(new_chunks, None)
+        if old is None and new is None:
+            break
+        old_frames += len(old) if old is not None else 0
+        new_frames += len(new) if new is not None else 0
+        if old is None or new is None:
+            continue
+
+        count = min(len(old), len(new))
+        frame_changed, frame_mean = compare_chunks(old[:count], new[:count], pixel_threshold)
+        changed.extend(frame_changed.tolist())
+        mean.extend(frame_mean.tolist())
+    return changed, mean, old_frames, new_frames
+
+
+def frame_ranges(frames):
+    """[(first, last)] runs of consecutive frame numbers"""
+    ranges = []
+    for frame in sorted(frames):
+        if ranges and frame == ranges[-1][1] + 1:
+            ranges[-1][1] = frame
+        else:
+            ranges.append([frame, frame])
+    return [tuple(frame_range) for frame_range in ranges]
+
+
+def diff_playblasts(old, new, frame_start=1, ffmpeg=None, pixel_threshold=PIXEL_THRESHOLD,
+                    frame_threshold=FRAME_THRESHOLD, memory_budget=MEMORY_BUDGET):
+    """Compares the new playblast with the old one. Returns the report: the changed frame ranges
+    (numbered from frame_start) and the changed fraction of every frame."""
+    if importlib.util.find_spec("numpy") is None:
+        raise DiffError("Comparing playblasts needs NumPy")
+    ffmpeg = ffmpeg or encoders.find_ffmpeg()
+    if ffmpeg is None:
+        raise DiffError("ffmpeg not found (put it on the PATH or set HNS_FFMPEG)")
+
+    size = read_size(new)
+    old_size = read_size(old)
+    if tuple(old_size) != tuple(size):
+        raise DiffError("Can't compare playblasts of different sizes (%dx%d before, %dx%d now)" % (
+            old_size[0], old_size[1], size[0], size[1]))
+
+    chunk = get_chunk_size(size, memory_budget)
+    readers = [FrameReader(ffmpeg, old, size, chunk), FrameReader(ffmpeg, new, size, chunk)]
+    try:
+        changed, mean, old_frames, new_frames = compare_frames(readers[0], readers[1], pixel_threshold)
+    finally:
+        errors = [reader.close() for reader in readers]
+    if not new_frames or not old_frames:
+        raise DiffError("Couldn't decode the playblasts: " + "; ".join(error for error in errors if error))
+
+    changed_frames = [frame_start + i for i, fraction in enumerate(changed) if fraction > frame_threshold]
+    # frames only the new playblast has are all new
+    changed_frames += range(frame_start + len(changed), frame_start + new_frames)
+    return {
+        "old": old,
+        "new": new,
+        "size": list(size),
+        "frame_start": frame_start,
+        "old_frames": old_frames,
+        "new_frames": new_frames,
+        "changed": [list(frame_range) for frame_range in frame_ranges(changed_frames)],
+        "changed_frames": len(changed_frames),
+        "frames": [{"frame": frame_start + i, "changed": round(fraction, 6), "mean": round(mean[i], 6)}
+                   for i, fraction in enumerate(changed)],
+    }
+
+
+def format_report(report):
+    name = os.path.basename(report["new"].rstrip(os.sep))
+    if not report["changed"]:
+        return "%s: no frames changed" % name
+    ranges = ", ".join("%d" % first if first == last else "%d-%d" % (first, last)
+                       for first, last in report["changed"])
+    text = "%s: %d/%d frames changed (%s)" % (name, report["changed_frames"], report["new_frames"], ranges)
+    if report["old_frames"] != report["new_frames"]:
+        text += ", it was %d frames long before" % report["old_frames"]
+    return text
+
+
+def write_changes_clip(report, output, fps, ffmpeg=None, handles=HANDLES):
+    """Encodes just the changed frames of the new playblast (with handles) into the output"""
+    ffmpeg = ffmpeg or encoders.find_ffmpeg()
+    frame_start = report["frame_start"]
+    last = report["new_frames"] - 1
+    ranges = []
+    for first, end in report["changed"]:
+        first = max(first - frame_start - handles, 0)
+        end = min(end - frame_start + handles, last)
+        if ranges and first <= ranges[-1][1] + 1:
+            ranges[-1][1] = max(ranges[-1][1], end)
+        else:
+            ranges.append([first, end])
+
+    select = "+".join("between(n,%d,%d)" % (first, end) for first, end in ranges)
+    inputs = get_inputs(report["new"])
+    if os.path.isdir(report["new"]):
+        inputs = ["-framerate", "%.6f" % fps] + inputs
+    subprocess.run([ffmpeg, "-y", "-loglevel", "error"] + inputs +
+                   ["-vf", "select='%s',setpts=N/(%.6f*TB)" % (select, fps), "-an"] +
+                   encoders.PROFILES['H264'].ffmpeg_args + ["-r", "%.6f" % fps, output], check=True)
+
+
+def write_report(report, output, fps, ffmpeg=None):
+    """Writes the report and the changes clip next to the new playblast (output), returns the report"""
+    with open(get_report_path(output), 'w') as f:
+        json.dump(report, f, indent=1)
+
+    changes = get_changes_path(output)
+    remove(changes)
+    if report["changed"]:
+        try:
+            write_changes_clip(report, changes, fps, ffmpeg)
+        except subprocess.CalledProcessError as e:
+            raise DiffError("Couldn't write the changes clip: %s" % e)
+    return report
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(prog="python -m hns_production_addon.playdiff",
+        description="Lists the frames that changed between two playblasts and writes a clip of just those")
+    parser.add_argument("old", help="the previous playblast (a movie or image sequence folder)")
+    parser.add_argument("new", help="the new playblast")
+    parser.add_argument("--frame-start", type=int, default=1, help="first frame number of the playblasts")
+    parser.add_argument("--threshold", type=float, default=FRAME_THRESHOLD,
+        help="fraction of a frame's pixels that have to change (default: %g)" % FRAME_THRESHOLD)
+    parser.add_argument("--memory", type=int, default=MEMORY_BUDGET, help="MB of frames to compare at once")
+    parser.add_argument("--no-clip", action="store_true", help="only print the changed frames")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        report = diff_playblasts(args.old, args.new, args.frame_start, frame_threshold=args.threshold,
+                                 memory_budget=args.memory)
+        seconds = time.perf_counter() - start
+        if not args.no_clip:
+            fps = movfile.read_info(args.new)["fps"] if os.path.isfile(args.new) else 24
+            write_report(report, args.new, float(fps or 24))
+    except DiffError as e:
+        print(e)
+        return 1
+    print("%s (compared in %.1fs)" % (format_report(report), seconds))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
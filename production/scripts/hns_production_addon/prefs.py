@@ -0,0 +1,195 @@
+# The addon preferences (the playblast options), and plain copies of them for batch
+# playblasts and for when the addon isn't enabled.
+
+import bpy
+
+from types import SimpleNamespace
+
+from . import encoders
+
+
+ADDON_NAME = __package__
+
+# Returns the closest scale % (rounding up) that doesn't give odd video dimensions
+# (a height or width that isn't divisible by 2 causes errors when exporting).
+def even_scale(scale):
+    while (scale * 1920 / 100) % 2 != 0 or (scale * 1080 / 100) % 2 != 0:
+        scale += 1
+    return scale
+
+
+class PlayblastPreferences(bpy.types.AddonPreferences):
+    bl_idname = ADDON_NAME
+    
+    # Prevents setting the scale to values that would cause the video height or width to be odd numbers
+    def scale_update(self, context):
+        scale = even_scale(self.playblast_scale)
+        if scale != self.playblast_scale:
+            self.playblast_scale = scale
+    
+    playblast_scale: bpy.props.IntProperty(
+        name="Playblast scale %",
+        subtype='PERCENTAGE',
+        default=50,
+        min=5,
+        max=100,
+        update=scale_update
+    )
+    
+    playblast_shade_solid: bpy.props.BoolProperty(
+        name="Use solid shading",
+        default=False
+    )
+    
+    playblast_show_frames: bpy.props.BoolProperty(
+        name="Show frame numbers",
+        default=False
+    )
+    
+    playblast_timings: bpy.props.BoolProperty(
+        name="Record timings",
+        description="Write per-frame timings (evaluation, drawing, writing, memory) next to the playblast",
+        default=False
+    )
+    
+    playblast_fast: bpy.props.BoolProperty(
+        name="Fast playblast",
+        description="Simplify the scene while playblasting (everything is restored afterwards)",
+        default=False
+    )
+    
+    playblast_fast_subdivision: bpy.props.IntProperty(
+        name="Max subdivision",
+        description="Highest subdivision level used while playblasting",
+        default=0,
+        min=0,
+        max=6
+    )
+    
+    playblast_fast_child_particles: bpy.props.FloatProperty(
+        name="Child particles",
+        description="Fraction of child particles (hair etc.) shown while playblasting",
+        subtype='FACTOR',
+        default=0.1,
+        min=0.0,
+        max=1.0
+    )
+    
+    playblast_fast_texture_limit: bpy.props.EnumProperty(
+        name="Texture limit",
+        description="Largest texture size used by Material preview while playblasting",
+        items=(('CLAMP_OFF', "Off", ""), ('CLAMP_2048', "2048", ""), ('CLAMP_1024', "1024", ""),
+               ('CLAMP_512', "512", ""), ('CLAMP_256', "256", ""), ('CLAMP_128', "128", "")),
+        default='CLAMP_512'
+    )
+    
+    playblast_fast_modifiers: bpy.props.BoolProperty(
+        name="Disable heavy modifiers on linked assets",
+        description="Hide bevel, boolean, remesh, smoothing etc. modifiers on objects from linked_assets",
+        default=True
+    )
+    
+    playblast_encoder: bpy.props.EnumProperty(
+        name="Encoder",
+        description="How the playblast is encoded (see encoders.py)",
+        items=[(name, profile.label, profile.description) for name, profile in encoders.PROFILES.items()],
+        default='H264'
+    )
+    
+    playblast_stream: bpy.props.BoolProperty(
+        name="Encode with ffmpeg",
+        description="Stream the frames to a separate ffmpeg process (on the PATH or set in HNS_FFMPEG) "
+                    "that encodes them while the next ones are drawn",
+        default=False
+    )
+    
+    playblast_diff: bpy.props.BoolProperty(
+        name="Compare with the previous playblast",
+        description="List the frames that changed since the last playblast and make a clip of just those "
+                    "(needs ffmpeg)",
+        default=False
+    )
+    
+    playblast_texture_proxies: bpy.props.BoolProperty(
+        name="Use texture proxies",
+        description="Draw smaller copies of the image textures, made with ffmpeg and kept in "
+                    "production/.texture_proxies (see proxies.py)",
+        default=False
+    )
+    
+    def draw(self, context):
+        layout = self.layout
+
+        box = layout.box()
+        box.label(text="Playblast options:")
+        
+        row = box.row()
+        row.label(text="Scale (default: 50%)")
+        row.prop(self, "playblast_scale", text="")
+        
+        row = box.row()
+        row.prop(self, 'playblast_shade_solid', text="Use solid shading (less pretty but faster)")
+        
+        row = box.row()
+        row.prop(self, 'playblast_show_frames')
+        
+        row = box.row()
+        row.prop(self, 'playblast_timings')
+        
+        row = box.row()
+        row.prop(self, 'playblast_encoder')
+        row = box.row()
+        row.active = encoders.PROFILES[self.playblast_encoder].ffmpeg_args is not None
+        row.prop(self, 'playblast_stream')
+        
+        row = box.row()
+        row.prop(self, 'playblast_diff')
+        
+        row = box.row()
+        row.prop(self, 'playblast_texture_proxies')
+        
+        row = box.row()
+        row.prop(self, 'playblast_fast')
+        col = box.column()
+        col.active = self.playblast_fast
+        col.prop(self, 'playblast_fast_subdivision')
+        col.prop(self, 'playblast_fast_child_particles')
+        col.prop(self, 'playblast_fast_texture_limit')
+        col.prop(self, 'playblast_fast_modifiers')
+        
+    
+
+
+# Playblast options when the addon isn't enabled (e.g. in a batch worker),
+# named after the PlayblastPreferences properties
+PLAYBLAST_DEFAULTS = {
+    "playblast_scale": 50,
+    "playblast_shade_solid": False,
+    "playblast_show_frames": False,
+    "playblast_timings": False,
+    "playblast_fast": False,
+    "playblast_fast_subdivision": 0,
+    "playblast_fast_child_particles": 0.1,
+    "playblast_fast_texture_limit": 'CLAMP_512',
+    "playblast_fast_modifiers": True,
+    "playblast_encoder": 'H264',
+    "playblast_stream": False,
+    "playblast_diff": False,
+    "playblast_texture_proxies": False,
+}
+
+
+def default_playblast_prefs():
+    return SimpleNamespace(**PLAYBLAST_DEFAULTS)
+
+
+# Plain copy of the playblast options, e.g. to override some of them for a batch
+def copy_playblast_prefs(prefs):
+    return SimpleNamespace(**{name: getattr(prefs, name) for name in PLAYBLAST_DEFAULTS})
+
+
+def get_playblast_prefs(context):
+    addon = context.preferences.addons.get(ADDON_NAME)
+    if addon is None:
+        return default_playblast_prefs()
+    return addon.preferences
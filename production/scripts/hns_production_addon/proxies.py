@@ -0,0 +1,421 @@
+# Texture proxies: smaller copies of the image textures for playblasts, which can't show more
+# texture detail than their own resolution anyway, so they load and draw 1024px images instead
+# of the 2K and 4K ones the renders need.
+#
+# Each image gets a chain of proxies made in one ffmpeg run (the longest side halved down to
+# 256px, like mipmaps), kept in production/.texture_proxies and named after a hash of the
+# image's contents, so they're only made again when the image changes. The index there keeps
+# the hash with each file's modification time and size, so unchanged files aren't read again.
+#
+# Linked data is read-only in Blender, so images in linked libraries can't be pointed at their
+# proxies from the shot. Instead each library gets a copy (next to the proxies) with its image
+# paths changed to the proxies and its own libraries to their copies (see blendfile.write_copy()),
+# and background and batch playblasts relocate the shot's libraries to the copies while they
+# run (see use_texture_proxies() in playblast.py).
+#
+# Doesn't import bpy, so the proxies can be made (and what they save listed) beforehand:
+#   python -m hns_production_addon.proxies production/3D_assets/environments/forest_env_linked.blend
+
+import hashlib
+import json
+import os
+import struct
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from . import blendfile, depgraph, encoders
+
+
+PROXY_DIR_NAME = ".texture_proxies"
+INDEX_NAME = "index.json"
+SMALLEST_PROXY = 256
+
+# Proxies are saved in the format of their image (for the alpha and the compression):
+# format -> (extension, ffmpeg output options)
+PROXY_FORMATS = {
+    "png": (".png", []),
+    "jpeg": (".jpg", ["-q:v", "2"]),
+}
+
+
+class ProxyError(Exception):
+    pass
+
+
+def read_jpeg_size(f):
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xff:
+            return None
+        code = marker[1]
+        if code == 0xff:
+            # padding
+            f.seek(-1, os.SEEK_CUR)
+            continue
+        if code == 0x01 or 0xd0 <= code <= 0xd7:
+            # markers without a length
+            continue
+        length = struct.unpack(">H", f.read(2))[0]
+        # the start of frame markers (0xc4, 0xc8 and 0xcc are something else)
+        if 0xc0 <= code <= 0xcf and code not in (0xc4, 0xc8, 0xcc):
+            height, width = struct.unpack(">xHH", f.read(5))
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def read_image_header(path):
+    """(format, width, height) of a PNG or JPEG file (whatever its extension says),
+    None for other formats"""
+    with open(path, 'rb') as f:
+        header = f.read(24)
+        if header[:8] == b"\x89PNG\r\n\x1a\n" and header[12:16] == b"IHDR":
+            return ("png",) + struct.unpack(">II", header[16:24])
+        if header[:2] == b"\xff\xd8":
+            f.seek(2)
+            size = read_jpeg_size(f)
+            return ("jpeg",) + size if size else None
+    return None
+
+
+def proxy_levels(width, height):
+    """Longest sides of an image's proxies: the powers of two below its own, largest first"""
+    levels = []
+    level = SMALLEST_PROXY
+    while level < max(width, height):
+        levels.insert(0, level)
+        level *= 2
+    return levels
+
+
+def proxy_dimensions(width, height, level):
+    scale = level / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+# The smallest proxy that's still at least the given size, None if that's the image itself
+def pick_level(levels, size):
+    fitting = [level for level in levels if level >= size]
+    return min(fitting) if fitting else None
+
+
+def texture_size(scale, texture_limit=None):
+    """The longest texture side worth loading for a playblast at scale %: its width rounded up
+    to a power of two (a texture can't show more pixels than the frame has), or the texture
+    limit if that's smaller"""
+    width = 1920 * scale / 100
+    size = SMALLEST_PROXY
+    while size < width:
+        size *= 2
+    return min(size, texture_limit) if texture_limit else size
+
+
+# Decoded size of an 8 bit image (Blender keeps them as RGBA)
+def image_memory(width, height):
+    return width * height * 4
+
+
+class ProxyCache:
+    """The proxies and library copies of a production folder, and the index of the files
+    they were made from. Paths in the index are relative to the production folder."""
+
+    def __init__(self, root, ffmpeg=None):
+        self.root = os.path.abspath(root)
+        self.folder = os.path.join(self.root, PROXY_DIR_NAME)
+        self.path = os.path.join(self.folder, INDEX_NAME)
+        self.ffmpeg = ffmpeg or encoders.find_ffmpeg()
+        # relative path -> {"mtime", "size", "hash"}, plus "format", "width" and "height" for images
+        # and {texture size: copy file name} in "copies" for libraries
+        self.files = {}
+        self.changed = False
+        self.copies = {}  # (library, texture size) -> copy path or None, worked out in this session
+
+        try:
+            with open(self.path) as f:
+                self.files = json.load(f)["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def relpath(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, "/")
+
+    def save(self):
+        if not self.changed:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        # write then rename so an interrupted save doesn't leave half an index
+        temp = "%s.%d.tmp" % (self.path, os.getpid())
+        with open(temp, 'w') as f:
+            json.dump({"files": self.files}, f, indent=1, sort_keys=True)
+        os.replace(temp, self.path)
+        self.changed = False
+
+    def file_info(self, path):
+        """The index entry of a file, hashed again if it changed since it was indexed (and
+        then what was made from the old version is deleted)"""
+        stat = os.stat(path)
+        key = self.relpath(path)
+        entry = self.files.get(key)
+        if entry and (entry["mtime"], entry["size"]) == (stat.st_mtime, stat.st_size):
+            return entry
+
+        hasher = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                hasher.update(chunk)
+        if entry and entry["hash"] != hasher.hexdigest():
+            self.remove_outputs(key, entry)
+
+        entry = {"mtime": stat.st_mtime, "size": stat.st_size, "hash": hasher.hexdigest()}
+        self.files[key] = entry
+        self.changed = True
+        return entry
+
+    def remove_outputs(self, key, entry):
+        outputs = list(entry.get("copies", {}).values())
+        # proxies are shared by images with the same contents
+        if entry.get("format") and not any(other["hash"] == entry["hash"] for other_key, other in self.files.items()
+                                           if other_key != key):
+            outputs += [os.path.basename(self.proxy_path(entry, level))
+                        for level in proxy_levels(entry["width"], entry["height"])]
+        for name in outputs:
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except OSError:
+                pass
+
+    def image_info(self, path):
+        entry = self.file_info(path)
+        if "format" not in entry:
+            entry["format"], entry["width"], entry["height"] = read_image_header(path) or (None, 0, 0)
+        return entry
+
+    def proxy_path(self, entry, level):
+        return os.path.join(self.folder, "%s_%d%s" % (entry["hash"][:16], level, PROXY_FORMATS[entry["format"]][0]))
+
+    def make_proxies(self, source, entry):
+        """Makes the missing proxies of an image, all with one ffmpeg run"""
+        levels = [level for level in proxy_levels(entry["width"], entry["height"])
+                  if not os.path.exists(self.proxy_path(entry, level))]
+        if not levels:
+            return
+        if self.ffmpeg is None:
+            raise ProxyError("ffmpeg not found (put it on the PATH or set HNS_FFMPEG)")
+        os.makedirs(self.folder, exist_ok=True)
+
+        extension, options = PROXY_FORMATS[entry["format"]]
+        graph = "[0:v]split=%d%s" % (len(levels), "".join("[s%d]" % i for i in range(len(levels))))
+        outputs = []
+        partials = []
+        for i, level in enumerate(levels):
+            graph += ";[s%d]scale=%d:%d:flags=area[o%d]" % ((i,) + proxy_dimensions(entry["width"], entry["height"],
+                                                                                    level) + (i,))
+            # other processes (e.g. batch workers) may be making the same proxy
+            partials.append("%s.%d.partial%s" % (self.proxy_path(entry, level)[:-len(extension)], os.getpid(),
+                                                 extension))
+            outputs += ["-map", "[o%d]" % i, "-frames:v", "1", "-update", "1"] + options + [partials[-1]]
+
+        try:
+            result = subprocess.run([self.ffmpeg, "-y", "-loglevel", "error", "-i", source, "-filter_complex", graph]
+                                    + outputs, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    universal_newlines=True)
+            if result.returncode != 0:
+                raise ProxyError("ffmpeg failed on %s: %s" % (source, result.stdout.strip()[-2000:]))
+            for partial, level in zip(partials, levels):
+                os.replace(partial, self.proxy_path(entry, level))
+        finally:
+            for partial in partials:
+                if os.path.exists(partial):
+                    os.remove(partial)
+
+    def get_proxy(self, source, size):
+        """Path of the proxy of an image for textures of the given size, made if it's missing.
+        None if the image is small enough already, missing, or not a PNG or JPEG."""
+        if not os.path.isfile(source):
+            return None
+        entry = self.image_info(source)
+        if entry["format"] is None:
+            return None
+        level = pick_level(proxy_levels(entry["width"], entry["height"]), size)
+        if level is None:
+            return None
+
+        proxy = self.proxy_path(entry, level)
+        if not os.path.exists(proxy):
+            self.make_proxies(source, entry)
+        return proxy
+
+    def get_library_copy(self, library, size, linked_by=()):
+        """Path of a copy of a library with its images pointing at their proxies and its libraries
+        at their copies, made if it's missing. None if there's nothing in it to change."""
+        key = (library, size)
+        if key in self.copies:
+            return self.copies[key]
+        if library in linked_by or not os.path.isfile(library):
+            return None
+        info = blendfile.read_info(library)
+
+        remapped = {}  # path as stored in the library -> new path
+        for image in info["images"]:
+            proxy = self.get_proxy(blendfile.abspath(image, library), size)
+            if proxy:
+                remapped[image] = proxy
+        for path in info["libraries"]:
+            copy = self.get_library_copy(blendfile.abspath(path, library), size, linked_by + (library,))
+            if copy:
+                remapped[path] = copy
+
+        copy = None
+        if remapped:
+            entry = self.file_info(library)
+            hasher = hashlib.sha1(entry["hash"].encode())
+            hasher.update(repr(sorted(remapped.items())).encode())
+            name = "%s_%d_%s.blend" % (os.path.splitext(os.path.basename(library))[0], size, hasher.hexdigest()[:16])
+            copy = os.path.join(self.folder, name)
+
+            if not os.path.exists(copy):
+                os.makedirs(self.folder, exist_ok=True)
+                # the copy isn't next to the library, so the relative paths it keeps are made absolute
+                blendfile.write_copy(library, copy, lambda path: remapped.get(path) or (
+                    blendfile.abspath(path, library) if path.startswith("//") else None))
+
+            copies = entry.setdefault("copies", {})
+            old = copies.get(str(size))
+            if old != name:
+                if old and os.path.exists(os.path.join(self.folder, old)):
+                    os.remove(os.path.join(self.folder, old))
+                copies[str(size)] = name
+                self.changed = True
+
+        self.copies[key] = copy
+        return copy
+
+    def prepare(self, paths, size, jobs=1):
+        """Makes the proxies and library copies that the .blend files (and the libraries they
+        link) need for textures of the given size. Returns a result per image:
+        {"path", "file" (the first .blend file using it), "width", "height", "proxy", "proxy_size", "error"}"""
+        paths = [os.path.abspath(path) for path in paths]
+        files = find_files(paths)
+        images = find_images(files)
+
+        def make(image):
+            result = {"path": image, "file": images[image], "width": None, "height": None, "proxy": None,
+                      "proxy_size": None, "error": None}
+            try:
+                result["proxy"] = self.get_proxy(image, size)
+                if os.path.isfile(image):
+                    entry = self.image_info(image)
+                    result["width"], result["height"] = entry["width"], entry["height"]
+                if result["proxy"]:
+                    level = pick_level(proxy_levels(entry["width"], entry["height"]), size)
+                    result["proxy_size"] = proxy_dimensions(entry["width"], entry["height"], level)
+            except (OSError, ProxyError) as e:
+                result["error"] = str(e)
+            return result
+
+        # the time goes into the ffmpeg processes, so threads are enough
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+            results = list(pool.map(make, images))
+
+        for library in files[len(paths):]:
+            try:
+                self.get_library_copy(library, size)
+            except (OSError, ProxyError, blendfile.BlendFileError) as e:
+                print("Couldn't copy %s: %s" % (library, e))
+        self.save()
+        return results
+
+
+# The .blend files and the libraries they link (the ones that exist), the given files first
+def find_files(paths):
+    files = list(paths)
+    for path in paths:
+        files += [library for library in blendfile.library_paths(path, recursive=True)
+                  if library not in files and os.path.isfile(library)]
+    return files
+
+
+def find_images(files):
+    """{image path: the first .blend file using it} for the images in the files"""
+    images = {}
+    for file in files:
+        for image in blendfile.read_info(file)["images"]:
+            images.setdefault(blendfile.abspath(image, file), file)
+    return images
+
+
+def load_cache(path, root=None):
+    """The proxy cache of the production folder the file belongs to"""
+    root = root or depgraph.find_production_root(path)
+    if root is None:
+        raise ValueError("%s isn't in a production folder (with shots/ and 3D_assets/)" % path)
+    return ProxyCache(root)
+
+
+def format_size(size):
+    return "%.1fMB" % (size / 1e6)
+
+
+def format_report(results, size):
+    lines = ["Textures for %dpx:" % size]
+    full = proxied = 0
+    for result in sorted(results, key=lambda result: result["path"]):
+        name = os.path.relpath(result["path"])
+        if result["error"]:
+            lines.append("  %s: %s" % (name, result["error"]))
+            continue
+        if result["width"] is None:
+            lines.append("  %s: missing (used by %s)" % (name, os.path.relpath(result["file"])))
+            continue
+        if not result["width"]:
+            lines.append("  %s: not a PNG or JPEG, no proxy" % name)
+            continue
+
+        width, height = result["width"], result["height"]
+        memory = image_memory(width, height)
+        full += memory
+        if result["proxy"] is None:
+            proxied += memory
+            lines.append("  %s: %dx%d %s, small enough" % (name, width, height, format_size(memory)))
+            continue
+        proxy_width, proxy_height = result["proxy_size"]
+        proxied += image_memory(proxy_width, proxy_height)
+        lines.append("  %s: %dx%d %s -> %dx%d %s" % (name, width, height, format_size(memory), proxy_width,
+                                                     proxy_height, format_size(image_memory(proxy_width, proxy_height))))
+
+    lines.append("%d images, %s decoded -> %s with proxies (%s saved)" % (len(results), format_size(full),
+        format_size(proxied), format_size(full - proxied)))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(prog="python -m hns_production_addon.proxies",
+        description="Makes the texture proxies (and library copies) that playblasts of .blend files use, "
+                    "and lists the memory they save")
+    parser.add_argument("paths", nargs="+", metavar="PATH", help=".blend files or folders to search")
+    parser.add_argument("--scale", type=int, default=50, help="playblast scale %% (default: 50)")
+    parser.add_argument("--texture-limit", type=int, help="texture limit of fast playblasts, in pixels")
+    parser.add_argument("--root", help="production folder (default: found from the first path)")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count(), help="ffmpeg processes")
+    args = parser.parse_args(argv)
+
+    paths = list(blendfile.find_blend_files(args.paths))
+    if not paths:
+        parser.error("no .blend files found")
+    size = texture_size(args.scale, args.texture_limit)
+
+    start = time.perf_counter()
+    try:
+        results = load_cache(paths[0], args.root).prepare(paths, size, args.jobs or 1)
+    except (OSError, ValueError, blendfile.BlendFileError) as e:
+        print(e)
+        return 1
+    print(format_report(results, size))
+    print("Done in %.2fs" % (time.perf_counter() - start))
+    return 1 if any(result["error"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
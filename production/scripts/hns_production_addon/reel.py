@@ -0,0 +1,126 @@
+# Review reels: a sequence's shot playblasts joined into one movie, <sequence>_reel.mp4 in the
+# sequence folder. The playblasts are checked to have the same codec, size and frame rate
+# (see movfile.py) and joined with ffmpeg's concat demuxer by copying the streams, so
+# nothing is decoded or encoded and a reel takes seconds.
+#
+# Playblasting the stale/missing shots first needs Blender (see --reel in cli.py), this
+# only joins the playblasts that are there:
+#   python -m hns_production_addon.reel production/shots/3_present
+
+import os
+import subprocess
+import tempfile
+
+from . import encoders, movfile
+
+
+class ReelError(Exception):
+    pass
+
+
+def get_reel_path(sequence_dir, extension=".mp4"):
+    sequence_dir = os.path.abspath(sequence_dir)
+    return os.path.join(sequence_dir, os.path.basename(sequence_dir) + "_reel" + extension)
+
+
+# What has to match for the streams to be joined as they are
+def stream_format(info):
+    return (info["codec"], info["width"], info["height"], info["fps"], info["audio"])
+
+
+def check_playblasts(paths):
+    """Reads every playblast, raises ReelError listing the ones that are missing or
+    don't match the first one. Returns their infos."""
+    infos = []
+    problems = []
+    for path in paths:
+        try:
+            infos.append(movfile.read_info(path))
+        except OSError:
+            problems.append("%s is missing" % os.path.basename(path))
+        except movfile.MovieFileError as e:
+            problems.append(str(e))
+
+    for info in infos[1:]:
+        if stream_format(info) != stream_format(infos[0]):
+            problems.append("%s is %s %dx%d at %s fps, %s is %s %dx%d at %s fps" % (
+                os.path.basename(info["path"]), info["codec"], info["width"], info["height"], info["fps"],
+                os.path.basename(infos[0]["path"]), infos[0]["codec"], infos[0]["width"], infos[0]["height"],
+                infos[0]["fps"]))
+
+    if problems:
+        raise ReelError("Can't join the playblasts without re-encoding:\n  " + "\n  ".join(problems))
+    return infos
+
+
+def make_reel(paths, output, ffmpeg=None):
+    """Joins the playblasts (in the given order) into the output. Returns their infos."""
+    if not paths:
+        raise ReelError("No playblasts to join")
+    infos = check_playblasts(paths)
+
+    ffmpeg = ffmpeg or encoders.find_ffmpeg()
+    if ffmpeg is None:
+        raise ReelError("ffmpeg not found (put it on the PATH or set HNS_FFMPEG)")
+
+    # the concat demuxer reads the inputs from a list file
+    folder = os.path.dirname(os.path.abspath(output))
+    with tempfile.NamedTemporaryFile('w', suffix=".txt", dir=folder, delete=False) as f:
+        for path in paths:
+            f.write("file '%s'\n" % os.path.abspath(path).replace("'", "'\\''"))
+        list_path = f.name
+
+    # written next to the reel and renamed, so an old reel is only replaced by a finished one
+    root, extension = os.path.splitext(output)
+    partial = root + ".partial" + extension
+    try:
+        result = subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                                 "-i", list_path, "-c", "copy", "-movflags", "+faststart", partial],
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+        if result.returncode != 0:
+            raise ReelError("ffmpeg failed: " + result.stdout.strip()[-2000:])
+        os.replace(partial, output)
+    finally:
+        os.remove(list_path)
+        if os.path.exists(partial):
+            os.remove(partial)
+    return infos
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(prog="python -m hns_production_addon.reel",
+        description="Joins the shot playblasts of sequence folders into <sequence>_reel.mp4 without re-encoding "
+                    "(stale or missing playblasts aren't redone, use the addon's --reel in Blender for that)")
+    parser.add_argument("folders", nargs="+", metavar="FOLDER", help="sequence folders")
+    parser.add_argument("--extension", default=".mp4", help="playblast extension (default: .mp4)")
+    parser.add_argument("--check", action="store_true", help="only check that the playblasts can be joined")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for folder in args.folders:
+        shots = sorted(f[:-len(".blend")] for f in os.listdir(folder) if f.endswith(".blend"))
+        paths = [os.path.join(folder, shot + "_playblast" + args.extension) for shot in shots]
+        output = get_reel_path(folder, args.extension)
+
+        start = time.perf_counter()
+        try:
+            if args.check:
+                infos = check_playblasts(paths)
+            else:
+                infos = make_reel(paths, output)
+        except ReelError as e:
+            print("%s: %s" % (folder, e))
+            failed = True
+            continue
+
+        frames = sum(info["frames"] for info in infos)
+        print("%s: %d shots, %d frames (%.1fs)%s" % (os.path.relpath(output) if not args.check else folder,
+            len(infos), frames, time.perf_counter() - start, " can be joined" if args.check else ""))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,555 @@
+# The character rig panels (only registered when Blender has a UI, see addon.py)
+
+import bpy
+
+import time
+from types import SimpleNamespace
+
+from . import rigs
+
+
+#####################       Rig Panels       #####################
+
+# The panels draw from rigs.resolve(), which finds the controls' pose bones once per armature.
+# A missing control is drawn as a greyed out warning instead of raising a KeyError.
+def draw_rig_control(layout, resolved, bone, prop, text=""):
+    if resolved.has(bone, prop):
+        layout.prop(resolved.bone(bone), '["%s"]' % prop, text=text)
+    else:
+        row = layout.row()
+        row.enabled = False
+        row.label(text=text or bone, icon='ERROR')
+
+
+def draw_missing_controls(layout, resolved):
+    if not resolved.missing:
+        return
+    box = layout.box()
+    box.label(text="Missing rig controls:", icon='ERROR')
+    for control in resolved.missing:
+        box.label(text=control)
+
+
+# layout: bpy.types.UILayout object to add the button to
+# ik_fk: 'IK' or 'FK' (mode the button will switch to)
+# bone: name of the bone with the FK/IK switch property
+def add_fk_ik_button(layout, resolved, ik_fk, bone):
+    switch_property = resolved.descriptor.switch_property
+    if not resolved.has(bone, switch_property):
+        layout = layout.row(align=True)
+        layout.enabled = False
+    op = layout.operator("armature.fk_ik_switch", text=ik_fk)
+    op.switch_name = switch_property
+    op.switch_bone = bone
+    op.mode = ik_fk
+
+
+# Buttons that bake each limb to FK or IK over a frame range (in a subpanel that's closed by
+# default, so the switch panels redraw as fast as before)
+def draw_fk_ik_bake(layout, resolved):
+    switch_property = resolved.descriptor.switch_property
+    
+    for limb in resolved.descriptor.limbs.values():
+        row = layout.row(align=True)
+        row.enabled = limb.switch in resolved.complete_limbs
+        row.label(text=limb.name)
+        for mode in ('FK', 'IK'):
+            op = row.operator("armature.fk_ik_switch", text="To " + mode)
+            op.switch_name = switch_property
+            op.switch_bone = limb.switch
+            op.mode = mode
+            op.bake = True
+
+
+# Clears the cached rig controls when bones could have been added, renamed or freed
+@bpy.app.handlers.persistent
+def clear_rig_cache(*args):
+    rigs.clear_cache()
+
+
+@bpy.app.handlers.persistent
+def clear_rig_cache_on_edit(scene, depsgraph=None):
+    # posing only updates the rig object's geometry and its armature. Switching it in and out
+    # of edit mode (where bones are added, renamed and freed) updates the object's transform too,
+    # adding and deleting objects or swapping an object's data update the scene.
+    if depsgraph is None:
+        return
+    for update in depsgraph.updates:
+        if isinstance(update.id, bpy.types.Scene) or (isinstance(update.id, bpy.types.Object)
+                                                      and update.is_updated_transform):
+            rigs.clear_cache()
+            return
+
+
+RIG_CACHE_HANDLERS = ("load_post", "undo_post", "redo_post")
+
+
+### Pebble ###
+
+class DATA_PT_pebble_rig(bpy.types.Panel):
+    """Creates a Rig Options panel in the armature tab of the properties editor"""
+    
+    bl_label = "Rig Options: Pebble"
+    bl_idname = "DATA_PT_pebble_rig"
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    bl_context = "data"
+    
+    @classmethod
+    def poll(cls, context):
+        return(context.active_object.type == 'ARMATURE'
+            and context.active_object.name.startswith("Pebble_proxy"))
+
+    def draw(self, context):
+        layout = self.layout
+
+
+class DATA_PT_pebble_rig_switches(bpy.types.Panel):
+    """Creates a subpanel of the the Rig Options panel"""
+    
+    bl_label = "Switch Controls"
+    bl_idname = "DATA_PT_pebble_rig_switches"
+    bl_parent_id = "DATA_PT_pebble_rig"
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    
+    def draw(self, context):
+        layout = self.layout        
+        controls = rigs.resolve(context.active_object, rigs.PEBBLE)
+        
+        draw_missing_controls(layout, controls)
+ 
+        # IK/FK switches
+        split = layout.split(factor=.15)
+
+        col = split.column()
+        col.label(text="FK/IK")
+        col.label(text="Arm:")
+        col.label(text="Leg:")
+        
+        col = split.column()
+        col.label(text="Left:")
+        
+        row = col.row(align=True)
+        add_fk_ik_button(row, controls, 'FK', "left_arm_IK_switch")
+        add_fk_ik_button(row, controls, 'IK', "left_arm_IK_switch")
+        
+        row = col.row(align=True)
+        add_fk_ik_button(row, controls, 'FK', "left_leg_IK_switch")
+        add_fk_ik_button(row, controls, 'IK', "left_leg_IK_switch")
+ 
+        col = split.column()
+        col.label(text="Right:")
+        
+        row = col.row(align=True)
+        add_fk_ik_button(row, controls, 'FK', "right_arm_IK_switch")
+        add_fk_ik_button(row, controls, 'IK', "right_arm_IK_switch")
+        
+        row = col.row(align=True)
+        add_fk_ik_button(row, controls, 'FK', "right_leg_IK_switch")
+        add_fk_ik_button(row, controls, 'IK', "right_leg_IK_switch")
+        
+        layout.separator()
+        
+        
+class DATA_PT_pebble_rig_bake(bpy.types.Panel):
+    """Creates a subpanel of the the Rig Options panel"""
+    
+    bl_label = "Bake FK/IK"
+    bl_idname = "DATA_PT_pebble_rig_bake"
+    bl_parent_id = "DATA_PT_pebble_rig"
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    bl_options = {'DEFAULT_CLOSED'}
+    
+    def draw(self, context):
+        draw_fk_ik_bake(self.layout, rigs.resolve(context.active_object, rigs.PEBBLE))
+        
+                
+class DATA_PT_pebble_rig_select(bpy.types.Panel):
+    """Creates a subpanel of the the Rig Options panel"""
+    
+    bl_label = "Selection/Keying"
+    bl_idname = "DATA_PT_pebble_rig_select"
+    bl_parent_id = "DATA_PT_pebble_rig"
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    
+    def draw(self, context):
+        layout = self.layout        
+        rig = context.active_object
+        
+        op = layout.operator("armature.key_whole_character", text="Key All Anims")
+        op = layout.operator("pose.transforms_clear", text="Reset Selected Anims")
+
+        layout.label(text="Select Anims:")
+        
+        # doesn't select hidden anims
+        op = layout.operator("pose.select_all_anims", text="All (Visible) Anims")
+        
+        
+### Twig ###
+
+class DATA_PT_twig_rig(bpy.types.Panel):
+    """Creates a Rig Options panel in the armature tab of the properties editor"""
+    
+    bl_label = "Rig Options: Twig"
+    bl_idname = "DATA_PT_twig_rig"
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    bl_context = "data"
+    
+    @classmethod
+    def poll(cls, context):
+        return(context.active_object.type == 'ARMATURE'
+            and context.active_object.name.startswith("Twig_proxy"))
+
+    def draw(self, context):
+        layout = self.layout
+        
+        
+class DATA_PT_twig_rig_switches(bpy.types.Panel):
+    """Creates a subpanel of the the Rig Options panel"""
+    
+    bl_label = "Switch Controls"
+    bl_idname = "DATA_PT_twig_rig_switches"
+    bl_parent_id = "DATA_PT_twig_rig"
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    
+    def draw(self, context):
+        layout = self.layout        
+        controls = rigs.resolve(context.active_object, rigs.TWIG)
+        
+        draw_missing_controls(layout, controls)
+ 
+        # IK/FK switches
+        split = layout.split(factor=.15)
+
+        col = split.column()
+        col.label(text="FK/IK")
+        col.label(text="Arm:")
+        col.label(text="Leg:")
+        
+        col = split.column()
+        col.label(text="Left:")
+        
+        row = col.row(align=True)
+        add_fk_ik_button(row, controls, 'FK', "ArmIKSwitch.L")
+        add_fk_ik_button(row, controls, 'IK', "ArmIKSwitch.L")
+        
+        row = col.row(align=True)
+        add_fk_ik_button(row, controls, 'FK', "LegIKSwitch.L")
+        add_fk_ik_button(row, controls, 'IK', "LegIKSwitch.L")
+        
+        col = split.column()
+        col.label(text="Right:")
+        
+        row = col.row(align=True)
+        add_fk_ik_button(row, controls, 'FK', "ArmIKSwitch.R")
+        add_fk_ik_button(row, controls, 'IK', "ArmIKSwitch.R")
+        
+        row = col.row(align=True)
+        add_fk_ik_button(row, controls, 'FK', "LegIKSwitch.R")
+        add_fk_ik_button(row, controls, 'IK', "LegIKSwitch.R")
+        
+        # IK stretch, pin elbow
+        split = layout.split(factor = .4)
+        
+        col = split.column()
+        col.label(text="Arm stretch (IK)")
+        col.label(text="Pin elbow (IK)")
+        
+        col = split.column()
+        
+        row = col.row()
+        draw_rig_control(row, controls, "ArmIKSwitch.L", "ik_stretch", text="L")
+        draw_rig_control(row, controls, "ArmIKSwitch.R", "ik_stretch", text="R")
+        
+        row = col.row()
+        draw_rig_control(row, controls, "IKElbowTarget.L", "pin_elbow", text="L")
+        draw_rig_control(row, controls, "IKElbowTarget.R", "pin_elbow", text="R")
+        
+        layout.separator()
+        
+        
+        # Skirt options
+        draw_rig_control(layout, controls, "COG", "skirt_follow_influence",
+            text="Skirt follow influence")
+        draw_rig_control(layout, controls, "COG", "limit_skirt_collapse",
+            text="Limit skirt collapse")
+        
+        # Other switches
+        split = layout.split(factor = .4)
+        col = split.column()
+        col.label(text="Head follow body")
+        col.label(text="FK hand follow body")
+        col.label(text="IK knee follow foot")
+        
+        col = split.column()
+        draw_rig_control(col, controls, "HeadControl", "follow_body")
+        row = col.row()
+        draw_rig_control(row, controls, "Hand.FK.L", "follow_body", text="L")
+        draw_rig_control(row, controls, "Hand.FK.R", "follow_body", text="R")
+        row = col.row()
+        draw_rig_control(row, controls, "IKKneeTarget.L", "follow_foot", text="L")
+        draw_rig_control(row, controls, "IKKneeTarget.R", "follow_foot", text="R")
+        
+        layout.separator()
+        
+        
+class DATA_PT_twig_rig_bake(bpy.types.Panel):
+    """Creates a subpanel of the the Rig Options panel"""
+    
+    bl_label = "Bake FK/IK"
+    bl_idname = "DATA_PT_twig_rig_bake"
+    bl_parent_id = "DATA_PT_twig_rig"
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    bl_options = {'DEFAULT_CLOSED'}
+    
+    def draw(self, context):
+        draw_fk_ik_bake(self.layout, rigs.resolve(context.active_object, rigs.TWIG))
+        
+        
+class DATA_PT_twig_rig_select(bpy.types.Panel):
+    """Creates a subpanel of the the Rig Options panel"""
+    
+    bl_label = "Selection/Keying"
+    bl_idname = "DATA_PT_twig_rig_select"
+    bl_parent_id = "DATA_PT_twig_rig"
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    
+    def draw(self, context):
+        layout = self.layout        
+        rig = context.active_object  # bpy.data.objects["Twig_proxy"]
+        
+        op = layout.operator("armature.key_whole_character", text="Key All Anims")
+        op = layout.operator("pose.transforms_clear", text="Reset Selected Anims")
+
+        layout.label(text="Select Anims:")
+        
+        split = layout.split(align=True)
+        op = split.operator("pose.group_switch_and_select", text="Fingers L")
+        op.group = "Fingers_L"
+        op = split.operator("pose.group_switch_and_select", text="Fingers R")
+        op.group = "Fingers_R"
+        
+        op = layout.operator("pose.group_switch_and_select", text="Leaf")
+        op.group = "Leaf"
+        
+        op = layout.operator("pose.group_switch_and_select", text="Skirt")
+        op.group = "Skirt"
+        
+        # doesn't select hidden anims
+        op = layout.operator("pose.select_all_anims", text="All (Visible) Anims")
+
+
+# Stands in for a UILayout in bench_rig_panels(), so only the panel's own work is timed
+class NullLayout:
+    """Accepts and ignores every UILayout call"""
+    
+    def __getattr__(self, name):
+        return self
+    
+    def __setattr__(self, name, value):
+        pass
+    
+    def __call__(self, *args, **kwargs):
+        return self
+
+
+# The switch panels' draw() as it was before the controls were cached, looking every bone up by
+# name on every redraw, to compare with in bench_rig_panels()
+def baseline_pebble_draw(self, context):
+    layout = self.layout
+    
+    # IK/FK switches
+    split = layout.split(factor=.15)
+    
+    col = split.column()
+    col.label(text="FK/IK")
+    col.label(text="Arm:")
+    col.label(text="Leg:")
+    
+    col = split.column()
+    col.label(text="Left:")
+    
+    row = col.row(align=True)
+    baseline_fk_ik_button(row, 'FK', "left_arm_IK_switch", "IK Switch")
+    baseline_fk_ik_button(row, 'IK', "left_arm_IK_switch", "IK Switch")
+    
+    row = col.row(align=True)
+    baseline_fk_ik_button(row, 'FK', "left_leg_IK_switch", "IK Switch")
+    baseline_fk_ik_button(row, 'IK', "left_leg_IK_switch", "IK Switch")
+    
+    col = split.column()
+    col.label(text="Right:")
+    
+    row = col.row(align=True)
+    baseline_fk_ik_button(row, 'FK', "right_arm_IK_switch", "IK Switch")
+    baseline_fk_ik_button(row, 'IK', "right_arm_IK_switch", "IK Switch")
+    
+    row = col.row(align=True)
+    baseline_fk_ik_button(row, 'FK', "right_leg_IK_switch", "IK Switch")
+    baseline_fk_ik_button(row, 'IK', "right_leg_IK_switch", "IK Switch")
+    
+    layout.separator()
+
+
+def baseline_twig_draw(self, context):
+    layout = self.layout
+    rig = context.active_object
+    
+    # IK/FK switches
+    split = layout.split(factor=.15)
+    
+    col = split.column()
+    col.label(text="FK/IK")
+    col.label(text="Arm:")
+    col.label(text="Leg:")
+    
+    col = split.column()
+    col.label(text="Left:")
+    
+    row = col.row(align=True)
+    baseline_fk_ik_button(row, 'FK', "ArmIKSwitch.L", "ik_switch")
+    baseline_fk_ik_button(row, 'IK', "ArmIKSwitch.L", "ik_switch")
+    
+    row = col.row(align=True)
+    baseline_fk_ik_button(row, 'FK', "LegIKSwitch.L", "ik_switch")
+    baseline_fk_ik_button(row, 'IK', "LegIKSwitch.L", "ik_switch")
+    
+    col = split.column()
+    col.label(text="Right:")
+    
+    row = col.row(align=True)
+    baseline_fk_ik_button(row, 'FK', "ArmIKSwitch.R", "ik_switch")
+    baseline_fk_ik_button(row, 'IK', "ArmIKSwitch.R", "ik_switch")
+    
+    row = col.row(align=True)
+    baseline_fk_ik_button(row, 'FK', "LegIKSwitch.R", "ik_switch")
+    baseline_fk_ik_button(row, 'IK', "LegIKSwitch.R", "ik_switch")
+    
+    # IK stretch, pin elbow
+    split = layout.split(factor = .4)
+    
+    col = split.column()
+    col.label(text="Arm stretch (IK)")
+    col.label(text="Pin elbow (IK)")
+    
+    col = split.column()
+    
+    row = col.row()
+    row.prop(rig.pose.bones["ArmIKSwitch.L"], '["ik_stretch"]', text="L")
+    row.prop(rig.pose.bones["ArmIKSwitch.R"], '["ik_stretch"]', text="R")
+    
+    row = col.row()
+    row.prop(rig.pose.bones["IKElbowTarget.L"], '["pin_elbow"]', text="L")
+    row.prop(rig.pose.bones["IKElbowTarget.R"], '["pin_elbow"]', text="R")
+    
+    layout.separator()
+    
+    
+    # Skirt options
+    layout.prop(rig.pose.bones["COG"], '["skirt_follow_influence"]',
+        text="Skirt follow influence")
+    layout.prop(rig.pose.bones["COG"], '["limit_skirt_collapse"]',
+        text="Limit skirt collapse")
+    
+    # Other switches
+    split = layout.split(factor = .4)
+    col = split.column()
+    col.label(text="Head follow body")
+    col.label(text="FK hand follow body")
+    col.label(text="IK knee follow foot")
+    
+    col = split.column()
+    col.prop(rig.pose.bones["HeadControl"], '["follow_body"]', text="")
+    row = col.row()
+    row.prop(rig.pose.bones["Hand.FK.L"], '["follow_body"]', text="L")
+    row.prop(rig.pose.bones["Hand.FK.R"], '["follow_body"]', text="R")
+    row = col.row()
+    row.prop(rig.pose.bones["IKKneeTarget.L"], '["follow_foot"]', text="L")
+    row.prop(rig.pose.bones["IKKneeTarget.R"], '["follow_foot"]', text="R")
+    
+    layout.separator()
+
+
+def baseline_fk_ik_button(layout, ik_fk, bone, switch_name):
+    op = layout.operator("armature.fk_ik_switch", text=ik_fk)
+    op.switch_name = switch_name
+    op.switch_bone = bone
+    op.mode = ik_fk
+
+
+# Times the switch panels' draw() on every Pebble/Twig rig in the open file against the baseline
+# draw above. The baseline needs all the controls the panel draws (it raises a KeyError without
+# them), the rigs that miss some are only timed with the current draw.
+BENCH_ROUNDS = 10
+
+
+def bench_rig_panels(repeat=10000):
+    panels = {rigs.PEBBLE: (DATA_PT_pebble_rig_switches, baseline_pebble_draw),
+              rigs.TWIG: (DATA_PT_twig_rig_switches, baseline_twig_draw)}
+    panel = SimpleNamespace(layout=NullLayout())
+    
+    found = False
+    for obj in bpy.data.objects:
+        descriptor = rigs.find_descriptor(obj)
+        if descriptor is None:
+            continue
+        found = True
+        context = SimpleNamespace(active_object=obj)
+        resolved = rigs.resolve(obj, descriptor)
+        draws = [panels[descriptor][0].draw]
+        if all(resolved.has(bone) for bone in descriptor.controls):
+            draws.append(panels[descriptor][1])
+        
+        # taking turns in rounds, the best round of each counts (other processes only slow them down)
+        timings = [float("inf")] * len(draws)
+        for round in range(BENCH_ROUNDS):
+            for i, draw in enumerate(draws):
+                start = time.perf_counter()
+                for j in range(repeat // BENCH_ROUNDS):
+                    draw(panel, context)
+                timings[i] = min(timings[i], (time.perf_counter() - start) / (repeat // BENCH_ROUNDS) * 1e6)
+        
+        baseline = "baseline %7.1fus" % timings[1] if len(timings) > 1 else "(no baseline)"
+        print("%-24s %-7s %7.1fus  %s per draw  (%d missing controls)"
+              % (obj.name, descriptor.name, timings[0], baseline, len(resolved.missing)))
+    
+    if not found:
+        print("No Pebble or Twig rigs in this file")
+
+
+classes = (
+    DATA_PT_pebble_rig,
+    DATA_PT_pebble_rig_select,
+    DATA_PT_pebble_rig_switches,
+    DATA_PT_pebble_rig_bake,
+    DATA_PT_twig_rig,
+    DATA_PT_twig_rig_select,
+    DATA_PT_twig_rig_switches,
+    DATA_PT_twig_rig_bake,
+)
+
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+    
+    for name in RIG_CACHE_HANDLERS:
+        getattr(bpy.app.handlers, name).append(clear_rig_cache)
+    bpy.app.handlers.depsgraph_update_post.append(clear_rig_cache_on_edit)
+
+
+def unregister():
+    bpy.app.handlers.depsgraph_update_post.remove(clear_rig_cache_on_edit)
+    for name in RIG_CACHE_HANDLERS:
+        getattr(bpy.app.handlers, name).remove(clear_rig_cache)
+    rigs.clear_cache()
+    
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
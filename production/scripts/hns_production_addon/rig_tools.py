@@ -0,0 +1,410 @@
+# Rig operators: FK/IK switching and keying (only registered when Blender has a UI, see addon.py)
+
+import bpy
+
+import time
+
+from . import keying, rigs
+
+
+#####################       Rig Operators       #####################
+
+# Switching a limb between FK and IK without a jump: the controls of the mode being switched to
+# are posed to match where the limb is now. Everything is worked out in armature space from the
+# evaluated pose (PoseBone.matrix) and written back as matrix_basis, so a whole frame range
+# only needs one scene evaluation per frame.
+
+# The matrix (armature space) that puts bone where target is, keeping their rest pose offset
+def match_matrix(bone, target, target_matrix=None):
+    target_matrix = target.matrix if target_matrix is None else target_matrix
+    return target_matrix @ (target.bone.matrix_local.inverted() @ bone.bone.matrix_local)
+
+
+# Armature space matrix -> matrix_basis. moved: {bone name: new matrix} of bones posed before
+# this one, used instead of the evaluated matrix when one of them is the parent.
+def pose_to_basis(bone, matrix, moved):
+    data_bone = bone.bone
+    if bone.parent is None:
+        return data_bone.matrix_local.inverted() @ matrix
+    
+    parent_matrix = moved.get(bone.parent.name, bone.parent.matrix)
+    if hasattr(data_bone, "convert_local_to_pose"):
+        # 2.81+, also handles bones that don't inherit rotation/scale
+        return data_bone.convert_local_to_pose(matrix, data_bone.matrix_local,
+            parent_matrix=parent_matrix, parent_matrix_local=bone.parent.bone.matrix_local, invert=True)
+    rest = bone.parent.bone.matrix_local.inverted() @ data_bone.matrix_local
+    return (parent_matrix @ rest).inverted() @ matrix
+
+
+# {bone name: matrix_basis} that pose the limb's FK chain onto the IK chain
+def fk_snap_bases(limb, bones):
+    moved = {}
+    bases = {}
+    for fk_name, ik_name in zip(limb.fk, limb.ik):
+        fk = bones[fk_name]
+        matrix = match_matrix(fk, bones[ik_name])
+        bases[fk_name] = pose_to_basis(fk, matrix, moved)
+        moved[fk_name] = matrix
+    return bases
+
+
+# {bone name: matrix_basis} that put the limb's IK control on the FK tip and its pole
+# in the plane the FK chain bends in
+def ik_snap_bases(limb, bones):
+    fk = [bones[name] for name in limb.fk]
+    control, pole = bones[limb.ik_control], bones[limb.pole]
+    
+    control_matrix = match_matrix(control, fk[-1])
+    moved = {limb.ik_control: control_matrix}
+    bases = {limb.ik_control: pose_to_basis(control, control_matrix, moved)}
+    
+    root, mid, tip = fk[0].head, fk[1].head, fk[1].tail
+    chain = tip - root
+    if chain.length > 1e-6:
+        bend = mid - (root + chain * ((mid - root).dot(chain) / chain.length_squared))
+        # a straight limb doesn't say where the pole goes, so it stays put
+        if bend.length > 1e-6:
+            distance = (pole.head - bones[limb.ik[1]].head).length or fk[0].length
+            pole_matrix = pole.matrix.copy()
+            pole_matrix.translation = mid + bend.normalized() * distance
+            bases[limb.pole] = pose_to_basis(pole, pole_matrix, moved)
+    return bases
+
+
+def snap_bases(limb, bones, mode):
+    return fk_snap_bases(limb, bones) if mode == 'FK' else ik_snap_bases(limb, bones)
+
+
+# The mode the limb's switch has it in now (IK from 0.5 up): its chain drives the deform bones
+def get_limb_mode(bones, limb, switch_property):
+    return 'IK' if bones[limb.switch].get(switch_property, 0.0) >= 0.5 else 'FK'
+
+
+# The object's action (a new one if it has none), its F-curves are keying.get_fcurves(obj, action)
+def get_action(obj):
+    animation_data = obj.animation_data or obj.animation_data_create()
+    if animation_data.action is None:
+        animation_data.action = bpy.data.actions.new(obj.name + "Action")
+    return animation_data.action
+
+
+# Keys {frame: {bone name: matrix_basis}} and {frame: {switch bone: value}} in one batch
+def key_pose_bases(rig, poses, switches, switch_property):
+    batch = keying.KeyBatch()
+    
+    previous = {}  # rotations are kept compatible with the previous frame so they don't flip
+    for frame in sorted(poses):
+        for name, basis in poses[frame].items():
+            bone = rig.pose.bones[name]
+            location, rotation, scale = basis.decompose()
+            
+            if bone.rotation_mode == 'QUATERNION':
+                if name in previous:
+                    rotation.make_compatible(previous[name])
+                previous[name] = rotation
+            elif bone.rotation_mode == 'AXIS_ANGLE':
+                axis, angle = rotation.to_axis_angle()
+                rotation = [angle] + list(axis)
+            else:
+                rotation = rotation.to_euler(bone.rotation_mode, previous.get(name, bone.rotation_euler))
+                previous[name] = rotation
+            
+            batch.add_transforms(name, bone.rotation_mode, location, rotation, scale, frame)
+    
+    for frame, values in switches.items():
+        for name, value in values.items():
+            batch.add(keying.bone_path(name, '["%s"]' % switch_property), [value], frame, name, 'CONSTANT')
+    
+    batch.write(keying.get_fcurves(rig, get_action(rig), create=True))
+
+
+class ARMATURE_OT_fk_ik_switch(bpy.types.Operator):
+    """Switches the selected limb to IK or FK mode, posing the new controls to match the limb
+    (with Bake, on every frame of a range)"""
+        
+    bl_idname = "armature.fk_ik_switch"
+    bl_label = "FK/IK Switch Operator"
+    bl_options = {'REGISTER', 'UNDO', 'INTERNAL'}
+    
+    mode: bpy.props.EnumProperty(items=(('FK', "FK", "", 0), ('IK', "IK", "", 1)))
+    switch_bone: bpy.props.StringProperty()
+    switch_name: bpy.props.StringProperty()
+    
+    snap: bpy.props.BoolProperty(
+        name="Snap",
+        description="Pose the controls of the new mode to match the limb (unless it's in that mode already)",
+        default=True
+    )
+    bake: bpy.props.BoolProperty(
+        name="Bake",
+        description="Switch and snap on every frame of the range"
+    )
+    frame_start: bpy.props.IntProperty(name="Start")
+    frame_end: bpy.props.IntProperty(name="End")
+    
+    def invoke(self, context, event):
+        if not self.bake:
+            return self.execute(context)
+        
+        scene = context.scene
+        if scene.use_preview_range:
+            self.frame_start, self.frame_end = scene.frame_preview_start, scene.frame_preview_end
+        else:
+            self.frame_start, self.frame_end = scene.frame_start, scene.frame_end
+        return context.window_manager.invoke_props_dialog(self)
+    
+    def execute(self, context):
+        rig = context.active_object
+        bones = rig.pose.bones
+        value = 0.0 if self.mode == 'FK' else 1.0
+        
+        descriptor = rigs.find_descriptor(rig)
+        limb = descriptor.limbs.get(self.switch_bone) if descriptor else None
+        
+        if not self.snap or limb is None:
+            if self.bake:
+                self.report({'ERROR'}, "Don't know the bones of %s, can't bake it" % self.switch_bone)
+                return {'CANCELLED'}
+            bones[self.switch_bone][self.switch_name] = value
+            bones[self.switch_bone].keyframe_insert(data_path='["' + self.switch_name + '"]')
+            rig.update_tag()
+            return {'FINISHED'}
+        
+        controls = rigs.resolve(rig, descriptor)
+        missing = [bone for bone in limb.bones() if not controls.has(bone)]
+        if missing:
+            self.report({'ERROR'}, "Missing rig controls: " + ", ".join(missing))
+            return {'CANCELLED'}
+        
+        scene = context.scene
+        if self.bake:
+            frames = range(self.frame_start, max(self.frame_start, self.frame_end) + 1)
+        else:
+            frames = [scene.frame_current]
+        
+        # one evaluation per frame, the pose is only written after every frame has been read.
+        # Frames the limb is already in the mode on are left as they are: the other chain isn't
+        # what the limb looks like there, snapping to it would make the limb jump.
+        poses = {}
+        old_frame = scene.frame_current
+        try:
+            for frame in frames:
+                if frame != scene.frame_current:
+                    scene.frame_set(frame)
+                if get_limb_mode(bones, limb, self.switch_name) != self.mode:
+                    poses[frame] = snap_bases(limb, bones, self.mode)
+                else:
+                    poses[frame] = {}
+        finally:
+            if scene.frame_current != old_frame:
+                scene.frame_set(old_frame)
+        
+        key_pose_bases(rig, poses, {frame: {self.switch_bone: value} for frame in frames}, self.switch_name)
+        
+        bones[self.switch_bone][self.switch_name] = value
+        if old_frame in poses:
+            for name, basis in poses[old_frame].items():
+                bones[name].matrix_basis = basis
+        rig.update_tag()
+        
+        if self.bake:
+            self.report({'INFO'}, "Baked %s to %s over %d frames" % (limb.name, self.mode, len(frames)))
+        return {'FINISHED'}
+
+
+class POSE_OT_group_switch_and_select(bpy.types.Operator):
+    """Makes the given bone group active and selects all its bones.
+        
+       Does nothing if group doesn't match the name of a bone group
+       on the active object."""
+    
+    bl_idname = "pose.group_switch_and_select"
+    bl_label = "Switch and Select Bone Group"
+    bl_options = {'REGISTER', 'UNDO', 'INTERNAL'}
+    
+    group: bpy.props.StringProperty()
+    
+    @classmethod
+    def poll(cls, context):
+        return (context.active_object.type == 'ARMATURE'
+            and bpy.ops.pose.group_select.poll())
+        
+    def execute(self, context):
+        bone_groups = context.active_object.pose.bone_groups
+        
+        if self.group in bone_groups:
+            bone_groups.active = bone_groups[self.group]
+            bpy.ops.pose.group_select()
+        return {'FINISHED'}
+    
+    
+class POSE_OT_select_all_anims(bpy.types.Operator):
+    """Selects all controls on the rig except the TopCon."""
+    
+    bl_idname = "pose.select_all_anims"
+    bl_label = "Select All Anims"
+    bl_options = {'REGISTER', 'UNDO', 'INTERNAL'}
+    
+    @classmethod
+    def poll(cls, context):
+        return (context.active_object.type == 'ARMATURE'
+            and bpy.ops.pose.select_all.poll())
+        
+    def execute(self, context):
+        bpy.ops.pose.select_all(action='SELECT')
+        if "TopCon" in context.active_object.data.bones:
+            context.active_object.data.bones["TopCon"].select = False
+        return {'FINISHED'}
+    
+    
+# Whether the bone shows in pose mode: not hidden (5.0 hides pose bones, before it was the bone),
+# and on a visible layer, or from 4.0 in a visible bone collection (or none)
+def is_bone_visible(rig, bone):
+    data_bone = bone.bone
+    if getattr(bone, "hide", data_bone.hide):
+        return False
+    if hasattr(data_bone, "collections"):
+        return not data_bone.collections or any(getattr(collection, "is_visible_effectively", collection.is_visible)
+                                                for collection in data_bone.collections)
+    return any(bone_layer and rig_layer for bone_layer, rig_layer in zip(data_bone.layers, rig.data.layers))
+
+
+# The animator controls of a rig, the bones Select All Anims selects: the visible, selectable
+# ones except the TopCon (the rigs hide their mechanism and deform bones)
+def get_rig_controls(rig):
+    return [bone for bone in rig.pose.bones
+            if bone.name != "TopCon" and not bone.bone.hide_select and is_bone_visible(rig, bone)]
+
+
+# Frames with a key on any of the rig's fcurves
+def get_keyed_frames(rig):
+    frames = set()
+    if rig.animation_data and rig.animation_data.action:
+        for fcurve in keying.get_fcurves(rig, rig.animation_data.action) or []:
+            co = [0.0] * (len(fcurve.keyframe_points) * 2)
+            fcurve.keyframe_points.foreach_get("co", co)
+            frames.update(int(round(frame)) for frame in co[::2])
+    return sorted(frames)
+
+
+# LocRotScale keys for the bones on each frame, with their pose at that frame (the pose they
+# have now if frames is just the current frame). Returns the number of keys written.
+def key_bones(context, rig, bones, frames):
+    scene = context.scene
+    batch = keying.KeyBatch()
+    
+    old_frame = scene.frame_current
+    try:
+        for frame in frames:
+            if frame != scene.frame_current:
+                scene.frame_set(frame)
+            for bone in bones:
+                batch.add_bone(bone, frame)
+    finally:
+        if scene.frame_current != old_frame:
+            scene.frame_set(old_frame)
+    
+    return batch.write(keying.get_fcurves(rig, get_action(rig), create=True))
+
+
+class ARMATURE_OT_key_whole_character(bpy.types.Operator):
+    """Keys all (visible) controls on the rig except the TopCon, whatever is selected."""
+        
+    bl_idname = "armature.key_whole_character"
+    bl_label = "Key Whole Character"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    frames: bpy.props.EnumProperty(
+        name="Frames",
+        items=(('CURRENT', "Current Frame", "Key the current pose"),
+               ('RANGE', "Frame Range", "Key every frame of the range with the pose on that frame"),
+               ('KEYED', "Keyed Frames", "Key every control on each frame the rig already has a key on")),
+        default='CURRENT'
+    )
+    frame_start: bpy.props.IntProperty(name="Start")
+    frame_end: bpy.props.IntProperty(name="End")
+    
+    @classmethod
+    def poll(cls, context):
+        return context.mode == 'POSE'
+    
+    def execute(self, context):
+        rig = context.active_object
+        
+        if self.frames == 'RANGE':
+            frames = range(self.frame_start, max(self.frame_start, self.frame_end) + 1)
+        elif self.frames == 'KEYED':
+            frames = get_keyed_frames(rig) or [context.scene.frame_current]
+        else:
+            frames = [context.scene.frame_current]
+        
+        count = key_bones(context, rig, get_rig_controls(rig), frames)
+        if self.frames != 'CURRENT':
+            self.report({'INFO'}, "Added %d keys on %d frames" % (count, len(frames)))
+        return {'FINISHED'}
+
+
+# Times keying every control of each Pebble/Twig rig in the open file over a frame range,
+# with the bulk keying above and with the old way (frame_set, select all, keyframe_insert_by_name).
+# Both start from a copy of the rig's original action.
+def bench_keying(frame_count=500):
+    scene = bpy.context.scene
+    frames = range(scene.frame_start, scene.frame_start + frame_count)
+    
+    found = False
+    for rig in bpy.data.objects:
+        if rigs.find_descriptor(rig) is None:
+            continue
+        found = True
+        
+        bpy.context.view_layer.objects.active = rig
+        bpy.ops.object.mode_set(mode='POSE')
+        controls = get_rig_controls(rig)
+        original = rig.animation_data.action if rig.animation_data else None
+        
+        def fresh_action():
+            get_action(rig)
+            rig.animation_data.action = original.copy() if original else None
+        
+        fresh_action()
+        start = time.perf_counter()
+        count = key_bones(bpy.context, rig, controls, frames)
+        bulk = time.perf_counter() - start
+        
+        fresh_action()
+        start = time.perf_counter()
+        for frame in frames:
+            scene.frame_set(frame)
+            bpy.ops.pose.select_all(action='DESELECT')
+            for bone in controls:
+                bone.bone.select = True
+            bpy.ops.anim.keyframe_insert_by_name(type="LocRotScale")
+        ops = time.perf_counter() - start
+        
+        rig.animation_data.action = original
+        bpy.ops.object.mode_set(mode='OBJECT')
+        print("%-24s %d controls x %d frames (%d keys): bulk %.2fs, keyframe_insert_by_name %.2fs (%.1fx)"
+              % (rig.name, len(controls), len(frames), count, bulk, ops, ops / bulk if bulk else 0))
+    
+    if not found:
+        print("No Pebble or Twig rigs in this file")
+        
+        
+
+
+classes = (
+    ARMATURE_OT_fk_ik_switch,
+    POSE_OT_group_switch_and_select,
+    POSE_OT_select_all_anims,
+    ARMATURE_OT_key_whole_character,
+)
+
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+
+def unregister():
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
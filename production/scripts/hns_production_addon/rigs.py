@@ -0,0 +1,161 @@
+# The controls each character rig's panels use, as data, and a cache of where they are
+# on each armature so the panels (which are redrawn constantly while animating) don't
+# look every bone up by name on every redraw.
+#
+# A rig that's missing some of its controls (an old version, a broken proxy) still draws,
+# with the missing ones listed instead of a KeyError in the console.
+#
+# Doesn't import bpy, the rigs are only read through attribute and name lookups.
+
+
+class Limb:
+    """An FK/IK limb. fk and ik are the matching bones of both chains from the shoulder/hip down;
+    the FK chain is snapped onto the ik bones, the IK control and pole onto the fk ones."""
+
+    def __init__(self, name, switch, fk, ik, ik_control, pole):
+        self.name = name
+        self.switch = switch  # bone with the switch property
+        self.fk = fk
+        self.ik = ik
+        self.ik_control = ik_control
+        self.pole = pole
+
+    def bones(self):
+        return [self.switch] + self.fk + self.ik + [self.ik_control, self.pole]
+
+
+class RigDescriptor:
+    """The controls a character's panels use: {bone name: [custom properties on it]},
+    plus the bones of its FK/IK limbs"""
+
+    def __init__(self, name, object_prefix, switch_property, controls, limbs=()):
+        self.name = name
+        self.object_prefix = object_prefix  # name of the proxy armature object
+        self.switch_property = switch_property  # FK/IK switch property on the switch bones
+        self.controls = dict(controls)
+        self.limbs = {limb.switch: limb for limb in limbs}
+
+        for limb in limbs:
+            for bone in limb.bones():
+                self.controls.setdefault(bone, [])
+
+    def matches(self, obj):
+        return obj is not None and obj.type == 'ARMATURE' and obj.name.startswith(self.object_prefix)
+
+
+# Pebble's FK chain is the deform chain itself, the hand/foot follows the IK control
+def pebble_limb(name, side, part, upper, lower, end):
+    return Limb(name, "%s_%s_IK_switch" % (side, part),
+                fk=["%s_%s" % (side, upper), "%s_%s" % (side, lower), "%s_%s" % (side, end)],
+                ik=["%s_%s.IK" % (side, upper), "%s_%s.IK" % (side, lower), "%s_%s_control.IK" % (side, part)],
+                ik_control="%s_%s_control.IK" % (side, part),
+                pole="%s_%s_pole.IK" % (side, "arm" if part == "arm" else "knee"))
+
+
+PEBBLE = RigDescriptor("Pebble", "Pebble_proxy", "IK Switch", {
+    "left_arm_IK_switch": ["IK Switch"],
+    "left_leg_IK_switch": ["IK Switch"],
+    "right_arm_IK_switch": ["IK Switch"],
+    "right_leg_IK_switch": ["IK Switch"],
+}, limbs=[
+    pebble_limb("Arm L", "left", "arm", "upperarm", "lowerarm", "hand"),
+    pebble_limb("Leg L", "left", "leg", "upperleg", "lowerleg", "foot"),
+    pebble_limb("Arm R", "right", "arm", "upperarm", "lowerarm", "hand.001"),
+    pebble_limb("Leg R", "right", "leg", "upperleg", "lowerleg", "foot"),
+])
+
+
+def twig_limb(name, side, part, upper, lower, end, ik_end, pole):
+    return Limb(name, "%sIKSwitch.%s" % (part, side),
+                fk=["%s.FK.%s" % (bone, side) for bone in (upper, lower, end)],
+                ik=["%s.IK.%s" % (bone, side) for bone in (upper, lower, ik_end)],
+                ik_control="%s.IK.%s" % (end, side),
+                pole="%s.%s" % (pole, side))
+
+
+TWIG = RigDescriptor("Twig", "Twig_proxy", "ik_switch", {
+    "ArmIKSwitch.L": ["ik_switch", "ik_stretch"],
+    "ArmIKSwitch.R": ["ik_switch", "ik_stretch"],
+    "LegIKSwitch.L": ["ik_switch"],
+    "LegIKSwitch.R": ["ik_switch"],
+    "IKElbowTarget.L": ["pin_elbow"],
+    "IKElbowTarget.R": ["pin_elbow"],
+    "COG": ["skirt_follow_influence", "limit_skirt_collapse"],
+    "HeadControl": ["follow_body"],
+    "Hand.FK.L": ["follow_body"],
+    "Hand.FK.R": ["follow_body"],
+    "IKKneeTarget.L": ["follow_foot"],
+    "IKKneeTarget.R": ["follow_foot"],
+}, limbs=[
+    # the IK foot control drives the FootMech bone through the foot roll
+    twig_limb("Arm L", "L", "Arm", "UpperArm", "LowerArm", "Hand", "Hand", "IKElbowTarget"),
+    twig_limb("Leg L", "L", "Leg", "UpperLeg", "LowerLeg", "Foot", "FootMech", "IKKneeTarget"),
+    twig_limb("Arm R", "R", "Arm", "UpperArm", "LowerArm", "Hand", "Hand", "IKElbowTarget"),
+    twig_limb("Leg R", "R", "Leg", "UpperLeg", "LowerLeg", "Foot", "FootMech", "IKKneeTarget"),
+])
+
+RIGS = [PEBBLE, TWIG]
+
+
+def find_descriptor(obj):
+    return next((rig for rig in RIGS if rig.matches(obj)), None)
+
+
+class ResolvedRig:
+    """A descriptor's controls on one armature: their pose bones by name, and the ones missing.
+    resolve() keeps it until clear_cache(), drawing a panel only takes dictionary lookups."""
+
+    def __init__(self, rig, descriptor):
+        self.rig = rig
+        self.descriptor = descriptor
+        self.bones = {}  # name -> pose bone
+        self.missing = []  # "bone" or "bone["property"]"
+        self.missing_properties = set()  # (bone, property)
+
+        pose_bones = rig.pose.bones
+        for name, properties in descriptor.controls.items():
+            bone = pose_bones.get(name)
+            if bone is None:
+                self.missing.append(name)
+                continue
+            self.bones[name] = bone
+            for prop in properties:
+                if prop not in bone:
+                    self.missing.append('%s["%s"]' % (name, prop))
+                    self.missing_properties.add((name, prop))
+
+        # switch bones of the limbs that have all their bones
+        self.complete_limbs = {switch for switch, limb in descriptor.limbs.items()
+                               if all(bone in self.bones for bone in limb.bones())}
+
+    def has(self, bone, prop=None):
+        """Whether the bone (and its custom property, if given) exists"""
+        return bone in self.bones and (prop is None or (bone, prop) not in self.missing_properties)
+
+    def bone(self, name):
+        return self.bones.get(name)
+
+
+# ResolvedRigs by armature object (hashed by its pointer), the oldest dropped past MAX_CACHED.
+# They hold on to the pose bones, which are freed with their armature, so anything that can free,
+# add or rename bones has to call clear_cache() before the next panel redraw: the panels' handlers
+# do on loading a file, undo/redo, and depsgraph updates to armature data (edit mode, swapping the
+# data) or the scene (deleting objects), the library tools when they reload or remove libraries.
+MAX_CACHED = 32
+cache = {}
+
+
+def resolve(rig, descriptor=None):
+    """The descriptor's controls on the armature (found from its name if not given),
+    looked up once and reused until clear_cache()"""
+    resolved = cache.get(rig)
+    if resolved is None or (descriptor is not None and resolved.descriptor is not descriptor):
+        if len(cache) >= MAX_CACHED:
+            del cache[next(iter(cache))]
+        resolved = ResolvedRig(rig, descriptor or find_descriptor(rig))
+        cache[rig] = resolved
+    return resolved
+
+
+def clear_cache():
+    cache.clear()
@@ -0,0 +1,105 @@
+# Applying and restoring groups of Blender settings, given as property paths from some root
+# object (usually the context), e.g. {"scene.render.ffmpeg.codec": 'H264'}.
+#
+# SettingsSnapshot remembers the old value of everything it changes and puts it all back
+# when the with block ends, even if something in the block raised:
+#
+#     with SettingsSnapshot() as snapshot:
+#         snapshot.apply(context, {"scene.render.resolution_percentage": 50})
+#         snapshot.set(modifier, "show_viewport", False)
+#         bpy.ops.render.opengl(animation=True)
+#
+# Doesn't import bpy, the paths are plain attribute lookups.
+
+
+# What every shot file should be set to (see the note in ANIM_OT_playblast)
+SHOT_SETTINGS = {
+    "scene.render.resolution_x": 1920,
+    "scene.render.resolution_y": 1080,
+    "scene.render.pixel_aspect_x": 1.0,
+    "scene.render.pixel_aspect_y": 1.0,
+    "scene.frame_step": 1,
+    "scene.render.fps": 24,
+    "scene.render.fps_base": 1.0,
+}
+
+
+# Returns (owner, attribute name) for a path like "scene.render.fps"
+def resolve(root, path):
+    *owners, attribute = path.split(".")
+    for name in owners:
+        root = getattr(root, name)
+    return root, attribute
+
+
+def get_setting(root, path):
+    owner, attribute = resolve(root, path)
+    return getattr(owner, attribute)
+
+
+def apply_settings(root, settings):
+    """Sets {path: value} settings without remembering the old values"""
+    for path, value in settings.items():
+        owner, attribute = resolve(root, path)
+        setattr(owner, attribute, value)
+
+
+class SettingsSnapshot:
+    """Old values of the settings changed through it, restored (newest first) by restore()
+    or at the end of a with block"""
+
+    def __init__(self):
+        self.saved = []  # [(what it is, function that puts it back)]
+
+    def capture(self, owner, attribute):
+        value = getattr(owner, attribute)
+        self.saved.append((attribute, lambda: setattr(owner, attribute, value)))
+
+    def defer(self, undo, description):
+        """Adds something that isn't a setting to what's put back, e.g. reloading a library
+        after its path is restored"""
+        self.saved.append((description, undo))
+
+    # Remembers settings that aren't changed directly but can change as a side effect
+    # (e.g. the color mode when the file format changes)
+    def capture_paths(self, root, paths):
+        for path in paths:
+            self.capture(*resolve(root, path))
+
+    def set(self, owner, attribute, value):
+        self.capture(owner, attribute)
+        setattr(owner, attribute, value)
+
+    def try_set(self, owner, attribute, value):
+        """Sets a setting that may be read-only (e.g. on linked data), returns whether it could.
+        The old value is only remembered once the new one is set."""
+        old = getattr(owner, attribute)
+        try:
+            setattr(owner, attribute, value)
+        except AttributeError:
+            return False
+        self.saved.append((attribute, lambda: setattr(owner, attribute, old)))
+        return True
+
+    def apply(self, root, settings):
+        for path, value in settings.items():
+            self.set(*resolve(root, path), value)
+
+    def restore(self):
+        """Puts back every old value. Settings that can't be restored (e.g. their owner was
+        deleted) are skipped and listed in the returned error messages."""
+        errors = []
+        for description, undo in reversed(self.saved):
+            try:
+                undo()
+            except (AttributeError, ReferenceError, RuntimeError, TypeError, ValueError) as e:
+                errors.append("Couldn't restore %s: %s" % (description, e))
+        self.saved.clear()
+        return errors
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        for error in self.restore():
+            print(error)
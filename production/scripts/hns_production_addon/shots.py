@@ -0,0 +1,141 @@
+# Tools for whole sequences: which shots a file affects, and review reels
+
+import bpy
+
+import os
+import time
+
+from . import depgraph, encoders, reel, validate
+from .batch import batch_playblast, find_shots
+from .playblast import get_playblast_path, get_shot_name, playblast_is_current
+from .prefs import copy_playblast_prefs, get_playblast_prefs
+
+
+#####################       Dependent Shots       #####################
+
+class ANIM_OT_find_dependent_shots(bpy.types.Operator):
+    """Lists the shots that use this file, directly or through other linked files
+    (i.e. the shots that need a new playblast after changing it)"""
+    
+    bl_idname = "anim.find_dependent_shots"
+    bl_label = "Find Dependent Shots"
+    
+    # defaults to the open file
+    filepath: bpy.props.StringProperty(subtype='FILE_PATH', options={'SKIP_SAVE'})
+    
+    def execute(self, context):
+        path = bpy.path.abspath(self.filepath) if self.filepath else bpy.data.filepath
+        if not path:
+            self.report({'ERROR'}, "Save the file first")
+            return {'CANCELLED'}
+        
+        try:
+            index = depgraph.load_index(path)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        
+        shots = [os.path.relpath(shot, index.root) for shot in index.dependent_shots(path)]
+        
+        def draw(menu, context):
+            for shot in shots:
+                menu.layout.label(text=shot)
+            if not shots:
+                menu.layout.label(text="No shots use this file")
+        
+        context.window_manager.popup_menu(draw, title="Shots using " + bpy.path.basename(path), icon='LINKED')
+        self.report({'INFO'}, "%d shots use %s" % (len(shots), bpy.path.basename(path)))
+        return {'FINISHED'}
+
+
+#####################       Shot Settings       #####################
+
+class ANIM_OT_fix_shot_settings(bpy.types.Operator):
+    """Sets the camera, resolution, aspect, frame step and frame rate every shot should have"""
+    
+    bl_idname = "anim.fix_shot_settings"
+    bl_label = "Fix Shot Settings"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    def execute(self, context):
+        problems = validate.check_context(context)
+        if not problems:
+            self.report({'INFO'}, "Shot settings are already right")
+            return {'CANCELLED'}
+        
+        left = validate.fix_context(context)
+        if left:
+            self.report({'WARNING'}, "Couldn't fix: " + "; ".join(left))
+        else:
+            self.report({'INFO'}, "Fixed: " + "; ".join(problems))
+        return {'FINISHED'}
+
+
+#####################       Review Reel       #####################
+
+# Joins the playblasts of a sequence folder into <sequence>_reel.mp4 (see reel.py), playblasting
+# the shots whose playblast is stale or missing first. Returns the reel path.
+def build_reel(folder, prefs, jobs=None):
+    profile = encoders.PROFILES[prefs.playblast_encoder]
+    if profile.image_sequence:
+        raise reel.ReelError("%s playblasts can't be joined into a reel" % profile.label)
+    
+    shots = find_shots([folder])
+    stale = [shot for shot in shots if not playblast_is_current(shot, prefs)]
+    if stale:
+        print("%d shots need a new playblast first" % len(stale))
+        failed = batch_playblast(stale, prefs, jobs, force=True)
+        if failed:
+            raise reel.ReelError("Couldn't playblast " + ", ".join(get_shot_name(shot) for shot in failed))
+    
+    start = time.perf_counter()
+    output = reel.get_reel_path(folder, profile.extension)
+    infos = reel.make_reel([get_playblast_path(shot, prefs) for shot in shots], output)
+    print("%s: %d shots, %d frames (joined in %.1fs)" % (output, len(infos),
+        sum(info["frames"] for info in infos), time.perf_counter() - start))
+    return output
+
+
+class ANIM_OT_build_reel(bpy.types.Operator):
+    """Joins the playblasts of the sequence into one movie without re-encoding,
+    playblasting the shots that changed first"""
+    
+    bl_idname = "anim.build_reel"
+    bl_label = "Build Sequence Reel"
+    
+    # defaults to the folder of the open shot
+    directory: bpy.props.StringProperty(subtype='DIR_PATH', options={'SKIP_SAVE'})
+    
+    def execute(self, context):
+        folder = bpy.path.abspath(self.directory) if self.directory else os.path.dirname(bpy.data.filepath)
+        if not folder:
+            self.report({'ERROR'}, "Save the file first")
+            return {'CANCELLED'}
+        if bpy.data.is_dirty:
+            self.report({'WARNING'}, "Unsaved changes aren't in the reel")
+        
+        try:
+            output = build_reel(folder, copy_playblast_prefs(get_playblast_prefs(context)))
+        except reel.ReelError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        
+        self.report({'INFO'}, "Reel written to " + output)
+        return {'FINISHED'}
+
+
+classes = (
+    ANIM_OT_find_dependent_shots,
+    ANIM_OT_fix_shot_settings,
+    ANIM_OT_build_reel,
+)
+
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+
+def unregister():
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
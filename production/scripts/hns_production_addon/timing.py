@@ -0,0 +1,223 @@
+# Per-frame timings for playblasts: how long each frame took in total, how much of that was
+# scene (depsgraph) evaluation, drawing (the render) and writing/encoding the frame, and the
+# memory in use at the end of it. The report is written next to the _playblast.mp4 as
+# _playblast_timing.json and .csv.
+#
+# The memory is the process' resident set size, read from /proc on Linux. Elsewhere only the
+# peak so far is available (ru_maxrss), so there a frame's memory_mb never goes down and only
+# shows the frames that raised it. Windows reports no memory at all.
+#
+# Drawing is timed with the render_pre/render_post handlers, which the background playblast's
+# render fires for every frame. Where they aren't fired (OpenGL render in a window), draw is
+# everything after the evaluation and write is left empty.
+#
+# The summary of every report in a folder doesn't need Blender:
+#   python -m hns_production_addon.timing production/shots
+
+import csv
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_memory_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# The memory in use now where it can be read, the peak so far elsewhere
+def memory_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return peak_memory_mb()
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+
+
+class FrameTimer:
+    """Times each frame of a playblast through the frame change and render handlers.
+
+    A frame starts with the first frame change or render to it. Evaluation is the time spent
+    between frame_change_pre and frame_change_post, drawing the time between render_pre and
+    render_post less the evaluation inside it, and writing the rest until the next frame
+    starts. Use it around the render call:
+
+        with FrameTimer() as timer:
+            bpy.ops.render.opengl(animation=True)
+        timer.write(folder, shot_name)
+    """
+
+    def __init__(self):
+        self.frames = []
+        self.current = None
+        self.start_time = None
+        self.total = None
+
+    # The render of a frame changes the scene to it again, and sets the frame back once it's done:
+    # those belong to the frame that's being timed
+    def begin(self, scene, now):
+        if self.current is None or scene.frame_current != self.current["frame"]:
+            self.end_frame(now)
+            self.current = {"frame": scene.frame_current, "start": now, "eval": 0.0, "render": None,
+                            "eval_start": None, "render_start": None, "eval_before_render": 0.0}
+        return self.current
+
+    def frame_pre(self, scene, *args):
+        now = time.perf_counter()
+        self.begin(scene, now)["eval_start"] = now
+
+    def frame_post(self, scene, *args):
+        current = self.current
+        if current is not None and current["eval_start"] is not None:
+            current["eval"] += time.perf_counter() - current["eval_start"]
+            current["eval_start"] = None
+
+    def render_pre(self, scene, *args):
+        now = time.perf_counter()
+        current = self.begin(scene, now)
+        current["render_start"] = now
+        current["eval_before_render"] = current["eval"]
+
+    def render_post(self, scene, *args):
+        current = self.current
+        if current is not None and current["render_start"] is not None:
+            render = time.perf_counter() - current["render_start"]
+            render -= current["eval"] - current["eval_before_render"]
+            current["render"] = (current["render"] or 0.0) + render
+            current["render_start"] = None
+
+    def end_frame(self, now):
+        current = self.current
+        if current is None:
+            return
+        wall = now - current["start"]
+        if current["render"] is None:
+            draw, write = wall - current["eval"], None
+        else:
+            draw, write = current["render"], round(wall - current["eval"] - current["render"], 4)
+        self.frames.append({
+            "frame": current["frame"],
+            "wall": round(wall, 4),
+            "eval": round(current["eval"], 4),
+            "draw": round(draw, 4),
+            "write": write,
+            "memory_mb": memory_mb(),
+        })
+        self.current = None
+
+    def start(self):
+        import bpy
+        self.start_time = time.perf_counter()
+        bpy.app.handlers.frame_change_pre.append(self.frame_pre)
+        bpy.app.handlers.frame_change_post.append(self.frame_post)
+        bpy.app.handlers.render_pre.append(self.render_pre)
+        bpy.app.handlers.render_post.append(self.render_post)
+
+    def stop(self):
+        import bpy
+        now = time.perf_counter()
+        bpy.app.handlers.frame_change_pre.remove(self.frame_pre)
+        bpy.app.handlers.frame_change_post.remove(self.frame_post)
+        bpy.app.handlers.render_pre.remove(self.render_pre)
+        bpy.app.handlers.render_post.remove(self.render_post)
+        self.finish(now)
+
+    def finish(self, now):
+        self.end_frame(now)
+        # drops the frame an animation render sets back once it's done
+        if any(frame["write"] is not None for frame in self.frames):
+            self.frames = [frame for frame in self.frames if frame["write"] is not None]
+        self.total = now - self.start_time
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def write(self, folder, name):
+        """Writes <name>_playblast_timing.json and .csv to the folder, returns the JSON path"""
+        path = os.path.join(folder, name + "_playblast_timing")
+
+        with open(path + ".json", 'w') as f:
+            json.dump({
+                "shot": name,
+                "total": round(self.total, 3),
+                "peak_memory_mb": peak_memory_mb(),
+                "frames": self.frames,
+            }, f, indent=1)
+
+        with open(path + ".csv", 'w', newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["frame", "wall", "eval", "draw", "write", "memory_mb"])
+            writer.writeheader()
+            writer.writerows(self.frames)
+
+        return path + ".json"
+
+
+def find_reports(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, subfolders, files in os.walk(path):
+                subfolders.sort()
+                for f in sorted(files):
+                    if f.endswith("_playblast_timing.json"):
+                        yield os.path.join(folder, f)
+        else:
+            yield path
+
+
+def summarize(paths, count=10):
+    """Prints the slowest shots (by average frame time) and the slowest frames of every report found"""
+    reports = []
+    for path in find_reports(paths):
+        with open(path) as f:
+            reports.append(json.load(f))
+
+    reports = [report for report in reports if report["frames"]]
+    if not reports:
+        print("No playblast timings found")
+        return
+
+    # reports from before write was timed have none, nor do ones without render handlers
+    def average(report, key):
+        return sum(frame.get(key) or 0.0 for frame in report["frames"]) / len(report["frames"])
+
+    print("Slowest shots (average per frame):")
+    print("  %-24s %8s %8s %8s %8s %8s %10s" % ("shot", "frames", "wall", "eval", "draw", "write", "peak"))
+    for report in sorted(reports, key=lambda r: average(r, "wall"), reverse=True)[:count]:
+        print("  %-24s %8d %7.3fs %7.3fs %7.3fs %7.3fs %8sMB" % (report["shot"], len(report["frames"]),
+            average(report, "wall"), average(report, "eval"), average(report, "draw"), average(report, "write"),
+            report["peak_memory_mb"]))
+
+    frames = [(frame, report["shot"]) for report in reports for frame in report["frames"]]
+    print("Slowest frames:")
+    for frame, shot in sorted(frames, key=lambda f: f[0]["wall"], reverse=True)[:count]:
+        print("  %-24s frame %-5d %7.3fs (eval %.3fs, draw %.3fs, write %.3fs)" % (shot, frame["frame"],
+            frame["wall"], frame["eval"], frame["draw"], frame.get("write") or 0.0))
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m hns_production_addon.timing",
+        description="Summarizes the playblast timing reports in the given folders")
+    parser.add_argument("paths", nargs="+", metavar="PATH", help="folders to search or timing .json files")
+    parser.add_argument("--count", type=int, default=10, help="number of shots/frames to list")
+    args = parser.parse_args(argv)
+    summarize(args.paths, args.count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# Checks that shots have the settings every shot file should have (the render_cam camera and
+# settings.SHOT_SETTINGS: resolution, pixel aspect, frame step and frame rate) before they're
+# playblasted or rendered, so a wrong frame rate is found before the render rather than after.
+#
+# Each Rule is checked against either the scene settings read from a .blend file's header
+# (blendfile.py, no Blender needed and a few milliseconds a file) or the open file in Blender,
+# which is also what it fixes. Files that blendfile.py can't read (e.g. zstd compressed without
+# the zstandard module) are checked by background Blenders, see --validate in cli.py.
+#
+# Doesn't import bpy:
+#   python -m hns_production_addon.validate production/shots
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from . import blendfile, settings
+
+
+SHOT_CAMERA = "render_cam"
+
+
+def format_value(value):
+    return "%g" % value if isinstance(value, float) else str(value)
+
+
+class Rule:
+    """A setting the shot's scene has to have. path is the property path from the context
+    (see settings.py), its last part is the field blendfile.read_scenes() reads from the file."""
+
+    def __init__(self, label, path, expected, tolerance=0):
+        self.label = label
+        self.path = path
+        self.key = path.rsplit(".", 1)[1]
+        self.expected = expected
+        self.tolerance = tolerance
+
+    def matches(self, value):
+        if value is None:
+            return False
+        if self.tolerance:
+            return abs(value - self.expected) <= self.tolerance
+        return value == self.expected
+
+    def problem(self, value):
+        """What's wrong with the value, None if it's right"""
+        if self.matches(value):
+            return None
+        return "%s is %s, should be %s" % (self.label, "not set" if value is None else format_value(value),
+                                           format_value(self.expected))
+
+    def read(self, context):
+        return settings.get_setting(context, self.path)
+
+    def fix(self, context):
+        settings.apply_settings(context, {self.path: self.expected})
+
+
+class CameraRule(Rule):
+    """The scene camera, by object name"""
+
+    def read(self, context):
+        camera = context.scene.camera
+        return camera.name if camera else None
+
+    def fix(self, context):
+        camera = context.blend_data.objects.get(self.expected)
+        if camera is None or camera.type != 'CAMERA':
+            raise ValueError("there's no %s camera" % self.expected)
+        context.scene.camera = camera
+
+
+def shot_setting(label, path, tolerance=0):
+    return Rule(label, path, settings.SHOT_SETTINGS[path], tolerance)
+
+
+RULES = [
+    CameraRule("Camera", "scene.camera", SHOT_CAMERA),
+    shot_setting("Resolution X", "scene.render.resolution_x"),
+    shot_setting("Resolution Y", "scene.render.resolution_y"),
+    shot_setting("Aspect X", "scene.render.pixel_aspect_x", 1e-4),
+    shot_setting("Aspect Y", "scene.render.pixel_aspect_y", 1e-4),
+    shot_setting("Frame step", "scene.frame_step"),
+    shot_setting("Frame rate", "scene.render.fps"),
+    # 1.001 for 23.98 fps
+    shot_setting("Frame rate base", "scene.render.fps_base", 1e-6),
+]
+
+
+def check_values(values):
+    """Problems with a scene's settings as read by blendfile.read_scenes()"""
+    return [problem for problem in (rule.problem(values.get(rule.key)) for rule in RULES) if problem]
+
+
+def check_context(context):
+    """Problems with the settings of the context's scene"""
+    return [problem for problem in (rule.problem(rule.read(context)) for rule in RULES) if problem]
+
+
+def fix_context(context):
+    """Fixes the settings of the context's scene, returns the problems that couldn't be fixed"""
+    left = []
+    for rule in RULES:
+        problem = rule.problem(rule.read(context))
+        if problem is None:
+            continue
+        try:
+            rule.fix(context)
+        except (AttributeError, TypeError, ValueError) as e:
+            left.append("%s (%s)" % (problem, e))
+    return left
+
+
+def validate_file(path):
+    """{"path", "problems", "error"} for the scene a .blend file was saved with. problems is
+    None if the file couldn't be read without Blender, error says why."""
+    try:
+        info = blendfile.read_info(path)
+    except (OSError, blendfile.BlendFileError) as e:
+        return {"path": path, "problems": None, "error": str(e)}
+
+    scene = next((scene for scene in info["scenes"] if scene["name"] == info["scene"]), None)
+    if scene is None:
+        # saved without a FileGlobal block, e.g. by a script
+        scene = info["scenes"][0] if info["scenes"] else None
+    if scene is None:
+        return {"path": path, "problems": ["No scene"], "error": None}
+    return {"path": path, "problems": check_values(scene), "error": None}
+
+
+def validate_files(paths, jobs=1):
+    """validate_file() of each file, read by a pool of processes if jobs > 1. Blender's Python
+    can't start those, so it uses one (and the headers are quick to read anyway)."""
+    paths = list(paths)
+    if jobs > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            return list(pool.map(validate_file, paths, chunksize=8))
+    return [validate_file(path) for path in paths]
+
+
+def format_report(results):
+    lines = []
+    for result in results:
+        if result["problems"] is None:
+            lines.append("%s: can't read the header (%s), needs Blender" % (os.path.relpath(result["path"]),
+                                                                              result["error"]))
+        elif result["problems"]:
+            lines.append("%s:" % os.path.relpath(result["path"]))
+            lines.extend("  " + problem for problem in result["problems"])
+
+    wrong = sum(1 for result in results if result["problems"])
+    unread = sum(1 for result in results if result["problems"] is None)
+    lines.append("%d files: %d ok, %d with wrong settings%s" % (len(results), len(results) - wrong - unread,
+        wrong, ", %d unread" % unread if unread else ""))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    import argparse
+    import json
+    import time
+
+    parser = argparse.ArgumentParser(prog="python -m hns_production_addon.validate",
+        description="Checks the camera, resolution, aspect, frame step and frame rate of shot files "
+                    "(fixing them needs Blender, see --validate --fix in the addon's command line)")
+    parser.add_argument("paths", nargs="+", metavar="PATH", help=".blend files or folders to search")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count(), help="processes reading the files")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = validate_files(blendfile.find_blend_files(args.paths), args.jobs or 1)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(format_report(results))
+        print("Checked in %.2fs" % (time.perf_counter() - start))
+    return 1 if any(result["problems"] != [] for result in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
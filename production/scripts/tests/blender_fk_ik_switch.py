@@ -0,0 +1,109 @@
+# Checks the FK/IK switch (ARMATURE_OT_fk_ik_switch) on a stand-in for one of Pebble's arms: switching
+# to the mode the limb is in already leaves it alone, switching to the other one snaps its controls,
+# and a bake only snaps the frames that were in the other mode. Exits with an error if it doesn't:
+#
+#   blender -b --factory-startup -P production/scripts/tests/blender_fk_ik_switch.py
+
+import bpy
+
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hns_production_addon import keying, rigs
+from hns_production_addon.rig_tools import ARMATURE_OT_fk_ik_switch
+
+LIMB = rigs.PEBBLE.limbs["left_arm_IK_switch"]
+SWITCH = rigs.PEBBLE.switch_property
+
+
+# The arm bends at the elbow, both chains have the same rest pose
+def make_rig():
+    data = bpy.data.armatures.new("Pebble")
+    rig = bpy.data.objects.new(rigs.PEBBLE.object_prefix, data)
+    bpy.context.scene.collection.objects.link(rig)
+    bpy.context.view_layer.objects.active = rig
+    bpy.ops.object.mode_set(mode='EDIT')
+
+    joints = [(0, 0, 0), (1, 0, 0), (2, 0, -0.5), (2.5, 0, -0.5)]
+    for chain in (LIMB.fk, LIMB.ik):
+        parent = None
+        for name, head, tail in zip(chain, joints, joints[1:]):
+            bone = data.edit_bones.new(name)
+            bone.head, bone.tail, bone.parent = head, tail, parent
+            parent = bone
+    for name, head in ((LIMB.switch, (0, 1, 0)), (LIMB.pole, (1, 0, 1))):
+        bone = data.edit_bones.new(name)
+        bone.head, bone.tail = head, (head[0], head[1], head[2] + 0.2)
+    bpy.ops.object.mode_set(mode='POSE')
+
+    rig.pose.bones[LIMB.switch][SWITCH] = 0.0
+    return rig
+
+
+def switch(mode):
+    result = bpy.ops.armature.fk_ik_switch(mode=mode, switch_bone=LIMB.switch, switch_name=SWITCH)
+    bpy.context.view_layer.update()
+    return result
+
+
+def pose(rig):
+    return {bone.name: [list(row) for row in bone.matrix_basis] for bone in rig.pose.bones}
+
+
+def check(condition, message):
+    if not condition:
+        sys.exit(message)
+
+
+def keyed_frames(rig, bone):
+    fcurves = keying.get_fcurves(rig, rig.animation_data.action)
+    path = keying.bone_path(bone, ".rotation_quaternion")
+    return sorted({int(point.co[0]) for fcurve in fcurves if fcurve.data_path == path
+                   for point in fcurve.keyframe_points})
+
+
+def main():
+    bpy.utils.register_class(ARMATURE_OT_fk_ik_switch)
+    scene = bpy.context.scene
+    scene.frame_set(1)
+    rig = make_rig()
+    bones = rig.pose.bones
+
+    # the two chains point different ways
+    bones[LIMB.ik[0]].rotation_quaternion = (math.cos(0.3), 0, math.sin(0.3), 0)
+    bones[LIMB.fk[1]].rotation_quaternion = (math.cos(0.2), 0, -math.sin(0.2), 0)
+    bpy.context.view_layer.update()
+
+    before = pose(rig)
+    switch('FK')
+    check(pose(rig) == before, "Switching an FK limb to FK moved it")
+    check(bones[LIMB.switch][SWITCH] == 0.0, "Switching an FK limb to FK changed its switch")
+
+    switch('IK')
+    check(bones[LIMB.switch][SWITCH] == 1.0, "Switching to IK didn't set the switch")
+    hand, control = bones[LIMB.fk[-1]], bones[LIMB.ik_control]
+    check((hand.head - control.head).length < 1e-4, "Switching to IK didn't snap the IK control to the hand")
+
+    before = pose(rig)
+    switch('IK')
+    check(pose(rig) == before, "Switching an IK limb to IK moved it")
+
+    # IK on frames 1-3, FK from frame 4: baking to FK only snaps frames 1-3
+    bones[LIMB.switch].keyframe_insert(data_path='["%s"]' % SWITCH, frame=1)
+    bones[LIMB.switch][SWITCH] = 0.0
+    bones[LIMB.switch].keyframe_insert(data_path='["%s"]' % SWITCH, frame=4)
+    for fcurve in keying.get_fcurves(rig, rig.animation_data.action):
+        for point in fcurve.keyframe_points:
+            point.interpolation = 'CONSTANT'
+    result = bpy.ops.armature.fk_ik_switch(mode='FK', switch_bone=LIMB.switch, switch_name=SWITCH, bake=True,
+                                           frame_start=1, frame_end=6)
+    check(result == {'FINISHED'}, "Baking to FK failed")
+    frames = keyed_frames(rig, LIMB.fk[0])
+    check(frames == [1, 2, 3], "Baking to FK keyed the FK chain on frames %s, not 1-3" % frames)
+    print("The FK/IK switch only snaps limbs that are in the other mode")
+
+
+main()
@@ -0,0 +1,100 @@
+# Checks that the rig tools key into (and find the keys on) the F-curves that animate the rig in the
+# Blender it runs in: the action's own before 4.4, the channelbag of the rig's action slot from 4.4 on (5.0
+# has no Action.fcurves), and that Key Whole Character keys the bones Select All Anims selects.
+# Exits with an error if they don't:
+#
+#   blender -b --factory-startup -P production/scripts/tests/blender_keying.py
+
+import bpy
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hns_production_addon import keying
+from hns_production_addon.rig_tools import get_keyed_frames, get_rig_controls, key_bones
+
+
+def make_rig():
+    data = bpy.data.armatures.new("Rig")
+    rig = bpy.data.objects.new("Rig", data)
+    bpy.context.scene.collection.objects.link(rig)
+    bpy.context.view_layer.objects.active = rig
+    bpy.ops.object.mode_set(mode='EDIT')
+    for name, head in (("upper_arm", (0, 0, 0)), ("forearm", (0, 0, 1))):
+        bone = data.edit_bones.new(name)
+        bone.head, bone.tail = head, (head[0], head[1], head[2] + 1)
+    bpy.ops.object.mode_set(mode='POSE')
+    return rig
+
+
+# A rig with a bone in a hidden bone collection (one that's also in a visible one shows), a hidden
+# bone, and a TopCon
+def make_controls_rig():
+    data = bpy.data.armatures.new("Controls")
+    rig = bpy.data.objects.new("Controls", data)
+    bpy.context.scene.collection.objects.link(rig)
+    bpy.context.view_layer.objects.active = rig
+    bpy.ops.object.mode_set(mode='EDIT')
+    bones = {}
+    for i, name in enumerate(("TopCon", "control", "mechanism", "both", "hidden")):
+        bones[name] = data.edit_bones.new(name)
+        bones[name].head, bones[name].tail = (i, 0, 0), (i, 0, 1)
+    shown, hidden = data.collections.new("Anims"), data.collections.new("Mechanism")
+    hidden.is_visible = False
+    hidden.assign(bones["mechanism"])
+    hidden.assign(bones["both"])
+    shown.assign(bones["both"])
+    bpy.ops.object.mode_set(mode='POSE')
+    # bones are hidden in pose mode from 5.0
+    hidden_bone = rig.pose.bones["hidden"]
+    setattr(hidden_bone if hasattr(hidden_bone, "hide") else hidden_bone.bone, "hide", True)
+    return rig
+
+
+def is_selected(bone):
+    return bone.select if hasattr(bone, "select") else bone.bone.select
+
+
+def check(condition, message):
+    if not condition:
+        sys.exit(message)
+
+
+def main():
+    scene = bpy.context.scene
+    rig = make_rig()
+    bones = list(rig.pose.bones)
+
+    scene.frame_set(1)
+    check(get_keyed_frames(rig) == [], "The rig has keys before it's keyed")
+    check(key_bones(bpy.context, rig, bones, [1]) == 20, "Expected 20 keys on frame 1")
+    scene.frame_set(10)
+    bones[0].location = (1, 2, 3)
+    check(key_bones(bpy.context, rig, bones, [10]) == 20, "Expected 20 keys on frame 10")
+
+    action = rig.animation_data.action
+    fcurves = keying.get_fcurves(rig, action)
+    check(fcurves is not None and len(fcurves) == 20, "Expected 20 F-curves on the rig")
+    check(get_keyed_frames(rig) == [1, 10], "Expected keys on frames 1 and 10, not %s" % get_keyed_frames(rig))
+    if hasattr(action, "slots"):
+        check(rig.animation_data.action_slot is not None, "The rig has no action slot")
+        check(len(action.slots) == 1, "Expected one action slot, not %d" % len(action.slots))
+
+    # the keys animate the rig
+    scene.frame_set(1)
+    check(tuple(bones[0].location) == (0, 0, 0), "The rig isn't animated by the keys")
+    scene.frame_set(10)
+    check(tuple(bones[0].location) == (1, 2, 3), "The rig isn't animated by the keys")
+
+    rig = make_controls_rig()
+    controls = sorted(bone.name for bone in get_rig_controls(rig))
+    check(controls == ["both", "control"], "Expected the controls both and control, not %s" % controls)
+    bpy.ops.pose.select_all(action='SELECT')
+    selected = sorted(bone.name for bone in rig.pose.bones if is_selected(bone) and bone.name != "TopCon")
+    check(controls == selected, "The controls %s aren't the bones Select All selects: %s" % (controls, selected))
+    print("Keyed the rig in Blender %s" % bpy.app.version_string)
+
+
+main()
@@ -0,0 +1,132 @@
+# Checks that a playblast that fails puts back every setting it changed and forgets the shot's
+# cached playblast: once with the render failing in render_playblast() (with the fast playblast,
+# timings and the comparison with the previous playblast on), once through the playblast operator,
+# which fails in a background Blender after applying its settings (it has no window to render in).
+# Exits with an error if anything is left changed:
+#
+#   blender -b --factory-startup -P production/scripts/tests/blender_playblast_restore.py
+
+import bpy
+
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hns_production_addon import playblast, settings
+from hns_production_addon.prefs import default_playblast_prefs
+
+SHOT_NAME = "restore_0010"
+
+
+class RenderFailure(Exception):
+    pass
+
+
+# Renders the playblast, then fails
+def failing_render(prefs, stream, *override):
+    playblast.render_viewport(*override, animation=True)
+    raise RenderFailure("forced render failure")
+
+
+# Every setting a playblast with these options can change
+def get_paths(context, prefs):
+    paths = list(playblast.get_playblast_settings(prefs, SHOT_NAME))
+    paths += playblast.PLAYBLAST_SIDE_EFFECT_SETTINGS
+    paths += list(playblast.get_fast_playblast_settings(context, prefs))
+    paths += ["preferences.view.render_display_type", "scene.render.engine", "scene.display.render_aa",
+              "scene.eevee.taa_render_samples", "scene.frame_current"]
+    return paths
+
+
+def read_settings(context, paths):
+    values = {}
+    for path in paths:
+        value = settings.get_setting(context, path)
+        values[path] = value if isinstance(value, (bool, int, float, str)) else tuple(value)
+    return values
+
+
+def check(condition, message):
+    if not condition:
+        sys.exit(message)
+
+
+def check_restored(context, before, what):
+    after = read_settings(context, before)
+    changed = ["%s: %r -> %r" % (path, before[path], after[path]) for path in before if after[path] != before[path]]
+    check(not changed, "%s left settings changed: %s" % (what, "; ".join(changed)))
+
+
+def check_forgotten(shot, what):
+    check(SHOT_NAME not in playblast.load_manifest(shot), "%s didn't forget the cached playblast" % what)
+
+
+def main(folder):
+    context = bpy.context
+    shot = os.path.join(folder, SHOT_NAME + ".blend")
+    bpy.ops.wm.save_as_mainfile(filepath=shot)
+    context.scene.frame_end = context.scene.frame_start + 2
+    context.scene.frame_set(2)
+    # the factory settings' video settings are only filled in when FFmpeg is first picked,
+    # a shot's have been set to something
+    render = context.scene.render
+    render.image_settings.file_format = 'FFMPEG'
+    render.ffmpeg.format, render.ffmpeg.codec = 'QUICKTIME', 'PNG'
+    render.image_settings.file_format = 'PNG'
+    render.image_settings.color_mode = 'RGBA'
+
+    prefs = default_playblast_prefs()
+    prefs.playblast_shade_solid = True
+    prefs.playblast_scale = 10
+    prefs.playblast_fast = True
+    prefs.playblast_timings = True
+    prefs.playblast_diff = True
+    before = read_settings(context, get_paths(context, prefs))
+
+    # the playblast the failed one would have replaced
+    output = os.path.join(folder, playblast.get_playblast_filename(SHOT_NAME, prefs))
+    with open(output, "wb") as f:
+        f.write(b"previous playblast")
+
+    real_render = playblast.run_playblast_render
+    playblast.run_playblast_render = failing_render
+    try:
+        with settings.SettingsSnapshot() as snapshot:
+            playblast.set_playblast_settings(context, prefs, SHOT_NAME, snapshot)
+            playblast.render_playblast(prefs, SHOT_NAME, folder=folder)
+        sys.exit("The forced render failure didn't raise")
+    except RenderFailure:
+        pass
+    finally:
+        playblast.run_playblast_render = real_render
+
+    check_restored(context, before, "The failed render")
+    with open(output, "rb") as f:
+        check(f.read() == b"previous playblast", "The failed render didn't put the previous playblast back")
+    check(not any(handler.__name__ in {"frame_pre", "frame_post"} for handler in
+                  bpy.app.handlers.frame_change_pre[:] + bpy.app.handlers.frame_change_post[:]),
+          "The failed render left its timing handlers")
+
+    # the operator uses the default options
+    prefs = default_playblast_prefs()
+    before = read_settings(context, get_paths(context, prefs))
+    playblast.record_playblast(shot, prefs, "stale")
+    bpy.utils.register_class(playblast.ANIM_OT_playblast)
+    try:
+        bpy.ops.anim.playblast(force=True, check=False)
+        sys.exit("The playblast operator didn't fail without a window")
+    except (RuntimeError, IndexError):
+        pass
+    check_restored(context, before, "The failed playblast operator")
+    check_forgotten(shot, "The failed playblast operator")
+    print("Failed playblasts put every setting back")
+
+
+folder = tempfile.mkdtemp(prefix="hns_restore_test_")
+try:
+    main(folder)
+finally:
+    shutil.rmtree(folder, ignore_errors=True)
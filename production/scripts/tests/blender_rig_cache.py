@@ -0,0 +1,72 @@
+# Checks that the rig panels' cache of pose bones (rigs.resolve()) is kept while posing and
+# cleared by the panels' depsgraph handler when bones or objects can have been freed: editing
+# the bones, swapping the armature data, deleting the rig. Exits with an error if it isn't:
+#
+#   blender -b --factory-startup -P production/scripts/tests/blender_rig_cache.py
+
+import bpy
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hns_production_addon import rigs
+from hns_production_addon.rig_panels import clear_rig_cache_on_edit
+
+DESCRIPTOR = rigs.RigDescriptor("Test", "Rig", "switch", {"upper_arm": ["switch"], "forearm": []})
+
+
+def make_rig():
+    data = bpy.data.armatures.new("Rig")
+    rig = bpy.data.objects.new("Rig", data)
+    bpy.context.scene.collection.objects.link(rig)
+    bpy.context.view_layer.objects.active = rig
+    bpy.ops.object.mode_set(mode='EDIT')
+    bone = data.edit_bones.new("upper_arm")
+    bone.head, bone.tail = (0, 0, 0), (0, 0, 1)
+    bpy.ops.object.mode_set(mode='POSE')
+    rig.pose.bones["upper_arm"]["switch"] = 0.0
+    bpy.context.view_layer.update()
+    return rig
+
+
+def check(condition, message):
+    if not condition:
+        sys.exit(message)
+
+
+def main():
+    bpy.app.handlers.depsgraph_update_post.append(clear_rig_cache_on_edit)
+    rig = make_rig()
+
+    resolved = rigs.resolve(rig, DESCRIPTOR)
+    check(resolved.missing == ["forearm"], "Expected forearm to be missing, not %s" % resolved.missing)
+    check(resolved.has("upper_arm", "switch") and not resolved.has("forearm"), "Wrong controls")
+    check(resolved.bone("upper_arm") == rig.pose.bones["upper_arm"], "Wrong pose bone")
+
+    rig.pose.bones["upper_arm"].location.x = 1
+    rig.pose.bones["upper_arm"]["switch"] = 1.0
+    bpy.context.view_layer.update()
+    check(rigs.resolve(rig, DESCRIPTOR) is resolved, "Posing the rig cleared the cache")
+
+    bpy.ops.object.mode_set(mode='EDIT')
+    bone = rig.data.edit_bones.new("forearm")
+    bone.head, bone.tail = (0, 0, 1), (0, 0, 2)
+    bpy.ops.object.mode_set(mode='POSE')
+    bpy.context.view_layer.update()
+    resolved = rigs.resolve(rig, DESCRIPTOR)
+    check(resolved.missing == [], "Adding a bone in edit mode didn't clear the cache")
+
+    rig.data = rig.data.copy()
+    bpy.context.view_layer.update()
+    check(rigs.resolve(rig, DESCRIPTOR) is not resolved, "Swapping the armature data didn't clear the cache")
+
+    bpy.ops.object.mode_set(mode='OBJECT')
+    bpy.data.objects.remove(rig)
+    bpy.context.view_layer.update()
+    check(not rigs.cache, "Deleting the rig didn't clear the cache")
+    print("The rig cache is cleared when bones can have been freed")
+
+
+main()
@@ -0,0 +1,108 @@
+# Checks that a sharded playblast (see playblast_shard_background() and stitch_playblast_background()
+# in batch.py) matches a serial one frame for frame. Needs Blender and ffmpeg:
+#
+#   blender -b -P production/scripts/tests/blender_sharded_playblast.py -- [SHOT] [--shards 3] [--stream]
+#
+# The shot (a test shot by default) is saved with a short frame range into two temporary folders,
+# playblasted at a low scale by background workers once serially and once in shards that are then
+# stitched (by Blender's sequencer, or ffmpeg with --stream), and the two playblasts are compared
+# with playdiff. Exits with an error if they differ.
+
+import bpy
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hns_production_addon import encoders, playdiff
+from hns_production_addon.batch import playblast_worker_args, run_blender_worker
+from hns_production_addon.playblast import get_playblast_filename, get_shot_name
+from hns_production_addon.prefs import default_playblast_prefs
+
+
+PRODUCTION_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+TEST_SHOT = os.path.join(PRODUCTION_ROOT, "shots", "tests", "layout_test_scene_act1.blend")
+FRAMES = 24
+SCALE = 10
+
+
+def save_short_copy(shot, folder):
+    bpy.ops.wm.open_mainfile(filepath=shot)
+    scene = bpy.context.scene
+    scene.frame_end = scene.frame_start + FRAMES - 1
+    os.makedirs(folder)
+    copy = os.path.join(folder, os.path.basename(shot))
+    # the libraries are linked through relative paths
+    bpy.ops.wm.save_as_mainfile(filepath=copy, copy=True, relative_remap=True)
+    return copy
+
+
+def run_worker(shot, args):
+    succeeded, seconds, log = run_blender_worker(shot, args)
+    if not succeeded:
+        print(log)
+        raise RuntimeError("%s %s failed" % (get_shot_name(shot), " ".join(args[2:])))
+    print("%s %s (%.1fs)" % (get_shot_name(shot), " ".join(args[2:]), seconds))
+
+
+def compare(old, new):
+    ffmpeg = encoders.find_ffmpeg()
+    size = playdiff.read_size(new)
+    if tuple(playdiff.read_size(old)) != tuple(size):
+        raise playdiff.DiffError("The playblasts have different sizes")
+    chunk = playdiff.get_chunk_size(size)
+    readers = [playdiff.FrameReader(ffmpeg, old, size, chunk), playdiff.FrameReader(ffmpeg, new, size, chunk)]
+    try:
+        return playdiff.compare_frames(readers[0], readers[1])
+    finally:
+        for reader in readers:
+            reader.close()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="blender -b -P blender_sharded_playblast.py --")
+    parser.add_argument("shot", nargs="?", default=TEST_SHOT)
+    parser.add_argument("--shards", type=int, default=3)
+    parser.add_argument("--stream", action="store_true", help="encode with ffmpeg")
+    args = parser.parse_args(argv)
+
+    if encoders.find_ffmpeg() is None:
+        sys.exit("Comparing the playblasts needs ffmpeg (on the PATH or set in HNS_FFMPEG)")
+
+    prefs = default_playblast_prefs()
+    prefs.playblast_scale = SCALE
+    prefs.playblast_shade_solid = True
+    prefs.playblast_diff = False
+    prefs.playblast_timings = False
+    prefs.playblast_stream = args.stream
+    worker_args = playblast_worker_args(prefs)
+
+    folder = tempfile.mkdtemp(prefix="hns_shard_test_")
+    try:
+        serial = save_short_copy(args.shot, os.path.join(folder, "serial"))
+        sharded = save_short_copy(args.shot, os.path.join(folder, "sharded"))
+
+        run_worker(serial, worker_args + ["--playblast-shot"])
+        for shard in range(args.shards):
+            run_worker(sharded, worker_args + ["--playblast-shard", "%d/%d" % (shard, args.shards)])
+        run_worker(sharded, worker_args + ["--stitch-shot"])
+
+        filename = get_playblast_filename(get_shot_name(args.shot), prefs)
+        changed, mean, serial_frames, sharded_frames = compare(os.path.join(folder, "serial", filename),
+                                                               os.path.join(folder, "sharded", filename))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    different = [i for i, fraction in enumerate(changed) if fraction > playdiff.FRAME_THRESHOLD]
+    print("%d serial frames, %d sharded frames, %d different, largest change %.4f%% of the pixels" % (
+        serial_frames, sharded_frames, len(different), max(changed, default=0) * 100))
+    if serial_frames != FRAMES or sharded_frames != FRAMES or different:
+        sys.exit("The sharded playblast doesn't match the serial one")
+    print("The sharded playblast matches the serial one")
+
+
+main(sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else [])
@@ -0,0 +1,60 @@
+# Checks that FrameTimer times every frame of a playblast once, with its drawing and writing, both
+# for an animation render and for a still rendered per frame (the streamed playblast). Exits with
+# an error if a report is wrong:
+#
+#   blender -b --factory-startup -P production/scripts/tests/blender_timing.py
+
+import bpy
+
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hns_production_addon import playblast, timing
+
+
+def check(name, timer, frames):
+    if [frame["frame"] for frame in timer.frames] != frames:
+        sys.exit("%s: timed frames %s, not %s" % (name, [frame["frame"] for frame in timer.frames], frames))
+    for frame in timer.frames:
+        if frame["draw"] <= 0 or frame["write"] is None or frame["write"] < 0:
+            sys.exit("%s: frame %d wasn't split into drawing and writing: %s" % (name, frame["frame"], frame))
+        if abs(frame["eval"] + frame["draw"] + frame["write"] - frame["wall"]) > 0.001:
+            sys.exit("%s: frame %d doesn't add up: %s" % (name, frame["frame"], frame))
+        if not frame["memory_mb"]:
+            sys.exit("%s: frame %d has no memory: %s" % (name, frame["frame"], frame))
+
+
+def main():
+    scene = bpy.context.scene
+    scene.frame_start, scene.frame_end = 1, 3
+    scene.render.resolution_x, scene.render.resolution_y = 64, 36
+    scene.render.image_settings.file_format = 'PNG'
+    folder = tempfile.mkdtemp(prefix="hns_timing_")
+    
+    try:
+        scene.render.filepath = os.path.join(folder, "frame_")
+        with timing.FrameTimer() as timer:
+            playblast.render_viewport(animation=True)
+        check("animation", timer, [1, 2, 3])
+        
+        # the way stream_playblast() renders
+        with timing.FrameTimer() as timer:
+            for frame in range(scene.frame_start, scene.frame_end + 1):
+                scene.frame_set(frame)
+                scene.render.filepath = os.path.join(folder, "%06d.png" % frame)
+                playblast.render_viewport(write_still=True)
+        check("stills", timer, [1, 2, 3])
+        
+        report = timer.write(folder, "timing_0010")
+        timing.summarize([report])
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    
+    print("Playblast timings have every frame once")
+
+
+main()
@@ -0,0 +1,39 @@
+# A benchmark that doesn't make a measurement the baseline has for its file fails, the same as
+# one that got slower. Measurements of files that weren't benchmarked aren't missing.
+
+from hns_production_addon import baseline
+
+
+BASELINE = {"machine": baseline.get_machine(), "blender": "4.2.23 LTS", "results": {
+    "a.blend: key whole character Pebble_proxy": {"median": 0.1},
+    "a.blend: FK/IK switch bake Pebble_proxy Arm L": {"median": 0.2},
+    "b.blend: playblast 24 frames solid": {"median": 10.0},
+}}
+
+
+def test_missing_measurement():
+    results = {"a.blend: key whole character Pebble_proxy": {"median": 0.1}}
+    rows = baseline.compare(results, BASELINE, files=["a.blend"])
+    assert [(row[0], row[3]) for row in rows] == [
+        ("a.blend: FK/IK switch bake Pebble_proxy Arm L", 'missing'),
+        ("a.blend: key whole character Pebble_proxy", 'same'),
+    ]
+    assert "MISSING" in baseline.format_comparison(rows, BASELINE)
+    assert "1 missing" in baseline.format_comparison(rows, BASELINE)
+
+
+def test_every_file_by_default():
+    rows = baseline.compare({}, BASELINE)
+    assert [row[3] for row in rows] == ['missing'] * 3
+
+
+def test_slower_and_new():
+    results = {"a.blend: key whole character Pebble_proxy": {"median": 0.2},
+               "a.blend: FK/IK switch bake Pebble_proxy Arm L": {"median": 0.2},
+               "a.blend: draw rig panels Pebble_proxy": {"median": 0.0001}}
+    rows = baseline.compare(results, BASELINE, files=["a.blend"])
+    assert {row[0]: row[3] for row in rows} == {
+        "a.blend: FK/IK switch bake Pebble_proxy Arm L": 'same',
+        "a.blend: draw rig panels Pebble_proxy": 'new',
+        "a.blend: key whole character Pebble_proxy": 'slower',
+    }
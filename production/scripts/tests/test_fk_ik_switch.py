@@ -0,0 +1,20 @@
+# Runs blender_fk_ik_switch.py in Blender (the blender on the PATH, or HNS_BLENDER), which checks
+# that the FK/IK switch only snaps a limb that's in the other mode
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+BLENDER = os.environ.get("HNS_BLENDER") or shutil.which("blender")
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "blender_fk_ik_switch.py")
+
+
+@pytest.mark.skipif(BLENDER is None, reason="needs Blender")
+def test_switch_snaps_from_the_driving_chain():
+    result = subprocess.run([BLENDER, "--background", "--factory-startup", "--python-exit-code", "1",
+                             "--python", SCRIPT], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            universal_newlines=True)
+    assert result.returncode == 0, result.stdout[-4000:]
+    assert "The FK/IK switch only snaps limbs that are in the other mode" in result.stdout
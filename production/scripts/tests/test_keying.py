@@ -0,0 +1,96 @@
+# KeyBatch.write() keys into an action's F-curves, which are the action's own before Blender 4.4
+# and a channelbag's (one per action slot) from 4.4 on, where they are created with group_name
+# instead of action_group. keying.py doesn't import bpy, so plain objects stand in for Blender's
+# here; blender_keying.py checks get_fcurves() in Blender itself.
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from hns_production_addon.keying import KeyBatch
+
+
+class Points(list):
+    def foreach_get(self, name, values):
+        values[:] = [value for point in self for value in point.co]
+
+    def foreach_set(self, name, values):
+        for i, point in enumerate(self):
+            point.co = (values[i * 2], values[i * 2 + 1])
+
+    def add(self, count):
+        self.extend(Point() for i in range(count))
+
+
+class Point:
+    co = (0.0, 0.0)
+    interpolation = 'BEZIER'
+
+
+class FCurve:
+    def __init__(self, data_path, index, group):
+        self.data_path, self.array_index, self.group = data_path, index, group
+        self.keyframe_points = Points()
+
+    def update(self):
+        self.keyframe_points.sort(key=lambda point: point.co[0])
+
+    def keys(self):
+        return [point.co for point in self.keyframe_points]
+
+
+# Action.fcurves before 4.4
+class LegacyFCurves(list):
+    def new(self, data_path, index=0, action_group=""):
+        self.append(FCurve(data_path, index, action_group))
+        return self[-1]
+
+
+# ActionChannelbag.fcurves
+class ChannelbagFCurves(list):
+    def new(self, data_path, index=0, group_name=""):
+        self.append(FCurve(data_path, index, group_name))
+        return self[-1]
+
+    def ensure(self, data_path, index=0, group_name=""):
+        raise AssertionError("not used")
+
+
+@pytest.mark.parametrize("fcurves_type", [LegacyFCurves, ChannelbagFCurves], ids=["legacy", "channelbag"])
+def test_write(fcurves_type):
+    fcurves = fcurves_type()
+    batch = KeyBatch()
+    batch.add_transforms("hand.L", 'QUATERNION', (1, 2, 3), (1, 0, 0, 0), (1, 1, 1), 5)
+    batch.add('pose.bones["hand.L"]["IK Switch"]', [1.0], 5, "hand.L", 'CONSTANT')
+    assert batch.write(fcurves) == 11
+
+    assert len(fcurves) == 11
+    assert {fcurve.group for fcurve in fcurves} == {"hand.L"}
+    location = [fcurve for fcurve in fcurves if fcurve.data_path == 'pose.bones["hand.L"].location']
+    assert [(fcurve.array_index, fcurve.keys()) for fcurve in location] == [
+        (0, [(5.0, 1)]), (1, [(5.0, 2)]), (2, [(5.0, 3)])]
+    switch = fcurves[-1].keyframe_points
+    assert [point.interpolation for point in switch] == ['CONSTANT']
+
+    # the existing curves are reused, keys on the same frame replaced and new ones sorted in
+    batch = KeyBatch()
+    batch.add('pose.bones["hand.L"].location', (4, 5, 6), 5, "hand.L")
+    batch.add('pose.bones["hand.L"].location', (7, 8, 9), 1, "hand.L")
+    assert batch.write(fcurves) == 6
+    assert len(fcurves) == 11
+    assert location[0].keys() == [(1.0, 7), (5.0, 4)]
+
+
+BLENDER = os.environ.get("HNS_BLENDER") or shutil.which("blender")
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "blender_keying.py")
+
+
+@pytest.mark.skipif(BLENDER is None, reason="needs Blender")
+def test_keying_in_blender():
+    result = subprocess.run([BLENDER, "--background", "--factory-startup", "--python-exit-code", "1",
+                             "--python", SCRIPT], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            universal_newlines=True)
+    assert result.returncode == 0, result.stdout[-4000:]
+    assert "Keyed the rig" in result.stdout
@@ -0,0 +1,20 @@
+# Runs blender_rig_cache.py in Blender (the blender on the PATH, or HNS_BLENDER), which checks
+# that the rig panels' cached pose bones are dropped when they can have been freed
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+BLENDER = os.environ.get("HNS_BLENDER") or shutil.which("blender")
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "blender_rig_cache.py")
+
+
+@pytest.mark.skipif(BLENDER is None, reason="needs Blender")
+def test_rig_cache_is_cleared():
+    result = subprocess.run([BLENDER, "--background", "--factory-startup", "--python-exit-code", "1",
+                             "--python", SCRIPT], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            universal_newlines=True)
+    assert result.returncode == 0, result.stdout[-4000:]
+    assert "The rig cache is cleared when bones can have been freed" in result.stdout
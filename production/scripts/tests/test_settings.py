@@ -0,0 +1,105 @@
+# SettingsSnapshot puts every setting a playblast changes back, whether the playblast worked
+# or not. settings.py doesn't import bpy, so plain objects stand in for Blender's; a failing
+# playblast in Blender itself is checked by blender_playblast_restore.py.
+
+import os
+import shutil
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+from hns_production_addon.settings import SettingsSnapshot
+
+
+def make_context():
+    render = SimpleNamespace(resolution_percentage=100, filepath="//shot_", use_stamp=False)
+    return SimpleNamespace(scene=SimpleNamespace(render=render, frame_step=1))
+
+
+# Raises on setattr like the properties of a deleted data-block
+class Deleted:
+    def __init__(self, error):
+        object.__setattr__(self, "error", error)
+        object.__setattr__(self, "value", 1)
+
+    def __setattr__(self, name, value):
+        raise self.error("StructRNA of type Object has been removed")
+
+
+def test_restore_after_apply():
+    context = make_context()
+    snapshot = SettingsSnapshot()
+    snapshot.apply(context, {"scene.render.resolution_percentage": 50, "scene.render.use_stamp": True,
+                             "scene.frame_step": 2})
+    snapshot.set(context.scene.render, "filepath", "/tmp/playblast.mp4")
+    assert context.scene.render.resolution_percentage == 50
+    assert context.scene.render.filepath == "/tmp/playblast.mp4"
+
+    assert snapshot.restore() == []
+    assert vars(context.scene.render) == vars(make_context().scene.render)
+    assert context.scene.frame_step == 1
+    assert snapshot.saved == []
+
+
+def test_restore_when_the_block_raises():
+    context = make_context()
+    with pytest.raises(RuntimeError):
+        with SettingsSnapshot() as snapshot:
+            snapshot.apply(context, {"scene.render.resolution_percentage": 25, "scene.frame_step": 3})
+            raise RuntimeError("Render failed")
+    assert context.scene.render.resolution_percentage == 100
+    assert context.scene.frame_step == 1
+
+
+def test_deferred_undo_runs_newest_first():
+    # how use_texture_proxies() relocates a library: the reload is deferred before the path
+    # is set, so it runs after the path is put back
+    library = SimpleNamespace(filepath="//lib.blend", loaded_from=[])
+    snapshot = SettingsSnapshot()
+    snapshot.defer(lambda: library.loaded_from.append(library.filepath), "library lib.blend")
+    snapshot.set(library, "filepath", "//lib_proxy.blend")
+    library.loaded_from.append(library.filepath)
+
+    assert snapshot.restore() == []
+    assert library.filepath == "//lib.blend"
+    assert library.loaded_from == ["//lib_proxy.blend", "//lib.blend"]
+
+
+@pytest.mark.parametrize("error", [AttributeError, ReferenceError])
+def test_restore_skips_what_cant_be_restored(error):
+    context = make_context()
+    deleted = Deleted(error)
+    snapshot = SettingsSnapshot()
+    snapshot.set(context.scene.render, "resolution_percentage", 50)
+    snapshot.capture(deleted, "value")
+    snapshot.set(context.scene, "frame_step", 2)
+
+    errors = snapshot.restore()
+    assert len(errors) == 1 and "Couldn't restore value" in errors[0]
+    assert context.scene.render.resolution_percentage == 100
+    assert context.scene.frame_step == 1
+
+
+def test_try_set_leaves_out_read_only_settings():
+    context = make_context()
+    snapshot = SettingsSnapshot()
+    assert snapshot.try_set(context.scene, "frame_step", 2)
+    assert not snapshot.try_set(Deleted(AttributeError), "value", 0)
+    assert len(snapshot.saved) == 1
+
+    assert snapshot.restore() == []
+    assert context.scene.frame_step == 1
+
+
+BLENDER = os.environ.get("HNS_BLENDER") or shutil.which("blender")
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "blender_playblast_restore.py")
+
+
+@pytest.mark.skipif(BLENDER is None, reason="needs Blender")
+def test_failed_playblast_restores_settings():
+    result = subprocess.run([BLENDER, "--background", "--factory-startup", "--python-exit-code", "1",
+                             "--python", SCRIPT], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            universal_newlines=True)
+    assert result.returncode == 0, result.stdout[-4000:]
+    assert "Failed playblasts put every setting back" in result.stdout
@@ -0,0 +1,23 @@
+# Runs blender_sharded_playblast.py in Blender (the blender on the PATH, or HNS_BLENDER), which
+# checks that a sharded playblast matches a serial one frame for frame
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from hns_production_addon import encoders
+
+BLENDER = os.environ.get("HNS_BLENDER") or shutil.which("blender")
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "blender_sharded_playblast.py")
+
+
+@pytest.mark.skipif(BLENDER is None or encoders.find_ffmpeg() is None, reason="needs Blender and ffmpeg")
+@pytest.mark.parametrize("stream", [False, True], ids=["sequencer", "ffmpeg"])
+def test_sharded_playblast_matches_serial(stream):
+    result = subprocess.run([BLENDER, "--background", "--factory-startup", "--python-exit-code", "1",
+                             "--python", SCRIPT, "--"] + (["--stream"] if stream else []),
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    assert result.returncode == 0, result.stdout[-4000:]
+    assert "The sharded playblast matches the serial one" in result.stdout
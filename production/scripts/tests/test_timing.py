@@ -0,0 +1,85 @@
+# FrameTimer splits each frame of a playblast into evaluation, drawing and writing from the order
+# Blender fires its handlers in. The sequences below are the ones Blender 4.2 and 5.0 fire for an
+# animation render, a still rendered per frame (the streamed playblast) and an OpenGL render,
+# which fires no render handlers. blender_timing.py times real renders.
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from hns_production_addon import timing
+
+
+class Scene:
+    frame_current = 1
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(timing.time, "perf_counter", clock)
+    return clock
+
+
+# Runs the events (handler name, frame, seconds it takes) through a started timer
+def run(clock, events):
+    timer = timing.FrameTimer()
+    timer.start_time = clock.now
+    scene = Scene()
+    for name, frame, seconds in events:
+        scene.frame_current = frame
+        getattr(timer, name)(scene)
+        clock.now += seconds
+    timer.finish(clock.now)
+    return [(f["frame"], f["wall"], f["eval"], f["draw"], f["write"]) for f in timer.frames]
+
+
+def test_animation_render(clock):
+    events = []
+    for frame in (1, 2, 3):
+        events += [("render_pre", frame, 0.0), ("frame_pre", frame, 1.0), ("frame_post", frame, 2.0),
+                   ("render_post", frame, 4.0)]
+    # the frame is set back once the render is done
+    events += [("frame_pre", 1, 1.0), ("frame_post", 1, 0.0)]
+    assert run(clock, events) == [(1, 7.0, 1.0, 2.0, 4.0), (2, 7.0, 1.0, 2.0, 4.0), (3, 7.0, 1.0, 2.0, 4.0)]
+
+
+def test_still_per_frame(clock):
+    events = []
+    for frame in (1, 2):
+        events += [("frame_pre", frame, 1.0), ("frame_post", frame, 0.5),
+                   ("render_pre", frame, 0.5), ("frame_pre", frame, 1.0), ("frame_post", frame, 2.0),
+                   ("render_post", frame, 3.0),
+                   ("frame_pre", frame, 1.0), ("frame_post", frame, 1.0)]
+    assert run(clock, events) == [(1, 10.0, 3.0, 2.5, 4.5), (2, 10.0, 3.0, 2.5, 4.5)]
+
+
+def test_no_render_handlers(clock):
+    events = [("frame_pre", 1, 1.0), ("frame_post", 1, 3.0), ("frame_pre", 2, 2.0), ("frame_post", 2, 2.0)]
+    assert run(clock, events) == [(1, 4.0, 1.0, 3.0, None), (2, 4.0, 2.0, 2.0, None)]
+
+
+def test_memory():
+    assert timing.memory_mb() is None or timing.memory_mb() > 0
+
+
+BLENDER = os.environ.get("HNS_BLENDER") or shutil.which("blender")
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "blender_timing.py")
+
+
+@pytest.mark.skipif(BLENDER is None, reason="needs Blender")
+def test_playblast_timings_in_blender():
+    result = subprocess.run([BLENDER, "--background", "--factory-startup", "--python-exit-code", "1",
+                             "--python", SCRIPT], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            universal_newlines=True)
+    assert result.returncode == 0, result.stdout[-4000:]
+    assert "Playblast timings have every frame once" in result.stdout